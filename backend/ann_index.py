@@ -0,0 +1,141 @@
+# ann_index.py - Inverted-file (IVF) approximate nearest-neighbour index in NumPy
+import os
+import threading
+import numpy as np
+
+from face_gallery import l2_normalize
+from quantization import similarities
+
+
+def index_path_for(model_path):
+    """Where the IVF index for a trained model file is persisted"""
+    return f"{model_path}.ivf.npz"
+
+
+def _assign(vectors, centroids, chunk_size=16384):
+    """Nearest centroid (by cosine similarity) for every row, in bounded-memory chunks"""
+    assignment = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), chunk_size):
+        chunk = vectors[start:start + chunk_size]
+        assignment[start:start + chunk_size] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignment
+
+
+def spherical_kmeans(vectors, num_clusters, iterations=10, seed=0):
+    """k-means on unit vectors with cosine similarity; returns unit-length centroids"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), num_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = _assign(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        counts = np.bincount(assignment, minlength=num_clusters)
+        empty = counts == 0
+        if empty.any():
+            # Reseed empty lists from random points so every list stays usable
+            sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+        centroids = l2_normalize(sums)
+    return centroids
+
+
+class IVFIndex:
+    """
+    Coarse k-means quantizer with one inverted list of gallery rows per
+    centroid. A query is only compared with the rows of its nprobe closest
+    lists, trading a little recall for a large cut in comparisons.
+    """
+
+    def __init__(self, centroids, list_offsets, list_rows, nprobe=8):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.list_offsets = np.asarray(list_offsets, dtype=np.int64)
+        self.list_rows = np.asarray(list_rows, dtype=np.int64)
+        self.nprobe = nprobe
+        self._vectors = None
+        self._scales = None
+
+    @classmethod
+    def build(cls, embeddings, nlist=None, nprobe=8, iterations=10, seed=0):
+        """Cluster L2-normalized embeddings into nlist inverted lists (default sqrt(N))"""
+        embeddings = l2_normalize(embeddings)
+        if nlist is None:
+            nlist = int(np.sqrt(len(embeddings)))
+        nlist = max(1, min(nlist, len(embeddings)))
+        centroids = spherical_kmeans(embeddings, nlist, iterations=iterations, seed=seed)
+        assignment = _assign(embeddings, centroids)
+        list_rows = np.argsort(assignment, kind='stable')
+        list_offsets = np.concatenate(([0], np.cumsum(np.bincount(assignment, minlength=nlist))))
+        index = cls(centroids, list_offsets, list_rows, nprobe=nprobe)
+        index.attach(embeddings)
+        return index
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    @property
+    def num_rows(self):
+        return len(self.list_rows)
+
+    def attach(self, embeddings, scales=None):
+        """
+        Keep a list-ordered copy of the gallery rows so each list is contiguous.
+        The copy keeps the rows' dtype, so a float16 or int8 gallery (with its
+        int8 scales) is not widened back to float32.
+        """
+        if len(embeddings) != self.num_rows:
+            raise ValueError(f"Index covers {self.num_rows} rows but the gallery has {len(embeddings)}")
+        self._vectors = np.ascontiguousarray(embeddings[self.list_rows])
+        self._scales = scales
+
+    @property
+    def nbytes(self):
+        """Bytes held by the centroids, lists and list-ordered rows"""
+        vectors = self._vectors.nbytes if self._vectors is not None else 0
+        return self.centroids.nbytes + self.list_offsets.nbytes + self.list_rows.nbytes + vectors
+
+    def search(self, queries, k=1, nprobe=None):
+        """
+        Approximate top-k for L2-normalized queries.
+        Returns (distances, rows) shaped (num_queries, k); rows index the
+        gallery matrix and are -1 where fewer than k candidates were probed.
+        """
+        if self._vectors is None:
+            raise RuntimeError("IVFIndex.attach() must be called before searching")
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        queries = np.atleast_2d(queries)
+        out_dist = np.full((len(queries), k), np.inf, dtype=np.float32)
+        out_rows = np.full((len(queries), k), -1, dtype=np.int64)
+
+        coarse = queries @ self.centroids.T
+        if nprobe < self.nlist:
+            probes = np.argpartition(-coarse, nprobe - 1, axis=1)[:, :nprobe]
+        else:
+            probes = np.broadcast_to(np.arange(self.nlist), coarse.shape)
+
+        for i, query in enumerate(queries):
+            candidates = np.concatenate([
+                np.arange(self.list_offsets[lst], self.list_offsets[lst + 1]) for lst in probes[i]
+            ])
+            if len(candidates) == 0:
+                continue
+            dist = 1.0 - similarities(query[None], self._vectors[candidates], self._scales)[0]
+            kk = min(k, len(dist))
+            top = np.argpartition(dist, kk - 1)[:kk] if kk < len(dist) else np.arange(len(dist))
+            top = top[np.argsort(dist[top], kind='stable')][:kk]
+            out_dist[i, :kk] = dist[top]
+            out_rows[i, :kk] = self.list_rows[candidates[top]]
+        return out_dist, out_rows
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # Write then rename: a running session may be loading the index while training saves it
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, centroids=self.centroids, list_offsets=self.list_offsets,
+                     list_rows=self.list_rows, nprobe=np.int64(self.nprobe))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['centroids'], data['list_offsets'], data['list_rows'], nprobe=int(data['nprobe']))
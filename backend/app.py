@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, Response
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit
 import os
@@ -7,9 +7,19 @@ import datetime
 from pathlib import Path
 import base64
 import numpy as np
+import cv2
 from werkzeug.utils import secure_filename
 import threading
 import face_recognition_module as frm
+from embedding_cache import EmbeddingCache
+from enrollment_pipeline import list_training_images, embed_training_images
+from gallery_store import trained_model_exists, gallery_version
+from attendance_store import AttendanceStore
+from student_registry import StudentRegistry
+from enrollment_worker import EnrollmentWorker
+from training_jobs import TrainingJobs
+from pipeline_metrics import metrics
+from event_scheduler import EventScheduler
 
 app = Flask(__name__, static_folder='frontend/build', static_url_path='')
 CORS(app, resources={r"/api/*": {"origins": "http://localhost:3000"}})
@@ -23,27 +33,21 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs('students_data', exist_ok=True)
 os.makedirs('attendance_data', exist_ok=True)
 
-active_recognition = None
+# Attendance lives in SQLite; CSVs written by earlier versions are imported once
+attendance_store = AttendanceStore(os.path.join('attendance_data', 'attendance.db'))
+attendance_store.import_csv_dir('attendance_data')
 
-def read_students_from_csv(degree_program):
-    degree_program = degree_program.lower().replace(' ', '_')
-    csv_file = Path('students_data') / f"{degree_program}_students.csv"
-    if not csv_file.exists():
-        return []
-    with open(csv_file, 'r', newline='') as f:
-        reader = csv.DictReader(f)
-        return list(reader)
-
-def write_students_to_csv(degree_program, students):
-    degree_program = degree_program.lower().replace(' ', '_')
-    csv_file = Path('students_data') / f"{degree_program}_students.csv"
-    headers = ['id', 'faculty', 'degree_program', 'intake', 'index_number', 'first_name', 
-               'last_name', 'email', 'phone', 'university_id', 'nic_number', 'address', 
-               'created_at', 'image_path', 'subjects']
-    with open(csv_file, 'w', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=headers)
-        writer.writeheader()
-        writer.writerows(students)
+student_registry = StudentRegistry('students_data')
+
+os.makedirs('trained_models', exist_ok=True)
+enrollment_worker = EnrollmentWorker(
+    os.path.join('trained_models', 'face_recognition_model'),
+    model_name="Facenet512",
+    detector_backend="opencv",
+    cache_file=os.path.join('trained_models', 'embedding_cache.pkl')
+)
+
+active_recognition = None
 
 def save_attendance_to_csv(attendance_data):
     today = datetime.datetime.now().strftime('%Y-%m-%d')
@@ -66,25 +70,41 @@ def save_attendance_to_csv(attendance_data):
                 'section': attendance_data.get('lecture', '')
             })
 
-def read_all_students():
-    students_dir = Path('students_data')
-    all_students = []
-    for csv_file in students_dir.glob('*_students.csv'):
-        with open(csv_file, 'r', newline='') as f:
-            reader = csv.DictReader(f)
-            all_students.extend(list(reader))
-    return all_students
+# Video frames go out per client, recognitions in batches; see event_scheduler.py
+event_scheduler = EventScheduler(
+    lambda event, payload, to=None: socketio.emit(event, payload, to=to),
+    batch_interval=0.25,
+    metrics=metrics
+)
+frm.set_event_scheduler(event_scheduler)
+threading.Thread(target=event_scheduler.run, daemon=True).start()
 
 @socketio.on('connect')
 def handle_connect():
+    event_scheduler.connect(request.sid)
     print('Client connected')
 
 @socketio.on('disconnect')
 def handle_disconnect():
+    event_scheduler.disconnect(request.sid)
     print('Client disconnected')
 
+@socketio.on('video_subscribe')
+def handle_video_subscribe():
+    event_scheduler.subscribe(request.sid)
+
+@socketio.on('video_unsubscribe')
+def handle_video_unsubscribe():
+    event_scheduler.unsubscribe(request.sid)
+
+@socketio.on('video_frame_ack')
+def handle_video_frame_ack(data):
+    camera, seq = data.get('camera', 0), data.get('seq')
+    event_scheduler.ack(request.sid, camera, seq)
+    frm.frame_ack(camera, seq)
+
 def recognition_callback(name):
-    socketio.emit('recognition_event', {'type': 'recognition', 'name': name})
+    event_scheduler.recognized(name)
 
 frm.set_callback(recognition_callback)
 
@@ -99,19 +119,8 @@ def register_student():
     if not degree_program:
         return jsonify({'success': False, 'error': 'Degree program is required'}), 400
 
-    students = read_students_from_csv(degree_program)
-    
-    for student in students:
-        if (student.get('email') == data.get('email') or
-            student.get('index_number') == data.get('indexNumber') or
-            student.get('university_id') == data.get('universityId') or
-            student.get('nic_number') == data.get('nicNumber')):
-            return jsonify({'success': False, 'error': 'Student already exists'}), 400
-    
-    new_id = max([int(s['id']) for s in students]) + 1 if students else 1
     subjects = '|'.join(data.get('subjects', [])) if 'subjects' in data and isinstance(data['subjects'], list) else ''
-    new_student = {
-        'id': str(new_id),
+    new_student = student_registry.register(degree_program, {
         'faculty': data.get('faculty', 'FOC'),
         'degree_program': degree_program,
         'intake': data.get('intake'),
@@ -126,9 +135,9 @@ def register_student():
         'created_at': datetime.datetime.utcnow().isoformat(),
         'image_path': '',
         'subjects': subjects
-    }
-    students.append(new_student)
-    write_students_to_csv(degree_program, students)
+    })
+    if new_student is None:
+        return jsonify({'success': False, 'error': 'Student already exists'}), 400
 
     return jsonify({'success': True, 'message': 'Student registered successfully', 'student': new_student}), 201
 
@@ -137,44 +146,20 @@ def save_attendance():
     data = request.json
     try:
         today = datetime.datetime.now().strftime('%Y-%m-%d')
-        csv_dir = Path('attendance_data')
-        csv_dir.mkdir(exist_ok=True)
-        csv_file = csv_dir / f"attendance_{today}.csv"
-        headers = ['indexNumber', 'name', 'status', 'timestamp', 'class', 'section']
-
-        existing_records = []
-        if csv_file.exists():
-            with open(csv_file, 'r', newline='') as f:
-                reader = csv.DictReader(f)
-                existing_records = list(reader)
-
-        new_records = []
-        for record in data['attendanceList']:
-            if not any(
-                existing['indexNumber'] == record['studentId'] and
-                existing['section'] == data.get('lecture', '') and
-                existing['class'] == data.get('intake', '')
-                for existing in existing_records
-            ):
-                new_records.append({
-                    'indexNumber': record['studentId'],
-                    'name': record['name'],
-                    'status': 'present' if record['present'] else 'absent',
-                    'timestamp': datetime.datetime.utcnow().isoformat(),
-                    'class': data.get('intake', ''),
-                    'section': data.get('lecture', '')
-                })
-
+        records = [{
+            'indexNumber': record['studentId'],
+            'name': record['name'],
+            'status': 'present' if record['present'] else 'absent',
+            'timestamp': datetime.datetime.utcnow().isoformat(),
+            'class': data.get('intake', ''),
+            'section': data.get('lecture', '')
+        } for record in data['attendanceList']]
+
+        # Students already recorded for this lecture today are skipped by the store
+        new_records = attendance_store.add_records(today, records)
         if not new_records:
             return jsonify({'success': True, 'message': 'No new attendance records to save'}), 200
 
-        file_exists = csv_file.exists()
-        with open(csv_file, 'a', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=headers)
-            if not file_exists:
-                writer.writeheader()
-            writer.writerows(new_records)
-
         return jsonify({'success': True, 'message': 'Attendance saved successfully'}), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -185,7 +170,7 @@ def get_students():
     if not degree_program:
         return jsonify({'success': False, 'error': 'degreeProgram required'}), 400
     try:
-        students = read_students_from_csv(degree_program)
+        students = student_registry.students(degree_program)
         for student in students:
             student['subjects'] = student.get('subjects', '').split('|') if student.get('subjects') else []
         return jsonify({'success': True, 'students': students}), 200
@@ -200,29 +185,9 @@ def get_attendance():
     student_id = request.args.get('studentId')
     
     try:
-        csv_file = Path('attendance_data') / f"attendance_{date}.csv" if date else None
-        all_records = []
-        
-        if csv_file and csv_file.exists():
-            with open(csv_file, 'r', newline='') as f:
-                reader = csv.DictReader(f)
-                all_records = list(reader)
-        elif not date:
-            csv_dir = Path('attendance_data')
-            for csv_file in csv_dir.glob('attendance_*.csv'):
-                with open(csv_file, 'r', newline='') as f:
-                    reader = csv.DictReader(f)
-                    all_records.extend(list(reader))
-        
-        filtered_records = all_records
-        if degree_program:
-            filtered_records = [r for r in filtered_records if r['class'] == degree_program]
-        if subject:
-            filtered_records = [r for r in filtered_records if r['section'] == subject]
-        if student_id:
-            filtered_records = [r for r in filtered_records if r['indexNumber'] == student_id]
-        
-        return jsonify({'success': True, 'records': filtered_records}), 200
+        records = attendance_store.query(date=date, class_name=degree_program, section=subject,
+                                         index_number=student_id)
+        return jsonify({'success': True, 'records': records}), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -239,26 +204,34 @@ def register_webcam():
     os.makedirs(student_dir, exist_ok=True)
 
     saved_paths = []
+    encoded = []
+    decoded = []
     for idx, image_data in enumerate(images):
         image_data = image_data.split(',')[1]  # Remove data:image/jpeg;base64,
+        image_bytes = base64.b64decode(image_data)
         filepath = os.path.join(student_dir, f"{name}_angle_{idx}.jpg")
         with open(filepath, 'wb') as f:
-            f.write(base64.b64decode(image_data))
+            f.write(image_bytes)
         saved_paths.append(filepath)
+        encoded.append(image_bytes)
+        decoded.append(cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR))
+
+    student = student_registry.find_by_name(name)
+    if student:
+        # Store first image path for reference
+        student_registry.update(student['degree_program'], student['id'], image_path=saved_paths[0])
+
+    # Embed the new photos in the background; the student is recognizable without a full retrain
+    enrollment = enrollment_worker.submit(name, decoded, saved_paths, encoded)
 
-    students = read_all_students()
-    for student in students:
-        if f"{student['first_name']} {student['last_name']}" == name:
-            student['image_path'] = saved_paths[0]  # Store first image path for reference
-            degree_program = student['degree_program']
-            students_in_program = read_students_from_csv(degree_program)
-            for s in students_in_program:
-                if s['id'] == student['id']:
-                    s['image_path'] = saved_paths[0]
-            write_students_to_csv(degree_program, students_in_program)
-            break
+    return jsonify({'success': True, 'message': f'{len(images)} images saved for {name}', 'enrollment': enrollment}), 200
 
-    return jsonify({'success': True, 'message': f'{len(images)} images saved for {name}'}), 200
+@app.route('/api/enrollment-status/<name>', methods=['GET'])
+def enrollment_status(name):
+    status = enrollment_worker.get_status(secure_filename(name))
+    if status is None:
+        return jsonify({'success': False, 'error': 'No enrollment for this student'}), 404
+    return jsonify({'success': True, 'enrollment': status}), 200
 
 @app.route('/api/mark_attendance', methods=['POST'])
 def mark_attendance():
@@ -267,7 +240,20 @@ def mark_attendance():
     if active_recognition and any(t.is_alive() for t in active_recognition.values()):
         return jsonify({'success': False, 'error': 'Recognition already in progress'}), 400
 
-    active_recognition = frm.start_face_recognition(detector_backend="mediapipe")
+    options = data or {}
+    active_recognition = frm.start_face_recognition(
+        detector_backend="mediapipe",
+        search_index=options.get('searchIndex', 'exact'),
+        precision=options.get('precision', 'float32'),
+        sources=options.get('sources'),
+        num_workers=options.get('workers'),
+        execution_mode=options.get('executionMode', 'thread'),
+        stream_fps=options.get('streamFps', 15),
+        reload_interval=options.get('reloadInterval', 2.0),
+        stats_interval=options.get('statsInterval'),
+        latency_budget=options.get('latencyBudget', 0.5),
+        cpu_target=options.get('cpuTarget', 0.8)
+    )
     if not active_recognition:
         return jsonify({'success': False, 'error': 'Failed to start face recognition'}), 500
 
@@ -284,52 +270,100 @@ def stop_face_recognition():
         active_recognition = None
     return jsonify({'success': True, 'message': 'Face recognition stopped'}), 200
 
+@app.route('/api/metrics', methods=['GET'])
+def pipeline_metrics():
+    return Response(metrics.prometheus(), mimetype='text/plain; version=0.0.4')
+
+def run_training(options, progress_callback):
+    """One training run: embed known_faces (reusing the cache), then save a new gallery version"""
+    known_faces_dir = app.config['UPLOAD_FOLDER']
+    model_save_path = os.path.join('trained_models', 'face_recognition_model')
+    os.makedirs('trained_models', exist_ok=True)
+    
+    model_name = "Facenet512"
+    detector_backend = "opencv"
+    cache = EmbeddingCache(os.path.join('trained_models', 'embedding_cache.pkl'))
+    
+    # Students enrolled from here on may not be in the listing; the save keeps them (save_retrained_gallery)
+    since_version = gallery_version(model_save_path)
+    _, images = list_training_images(known_faces_dir)
+    progress_callback(0, len(images), 0.0)
+    face_data, labels, pipeline_stats = embed_training_images(
+        images,
+        model_name=model_name,
+        detector_backend=detector_backend,
+        batch_size=int(options.get('batchSize', 32)),
+        workers=int(options.get('workers', 4)),
+        cache=cache,
+        progress_callback=progress_callback
+    )
+    
+    evicted = cache.evict_unseen(model_name, detector_backend)
+    cache.save()
+    cache_stats = dict(cache.stats(), cache_evicted=evicted)
+    print(f"Embedding cache: {cache_stats}")
+    print(f"Training pipeline: {pipeline_stats}")
+    
+    if not face_data:
+        return {'success': False, 'error': 'No valid face images found for training', 'details': cache_stats}
+    
+    face_data = np.array(face_data)
+    labels = np.array(labels)
+    
+    training_result = frm.train_model(face_data, labels, model_save_path, model_name=model_name,
+                                      since_version=since_version)
+    if not training_result['success']:
+        return training_result
+    
+    return {
+        'success': True,
+        'message': 'Face recognition model trained successfully',
+        'details': dict(training_result['details'], **cache_stats, pipeline=pipeline_stats)
+    }
+
+def training_progress(progress):
+    socketio.emit('training_progress', dict(progress, state='running'))
+
+def training_finished(job):
+    socketio.emit('training_progress', {
+        'jobId': job['id'],
+        'state': job['state'],
+        'duration': job['duration'],
+        'galleryVersion': job['gallery_version'],
+        'error': job['error'],
+        **job['progress']
+    })
+
+training_jobs = TrainingJobs(on_progress=training_progress, on_finished=training_finished)
+
 @app.route('/api/train-model', methods=['POST'])
 def train_face_recognition_model():
-    try:
-        known_faces_dir = app.config['UPLOAD_FOLDER']
-        model_save_path = os.path.join('trained_models', 'face_recognition_model')
-        os.makedirs('trained_models', exist_ok=True)
-        
-        face_data = []
-        labels = []
-        
-        for person_name in os.listdir(known_faces_dir):
-            person_dir = os.path.join(known_faces_dir, person_name)
-            if os.path.isdir(person_dir):
-                for image_filename in os.listdir(person_dir):
-                    image_path = os.path.join(person_dir, image_filename)
-                    try:
-                        embedding = frm.extract_face_embedding(image_path)
-                        if embedding is not None:
-                            face_data.append(embedding)
-                            labels.append(person_name)
-                    except Exception as image_error:
-                        print(f"Error processing image {image_path}: {str(image_error)}")
-        
-        if not face_data:
-            return jsonify({'success': False, 'error': 'No valid face images found for training'}), 400
-        
-        face_data = np.array(face_data)
-        labels = np.array(labels)
-        
-        training_result = frm.train_model(face_data, labels, model_save_path)
-        if not training_result['success']:
-            return jsonify(training_result), 500
-        
+    options = request.get_json(silent=True) or {}
+    job_id = training_jobs.start(lambda progress: run_training(options, progress))
+    if job_id is None:
         return jsonify({
-            'success': True,
-            'message': 'Face recognition model trained successfully',
-            'details': training_result['details']
-        })
-    except Exception as e:
-        return jsonify({'success': False, 'error': f'Unexpected error during model training: {str(e)}'}), 500
+            'success': False,
+            'error': 'Model training already in progress',
+            'jobId': training_jobs.running_job()
+        }), 409
+    return jsonify({'success': True, 'message': 'Model training started', 'jobId': job_id}), 202
+
+@app.route('/api/train-model/<job_id>', methods=['GET'])
+def training_job_status(job_id):
+    job = training_jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown training job'}), 404
+    return jsonify({'success': True, 'job': job}), 200
 
 @app.route('/api/model-training-status', methods=['GET'])
 def model_training_status():
     model_path = os.path.join('trained_models', 'face_recognition_model')
-    model_exists = os.path.exists(model_path)
-    return jsonify({'exists': model_exists}), 200
+    model_exists = trained_model_exists(model_path)
+    return jsonify({
+        'exists': model_exists,
+        'galleryVersion': gallery_version(model_path),
+        'job': training_jobs.get()
+    }), 200
 
 if __name__ == '__main__':
     socketio.run(app, debug=True)
\ No newline at end of file
@@ -0,0 +1,138 @@
+# attendance_sink.py - Batched, fsync'd attendance.csv writes and recognition callbacks off the detection path
+import os
+import time
+import queue
+import datetime
+import threading
+
+HEADER = "Name,Time\n"
+
+
+class AttendanceSink:
+    """
+    Detection workers submit() recognitions into an in-memory queue and move
+    on. A writer thread appends them to the attendance CSV in batches, once
+    max_batch records are waiting or the oldest has waited max_delay seconds,
+    and fsyncs each batch. Only then is each record handed to on_recorded(name),
+    which runs on a third thread so a slow Socket.IO client cannot hold up
+    the disk writes either.
+
+    On open, a torn last line left by a crash mid-write is cut off, so the
+    file always ends in whole records.
+    """
+
+    def __init__(self, path="attendance.csv", on_recorded=None, max_batch=64, max_delay=0.5):
+        self.path = path
+        self.on_recorded = on_recorded
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.records = queue.Queue()
+        self.events = queue.Queue()
+        self.counters = {'records': 0, 'batches': 0, 'write_seconds': 0.0, 'callback_errors': 0}
+        self._recover()
+
+    def _recover(self):
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            with open(self.path, "w") as f:
+                f.write(HEADER)
+                f.flush()
+                os.fsync(f.fileno())
+            return
+        with open(self.path, "rb+") as f:
+            end = f.seek(0, os.SEEK_END)
+            f.seek(end - 1)
+            if f.read(1) == b"\n":
+                return
+            # Walk back to the last complete line
+            pos = end
+            while pos > 0:
+                step = min(4096, pos)
+                pos -= step
+                f.seek(pos)
+                cut = f.read(step).rfind(b"\n")
+                if cut >= 0:
+                    pos += cut + 1
+                    break
+            f.truncate(pos)
+            if pos == 0:
+                f.seek(0)  # truncate leaves the position at the end of what was read
+                f.write(HEADER.encode())
+            f.flush()
+            os.fsync(f.fileno())
+        print(f"Recovered {self.path}: dropped a partial record of {end - pos} bytes")
+
+    def submit(self, name, timestamp=None):
+        """Queue a recognition; never blocks on I/O"""
+        timestamp = timestamp or datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.records.put((name, timestamp, time.monotonic()))
+
+    def pending(self):
+        return self.records.qsize()
+
+    def run(self, exit_event):
+        """Writer loop; after exit_event is set it keeps draining for max_delay, then flushes the rest"""
+        delivery = threading.Thread(target=self._deliver, daemon=True)
+        delivery.start()
+        batch = []
+        stop_at = None
+        while True:
+            if stop_at is None and exit_event.is_set():
+                # Workers finishing their last frame may still submit
+                stop_at = time.monotonic() + self.max_delay
+            if stop_at is not None and time.monotonic() >= stop_at and self.records.empty():
+                break
+            deadline = batch[0][2] + self.max_delay if batch else time.monotonic() + self.max_delay
+            try:
+                batch.append(self.records.get(timeout=max(0.0, min(deadline - time.monotonic(), 0.1))))
+                while len(batch) < self.max_batch:
+                    batch.append(self.records.get_nowait())
+            except queue.Empty:
+                pass
+            if batch and (len(batch) >= self.max_batch or time.monotonic() >= deadline):
+                if self._write(batch):
+                    batch = []
+                elif stop_at is not None and time.monotonic() >= stop_at:
+                    break
+                else:
+                    time.sleep(self.max_delay)
+        if batch and not self._write(batch):
+            print(f"Attendance writer gave up on {len(batch)} records: {', '.join(name for name, _, _ in batch)}")
+        self.events.put(None)
+        delivery.join(timeout=5.0)
+        stats = self.stats()
+        print(f"Attendance writer stopped: {stats['records']} records in {stats['batches']} batches, "
+              f"{stats['write_seconds'] * 1000:.1f} ms writing")
+
+    def _write(self, batch):
+        """Append and fsync batch; False if it failed and should be retried"""
+        start = time.perf_counter()
+        try:
+            with open(self.path, "a") as f:
+                f.writelines(f"{name},{timestamp}\n" for name, timestamp, _ in batch)
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as e:
+            print(f"Error writing attendance, will retry: {str(e)}")
+            return False
+        self.counters['records'] += len(batch)
+        self.counters['batches'] += 1
+        self.counters['write_seconds'] += time.perf_counter() - start
+        for name, timestamp, _ in batch:
+            print(f"Marked attendance for {name} at {timestamp}")
+            self.events.put(name)
+        return True
+
+    def _deliver(self):
+        while True:
+            name = self.events.get()
+            if name is None:
+                return
+            if self.on_recorded:
+                try:
+                    self.on_recorded(name)
+                except Exception as e:
+                    self.counters['callback_errors'] += 1
+                    print(f"Error delivering recognition of {name}: {str(e)}")
+
+    def stats(self):
+        return dict(self.counters, pending=self.pending())
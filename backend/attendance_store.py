@@ -0,0 +1,164 @@
+# attendance_store.py - SQLite attendance records, indexed for the /api/attendance filters
+import os
+import re
+import csv
+import sqlite3
+import threading
+from pathlib import Path
+
+MAX_CACHED_DAYS = 7
+CSV_NAME = re.compile(r'attendance_(\d{4}-\d{2}-\d{2})\.csv$')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attendance (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    indexNumber TEXT NOT NULL,
+    name TEXT,
+    status TEXT,
+    timestamp TEXT,
+    class TEXT NOT NULL DEFAULT '',
+    section TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_attendance_lecture ON attendance (date, class, section);
+CREATE INDEX IF NOT EXISTS idx_attendance_class ON attendance (class);
+CREATE INDEX IF NOT EXISTS idx_attendance_section ON attendance (section);
+CREATE INDEX IF NOT EXISTS idx_attendance_index_number ON attendance (indexNumber);
+CREATE TABLE IF NOT EXISTS imported_csv (
+    file TEXT PRIMARY KEY,
+    records INTEGER NOT NULL
+);
+"""
+
+# A student is recorded at most once per lecture per day
+UNIQUE_INDEX = ("CREATE UNIQUE INDEX IF NOT EXISTS idx_attendance_unique "
+                "ON attendance (date, indexNumber, section, class)")
+DROP_DUPLICATES = ("DELETE FROM attendance WHERE id NOT IN "
+                   "(SELECT MIN(id) FROM attendance GROUP BY date, indexNumber, section, class)")
+
+INSERT = ("INSERT OR IGNORE INTO attendance (date, indexNumber, name, status, timestamp, class, section) "
+          "VALUES (?, ?, ?, ?, ?, ?, ?)")
+
+
+def _rows(date, records):
+    return [(date, r['indexNumber'], r.get('name'), r.get('status'), r.get('timestamp'),
+             r.get('class') or '', r.get('section') or '') for r in records]
+
+
+class AttendanceStore:
+    """
+    Attendance records in one SQLite file instead of a CSV per day. Queries
+    filter by date, class, section and index number through indexes rather
+    than by loading every CSV; (date, class, section) is one composite index
+    since a lecture's records are always looked up together. One connection is shared by the Flask threads
+    behind a lock; WAL keeps readers from blocking on a write.
+    """
+
+    def __init__(self, db_path='attendance_data/attendance.db'):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.executescript(SCHEMA)
+            if not self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'idx_attendance_unique'").fetchone():
+                removed = self.conn.execute(DROP_DUPLICATES).rowcount
+                self.conn.execute(UNIQUE_INDEX)
+                if removed:
+                    print(f"Removed {removed} duplicate attendance records from {db_path} "
+                          f"(same student, lecture and day)")
+            self.conn.commit()
+        # date -> {(indexNumber, section, class)} for the days saved to recently
+        self.day_keys = {}
+
+    def _keys_for(self, date):
+        keys = self.day_keys.get(date)
+        if keys is None:
+            if len(self.day_keys) >= MAX_CACHED_DAYS:
+                self.day_keys.pop(min(self.day_keys))
+            rows = self.conn.execute(
+                "SELECT indexNumber, section, class FROM attendance WHERE date = ?", (date,)).fetchall()
+            keys = self.day_keys[date] = {tuple(row) for row in rows}
+        return keys
+
+    def add_records(self, date, records):
+        """
+        Insert {indexNumber, name, status, timestamp, class, section} dicts for
+        date, skipping students already recorded for the same lecture that day.
+        The duplicate check is a set lookup per record, and check plus insert
+        happen under one lock, so concurrent requests cannot both insert a
+        student. Returns the records that were added.
+        """
+        with self.lock:
+            keys = self._keys_for(date)
+            new_records = []
+            for r in records:
+                key = (r['indexNumber'], r.get('section') or '', r.get('class') or '')
+                if key not in keys:
+                    keys.add(key)
+                    new_records.append(r)
+            if new_records:
+                try:
+                    with self.conn:
+                        self.conn.executemany(INSERT, _rows(date, new_records))
+                except sqlite3.Error:
+                    self.day_keys.pop(date, None)
+                    raise
+        return new_records
+
+    def query(self, date=None, class_name=None, section=None, index_number=None):
+        """Records matching every given filter, oldest first, as dicts with the CSV column names"""
+        clauses = []
+        params = []
+        for column, value in (('date', date), ('class', class_name), ('section', section),
+                              ('indexNumber', index_number)):
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        sql = "SELECT indexNumber, name, status, timestamp, class, section FROM attendance"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY date, id"
+        with self.lock:
+            return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM attendance").fetchone()[0]
+
+    def import_csv_dir(self, csv_dir='attendance_data'):
+        """
+        One-time import of the legacy attendance_YYYY-MM-DD.csv files. Each file
+        is recorded in imported_csv, so restarts do not import it twice.
+        Returns the number of records imported.
+        """
+        with self.lock:
+            done = {row[0] for row in self.conn.execute("SELECT file FROM imported_csv")}
+        imported = 0
+        for csv_file in sorted(Path(csv_dir).glob('attendance_*.csv')):
+            match = CSV_NAME.search(csv_file.name)
+            if not match or csv_file.name in done:
+                continue
+            with open(csv_file, 'r', newline='') as f:
+                records = [r for r in csv.DictReader(f) if r.get('indexNumber')]
+            rows = _rows(match.group(1), records)
+            with self.lock, self.conn:
+                self.day_keys.pop(match.group(1), None)
+                # Duplicate rows in a legacy file are dropped by the unique index
+                added = self.conn.executemany(INSERT, rows).rowcount
+                self.conn.execute("INSERT INTO imported_csv (file, records) VALUES (?, ?)",
+                                  (csv_file.name, added))
+            imported += added
+            print(f"Imported {added} attendance records from {csv_file}")
+        if imported:
+            # Refresh planner statistics so date filters keep using the lecture index
+            with self.lock:
+                self.conn.execute("ANALYZE")
+        return imported
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
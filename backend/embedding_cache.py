@@ -0,0 +1,144 @@
+# embedding_cache.py - Persistent content-hash cache of face embeddings
+import os
+import glob
+import uuid
+import pickle
+import hashlib
+import tempfile
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """SHA-256 of a file's bytes, so renamed or re-saved identical photos still hit"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def bytes_digest(data):
+    """file_digest of bytes that are already in memory"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def journal_dir_for(cache_file):
+    return f"{cache_file}.d"
+
+
+def _write_atomically(path, obj):
+    # A unique tmp file per writer, so concurrent saves never share one
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(obj, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def append_entries(cache_file, entries):
+    """
+    Add {key: {'path', 'embedding'}} entries without loading or rewriting the
+    whole cache: they go into their own small file in the cache's journal
+    directory and are folded into the cache the next time it is loaded.
+    """
+    if not entries:
+        return
+    directory = journal_dir_for(cache_file)
+    os.makedirs(directory, exist_ok=True)
+    _write_atomically(os.path.join(directory, f"{uuid.uuid4().hex}.pkl"), entries)
+
+
+class EmbeddingCache:
+    """
+    Embeddings keyed by (image content hash, model name, detector backend).
+    A training pass calls lookup/store for every image it walks and then
+    evict_unseen() so photos deleted from known_faces drop out of the cache.
+    Entries written by append_entries are merged in on load, and save()
+    removes the journal files it merged.
+    """
+
+    def __init__(self, cache_file='trained_models/embedding_cache.pkl'):
+        self.cache_file = cache_file
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self._seen = set()
+        self._merged = []
+        self.load()
+
+    @staticmethod
+    def make_key(digest, model_name, detector_backend):
+        return (digest, model_name, detector_backend)
+
+    def load(self):
+        try:
+            with open(self.cache_file, 'rb') as f:
+                self.entries = pickle.load(f)
+        except FileNotFoundError:
+            self.entries = {}
+        except Exception as e:
+            print(f"Ignoring unreadable embedding cache {self.cache_file}: {str(e)}")
+            self.entries = {}
+        self._merged = []
+        for path in sorted(glob.glob(os.path.join(journal_dir_for(self.cache_file), '*.pkl'))):
+            try:
+                with open(path, 'rb') as f:
+                    self.entries.update(pickle.load(f))
+                self._merged.append(path)
+            except Exception as e:
+                print(f"Ignoring unreadable embedding cache entries {path}: {str(e)}")
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.cache_file) or '.', exist_ok=True)
+        _write_atomically(self.cache_file, self.entries)
+        # Journal files written since load() are not in self.entries and stay for the next load
+        for path in self._merged:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._merged = []
+
+    def lookup(self, image_path, model_name, detector_backend):
+        """Return (key, embedding); embedding is None on a miss and key is needed for store()"""
+        key = self.make_key(file_digest(image_path), model_name, detector_backend)
+        self._seen.add(key)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return key, None
+        self.hits += 1
+        entry['path'] = image_path
+        return key, entry['embedding']
+
+    def store(self, key, image_path, embedding):
+        if embedding is not None:
+            self.entries[key] = {'path': image_path, 'embedding': embedding}
+
+    def get_embedding(self, image_path, model_name, detector_backend, compute):
+        """Return the cached embedding for image_path or call compute(image_path) and cache it"""
+        key, embedding = self.lookup(image_path, model_name, detector_backend)
+        if embedding is None:
+            embedding = compute(image_path)
+            self.store(key, image_path, embedding)
+        return embedding
+
+    def evict_unseen(self, model_name, detector_backend):
+        """Drop entries for this model/detector that the last pass did not touch; returns the count"""
+        stale = [
+            key for key, entry in self.entries.items()
+            if key not in self._seen and (
+                (key[1] == model_name and key[2] == detector_backend) or not os.path.exists(entry['path']))
+        ]
+        for key in stale:
+            del self.entries[key]
+        return len(stale)
+
+    def stats(self):
+        return {'cache_hits': self.hits, 'cache_misses': self.misses, 'cache_entries': len(self.entries)}
@@ -0,0 +1,152 @@
+# enrollment_pipeline.py - Parallel decode/detect with batched embedding for model training
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+from deepface import DeepFace
+from face_embedder import FaceEmbedder
+
+# DeepFace keeps one detector instance per backend; these are safe to call from several threads
+THREAD_SAFE_DETECTORS = {"opencv", "skip"}
+
+
+def list_training_images(known_faces_dir):
+    """
+    Walk known_faces/<person>/<image> in the same order as the sequential trainer.
+    Returns (people, images) where images is a list of (person_name, image_path).
+    """
+    people = []
+    images = []
+    for person_name in os.listdir(known_faces_dir):
+        person_path = os.path.join(known_faces_dir, person_name)
+        if os.path.isdir(person_path):
+            people.append(person_name)
+            for img_name in os.listdir(person_path):
+                images.append((person_name, os.path.join(person_path, img_name)))
+    return people, images
+
+
+def detect_and_align(image_path, detector_backend="opencv", detector_lock=None):
+    """Decode one photo and return its first aligned face (RGB, [0, 1]) or None"""
+    img = cv2.imread(image_path)
+    if img is None:
+        raise ValueError("could not decode image")
+    return align_face(img, detector_backend, detector_lock)
+
+
+def align_face(img, detector_backend="opencv", detector_lock=None):
+    """First aligned face (RGB, [0, 1]) of an already decoded BGR image, or None"""
+    if detector_lock is None:
+        faces = DeepFace.extract_faces(img_path=img, detector_backend=detector_backend,
+                                       enforce_detection=False, align=True)
+    else:
+        with detector_lock:
+            faces = DeepFace.extract_faces(img_path=img, detector_backend=detector_backend,
+                                           enforce_detection=False, align=True)
+    return faces[0]['face'] if faces else None
+
+
+def print_progress(done, total, images_per_second):
+    print(f"Embedded {done}/{total} images ({images_per_second:.1f} img/s)")
+
+
+def embed_training_images(images, model_name="Facenet512", detector_backend="opencv", batch_size=32,
+                          workers=4, cache=None, embedder=None, progress_callback=print_progress):
+    """
+    Embed (person_name, image_path) pairs: a thread pool decodes and detects,
+    and aligned faces reach the model batch_size at a time. Cached images
+    (see EmbeddingCache) skip both steps. Output order follows the input, so
+    the result matches the one-image-at-a-time trainer.
+
+    Returns (face_data, labels, stats).
+    """
+    start_time = time.time()
+    total = len(images)
+    embeddings = [None] * total
+    pending = []
+    failed = 0
+    for i, (_, image_path) in enumerate(images):
+        key = None
+        if cache is not None:
+            try:
+                key, embeddings[i] = cache.lookup(image_path, model_name, detector_backend)
+            except OSError as e:
+                # Deleted or replaced since it was listed; skipped like an image with no face
+                print(f"Skipped {image_path}: {str(e)}")
+                failed += 1
+                continue
+            if embeddings[i] is not None:
+                continue
+        pending.append((i, key))
+
+    done = total - len(pending)
+
+    def report():
+        if progress_callback:
+            elapsed = max(time.time() - start_time, 1e-9)
+            progress_callback(done, total, done / elapsed)
+
+    if pending:
+        embedder = embedder or FaceEmbedder(model_name)
+        detector_lock = None if detector_backend in THREAD_SAFE_DETECTORS else threading.Lock()
+        batch = []
+
+        def flush():
+            nonlocal done
+            vectors = embedder.embed([face for _, _, face in batch], batch_size=batch_size)
+            for (i, key, _), vector in zip(batch, vectors):
+                embeddings[i] = vector.tolist()
+                if cache is not None:
+                    cache.store(key, images[i][1], embeddings[i])
+            done += len(batch)
+            batch.clear()
+            report()
+
+        def collect(i, key, future):
+            nonlocal done, failed
+            try:
+                face = future.result()
+            except Exception as e:
+                face = None
+                print(f"Skipped {images[i][1]}: {str(e)}")
+            if face is None:
+                failed += 1
+                done += 1
+                return
+            batch.append((i, key, face))
+            if len(batch) >= batch_size:
+                flush()
+
+        # Bound the number of decoded faces held in memory at once
+        max_in_flight = batch_size + 2 * workers
+        in_flight = deque()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for i, key in pending:
+                in_flight.append((i, key, pool.submit(detect_and_align, images[i][1], detector_backend, detector_lock)))
+                if len(in_flight) >= max_in_flight:
+                    collect(*in_flight.popleft())
+            while in_flight:
+                collect(*in_flight.popleft())
+        if batch:
+            flush()
+    else:
+        report()
+
+    face_data = []
+    labels = []
+    for (person_name, _), embedding in zip(images, embeddings):
+        if embedding is not None:
+            face_data.append(embedding)
+            labels.append(person_name)
+
+    elapsed = time.time() - start_time
+    stats = {
+        'images': total,
+        'embedded': sum(embeddings[i] is not None for i, _ in pending),
+        'failed': failed,
+        'seconds': round(elapsed, 3),
+        'images_per_second': round(total / elapsed, 2) if elapsed > 0 else 0.0,
+    }
+    return face_data, labels, stats
@@ -0,0 +1,102 @@
+# enrollment_worker.py - Background enrollment of newly uploaded student photos into the gallery
+import time
+import queue
+import threading
+from embedding_cache import EmbeddingCache, append_entries, bytes_digest
+from enrollment_pipeline import align_face
+from face_embedder import FaceEmbedder
+from gallery_store import add_identity
+
+
+class EnrollmentWorker:
+    """
+    One daemon thread that takes a student's decoded photos, detects and
+    embeds them in a single batch and stores them as that student's rows of
+    the gallery (a new gallery version). Other students are not re-embedded.
+    Embeddings are also appended to the training cache (as a small journal
+    file, not a rewrite of the whole cache), so the next full retrain reuses
+    them.
+    """
+
+    def __init__(self, model_path, model_name="Facenet512", detector_backend="opencv", cache_file=None):
+        self.model_path = model_path
+        self.model_name = model_name
+        self.detector_backend = detector_backend
+        self.cache_file = cache_file
+        self.jobs = queue.Queue()
+        self.status = {}
+        self._lock = threading.Lock()
+        self._embedder = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, name, images, paths=None, encoded=None):
+        """
+        Queue enrollment of name from BGR images. paths and encoded (the
+        original file bytes) are optional and only used to fill the cache.
+        Returns the initial status.
+        """
+        with self._lock:
+            self.status[name] = {
+                'state': 'queued',
+                'images': len(images),
+                'faces': 0,
+                'gallery_version': None,
+                'error': None,
+                'queued_at': time.time(),
+                'seconds': None,
+            }
+            status = dict(self.status[name])
+        self.jobs.put((name, images, paths or [None] * len(images), encoded or [None] * len(images)))
+        return status
+
+    def get_status(self, name):
+        with self._lock:
+            status = self.status.get(name)
+            return dict(status) if status else None
+
+    def _update(self, name, **changes):
+        with self._lock:
+            self.status[name].update(changes)
+
+    def _run(self):
+        while True:
+            name, images, paths, encoded = self.jobs.get()
+            self._update(name, state='embedding')
+            start = time.time()
+            try:
+                version, faces = self._enroll(name, images, paths, encoded)
+                self._update(name, state='enrolled', faces=faces, gallery_version=version,
+                             seconds=round(time.time() - start, 3))
+                print(f"Enrolled {name}: {faces} faces, gallery version {version}, {time.time() - start:.2f}s")
+            except Exception as e:
+                self._update(name, state='failed', error=str(e), seconds=round(time.time() - start, 3))
+                print(f"Enrollment of {name} failed: {str(e)}")
+
+    def _enroll(self, name, images, paths, encoded):
+        faces = []
+        sources = []
+        for img, path, data in zip(images, paths, encoded):
+            face = align_face(img, self.detector_backend) if img is not None else None
+            if face is not None:
+                faces.append(face)
+                sources.append((path, data))
+        if not faces:
+            raise ValueError("No face found in the uploaded images")
+
+        if self._embedder is None:
+            self._embedder = FaceEmbedder(self.model_name)
+        embeddings = self._embedder.embed(faces)
+        version = add_identity(self.model_path, name, embeddings, self.model_name)
+
+        if self.cache_file:
+            # The student is enrolled at this point; a cache failure only costs a re-embed on the next retrain
+            try:
+                append_entries(self.cache_file, {
+                    EmbeddingCache.make_key(bytes_digest(data), self.model_name, self.detector_backend):
+                        {'path': path, 'embedding': embedding.tolist()}
+                    for (path, data), embedding in zip(sources, embeddings) if data is not None
+                })
+            except Exception as e:
+                print(f"Could not add {name}'s embeddings to the training cache: {str(e)}")
+        return version, len(faces)
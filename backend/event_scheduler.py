@@ -0,0 +1,182 @@
+# event_scheduler.py - Per-client Socket.IO delivery: batched recognitions, result deltas, stale-frame dropping
+import time
+import threading
+
+
+class ClientState:
+    def __init__(self):
+        self.in_flight = {}   # camera -> {seq: send time}
+        self.results = {}     # camera -> {track_id: result} as last sent to this client
+        self.acked = False
+        self.frames_sent = 0
+        self.frames_dropped = 0
+
+
+class EventScheduler:
+    """
+    Outbound Socket.IO events, scheduled per connected client.
+
+    Video frames go separately to each client that subscribed to them;
+    other sockets (e.g. the dashboard) never receive video. Once a client
+    has acked a frame ('video_frame_ack' with camera and seq), it is treated
+    as pacing-aware and its unacknowledged frames are tracked: while it has
+    max_in_flight of a camera, newer frames of that camera are skipped for
+    it alone.
+    A slow client then sees fewer, fresher frames without holding back
+    anyone else. A frame carries only the results that changed since the
+    last frame that client received ('delta': upsert/remove by trackId,
+    or 'full' on the first frame).
+
+    Recognitions are buffered and broadcast every batch_interval seconds as
+    one 'recognition_batch' event, instead of one event per student.
+
+    With metrics, each client's video_frame emit time goes to the
+    'client_emit' stage and the time the oldest recognition of a batch
+    waited from recognized() until its batch was sent to 'recognition_emit';
+    every client's unacknowledged frames are a client_frames_in_flight gauge.
+
+    emit(event, payload, to=None) sends a single event; to=None broadcasts.
+    """
+
+    def __init__(self, emit, batch_interval=0.25, max_in_flight=2, stale_after=2.0, metrics=None):
+        self.emit = emit
+        self.batch_interval = batch_interval
+        self.max_in_flight = max_in_flight
+        self.stale_after = stale_after
+        self.metrics = metrics
+        self.connected = set()
+        self.clients = {}  # video subscribers
+        self.pending = []
+        self._lock = threading.Lock()
+        self.counters = {
+            'frames_sent': 0,
+            'frames_dropped': 0,       # skipped for a client that was behind
+            'recognitions': 0,
+            'recognition_batches': 0,
+            'emit_seconds': 0.0,
+        }
+        if metrics:
+            metrics.set_gauge('queue_depth', lambda: len(self.pending), queue='recognition_events')
+            metrics.set_gauge('socket_clients', lambda: len(self.connected))
+            metrics.set_gauge('video_clients', lambda: len(self.clients))
+
+    def connect(self, sid):
+        with self._lock:
+            self.connected.add(sid)
+
+    def disconnect(self, sid):
+        with self._lock:
+            self.connected.discard(sid)
+        self.unsubscribe(sid)
+
+    def subscribe(self, sid):
+        """Start sending video frames to sid, beginning with a full set of results"""
+        with self._lock:
+            client = self.clients[sid] = ClientState()
+        if self.metrics:
+            self.metrics.set_gauge('client_frames_in_flight',
+                                   lambda: sum(len(frames) for frames in list(client.in_flight.values())),
+                                   client=sid)
+
+    def unsubscribe(self, sid):
+        with self._lock:
+            self.clients.pop(sid, None)
+        if self.metrics:
+            self.metrics.remove_gauge('client_frames_in_flight', client=sid)
+
+    def ack(self, sid, camera, seq):
+        """A client displayed frame seq of camera; it and anything older are no longer in flight"""
+        with self._lock:
+            client = self.clients.get(sid)
+            if client is None or seq is None:
+                return
+            client.acked = True
+            in_flight = client.in_flight.get(camera, {})
+            for sent in [s for s in in_flight if s <= seq]:
+                del in_flight[sent]
+
+    def send_frame(self, payload):
+        """Fan a FrameStreamer 'video_frame' payload out to every client that can take it"""
+        camera = payload['camera']
+        results = {result['trackId']: result for result in payload['results']}
+        now = time.time()
+        deliveries = []
+        with self._lock:
+            for sid, client in self.clients.items():
+                in_flight = client.in_flight.setdefault(camera, {})
+                if client.acked and len(in_flight) >= self.max_in_flight:
+                    if now - min(in_flight.values()) < self.stale_after:
+                        client.frames_dropped += 1
+                        self.counters['frames_dropped'] += 1
+                        if self.metrics:
+                            self.metrics.inc('frames_dropped_total', stage='client_backpressure')
+                        continue
+                    in_flight.clear()  # acks were lost
+                if client.acked:
+                    in_flight[payload['seq']] = now
+                deliveries.append((sid, self._delta(client, camera, results)))
+                client.frames_sent += 1
+
+        emit_seconds = 0.0
+        for sid, delta in deliveries:
+            message = {key: value for key, value in payload.items() if key != 'results'}
+            message['delta'] = delta
+            start = time.perf_counter()
+            self.emit('video_frame', message, to=sid)
+            elapsed = time.perf_counter() - start
+            emit_seconds += elapsed
+            if self.metrics:
+                self.metrics.observe('client_emit', elapsed)
+        with self._lock:
+            self.counters['frames_sent'] += len(deliveries)
+            self.counters['emit_seconds'] += emit_seconds
+
+    def _delta(self, client, camera, results):
+        previous = client.results.get(camera)
+        client.results[camera] = results
+        if previous is None:
+            return {'full': True, 'upsert': list(results.values()), 'remove': []}
+        return {
+            'full': False,
+            'upsert': [result for track_id, result in results.items() if previous.get(track_id) != result],
+            'remove': [track_id for track_id in previous if track_id not in results],
+        }
+
+    def recognized(self, name):
+        """Queue a recognition for the next batch; never emits on the caller's thread"""
+        with self._lock:
+            self.pending.append((name, time.perf_counter()))
+
+    def flush(self):
+        with self._lock:
+            pending, self.pending = self.pending, []
+        if not pending:
+            return
+        start = time.perf_counter()
+        self.emit('recognition_batch', {'type': 'recognition', 'names': [name for name, _ in pending]})
+        now = time.perf_counter()
+        with self._lock:
+            self.counters['recognitions'] += len(pending)
+            self.counters['recognition_batches'] += 1
+            self.counters['emit_seconds'] += now - start
+        if self.metrics:
+            # Queued at recognition to sent, for the recognition that waited longest
+            self.metrics.observe('recognition_emit', now - pending[0][1])
+
+    def run(self, exit_event=None):
+        """Flush recognitions every batch_interval seconds, for as long as the server runs"""
+        exit_event = exit_event or threading.Event()
+        while not exit_event.wait(self.batch_interval):
+            self.flush()
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters, pending=len(self.pending))
+            stats['emit_seconds'] = round(stats['emit_seconds'], 3)
+            stats['clients'] = {
+                sid: {'sent': client.frames_sent, 'dropped': client.frames_dropped,
+                      'in_flight': sum(len(frames) for frames in client.in_flight.values())}
+                for sid, client in self.clients.items()
+            }
+            return stats
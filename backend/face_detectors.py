@@ -0,0 +1,90 @@
+# face_detectors.py - Registry of face detector backends with per-thread cached instances
+import threading
+import cv2
+
+DETECTORS = {}
+_local = threading.local()
+
+
+def register_detector(name):
+    """Class decorator adding a FaceDetector subclass to the registry under name"""
+    def register(cls):
+        DETECTORS[name] = cls
+        return cls
+    return register
+
+
+def available_detectors():
+    return tuple(DETECTORS)
+
+
+def get_detector(name, **options):
+    """
+    The calling thread's instance of detector backend name, created on first
+    use. Instances are never shared between threads, so backends that keep
+    state between calls (MediaPipe) are safe in a worker pool.
+    """
+    if name not in DETECTORS:
+        raise ValueError(f"Unknown detector backend {name!r}, expected one of {available_detectors()}")
+    cache = getattr(_local, 'detectors', None)
+    if cache is None:
+        cache = _local.detectors = {}
+    key = (name, tuple(sorted(options.items())))
+    if key not in cache:
+        cache[key] = DETECTORS[name](**options)
+    return cache[key]
+
+
+class FaceDetector:
+    """Common interface: detect(frames) returns one list of (x1, y1, x2, y2) boxes per BGR frame"""
+
+    def detect(self, frames):
+        return [self.detect_one(frame) for frame in frames]
+
+    def detect_one(self, frame):
+        raise NotImplementedError
+
+
+@register_detector("opencv")
+class HaarDetector(FaceDetector):
+    """OpenCV Haar cascade; the XML is loaded once per instance instead of on every call"""
+
+    def __init__(self, scale_factor=1.1, min_neighbors=5, min_size=(30, 30)):
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+        self.cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+
+    def detect_one(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        faces = self.cascade.detectMultiScale(
+            gray,
+            scaleFactor=self.scale_factor,
+            minNeighbors=self.min_neighbors,
+            minSize=self.min_size
+        )
+        return [(x, y, x + w, y + h) for (x, y, w, h) in faces]
+
+
+@register_detector("mediapipe")
+class MediaPipeDetector(FaceDetector):
+    """MediaPipe short-range face detection; one graph per instance"""
+
+    def __init__(self, min_detection_confidence=0.5):
+        import mediapipe as mp  # only needed when this backend is used
+        self.detector = mp.solutions.face_detection.FaceDetection(min_detection_confidence=min_detection_confidence)
+
+    def detect_one(self, frame):
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        results = self.detector.process(rgb_frame)
+        face_boxes = []
+        if results.detections:
+            h, w, _ = frame.shape
+            for detection in results.detections:
+                bbox = detection.location_data.relative_bounding_box
+                face_boxes.append((
+                    int(bbox.xmin * w),
+                    int(bbox.ymin * h),
+                    int((bbox.xmin + bbox.width) * w),
+                    int((bbox.ymin + bbox.height) * h)))
+        return face_boxes
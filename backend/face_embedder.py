@@ -0,0 +1,76 @@
+# face_embedder.py - Batched forward passes through a preloaded DeepFace model
+import cv2
+import numpy as np
+from deepface import DeepFace
+
+
+def resize_with_padding(img, target_size):
+    """
+    Letterbox img into target_size (height, width) and scale to [0, 1],
+    exactly as deepface.modules.preprocessing.resize_image does for one face.
+    """
+    factor = min(target_size[0] / img.shape[0], target_size[1] / img.shape[1])
+    dsize = (int(img.shape[1] * factor), int(img.shape[0] * factor))
+    img = cv2.resize(img, dsize)
+
+    diff_0 = target_size[0] - img.shape[0]
+    diff_1 = target_size[1] - img.shape[1]
+    img = np.pad(
+        img,
+        ((diff_0 // 2, diff_0 - diff_0 // 2), (diff_1 // 2, diff_1 - diff_1 // 2), (0, 0)),
+        "constant",
+    )
+    if img.shape[0:2] != tuple(target_size):
+        img = cv2.resize(img, (target_size[1], target_size[0]))
+
+    img = img.astype(np.float32)
+    if img.max() > 1:
+        img /= 255.0
+    return img
+
+
+class FaceEmbedder:
+    """
+    Holds one DeepFace recognition model and embeds many face crops per
+    forward pass. Per-face preprocessing mirrors DeepFace.represent with
+    normalization="base", so the vectors match the one-call-per-face path.
+    """
+
+    def __init__(self, model_name="Facenet512"):
+        self.model_name = model_name
+        self.model = DeepFace.build_model(model_name)
+        # input_shape is (width, height) on DeepFace clients; represent() swaps it
+        width, height = self.model.input_shape
+        self.target_size = (height, width)
+
+    def preprocess(self, face):
+        """One face as returned by DeepFace.extract_faces (RGB, [0, 1]) -> model input"""
+        return resize_with_padding(face[:, :, ::-1], self.target_size)
+
+    def preprocess_bgr_crop(self, crop):
+        """A raw BGR crop of a frame, preprocessed like represent(..., detector_backend="skip")"""
+        return resize_with_padding(crop[:, :, ::-1], self.target_size)
+
+    def forward(self, batch):
+        """Embeddings for an already preprocessed (N, H, W, 3) float32 batch"""
+        network = getattr(self.model, 'model', self.model)
+        try:
+            return np.asarray(network(batch, training=False), dtype=np.float32)
+        except TypeError:
+            # Non-Keras clients only expose single-image forward()
+            return np.asarray([self.model.forward(img[None]) for img in batch], dtype=np.float32)
+
+    def embed(self, faces, batch_size=32):
+        """Embed a list of extract_faces-style faces; returns an (N, dim) float32 array"""
+        return self._embed_preprocessed([self.preprocess(face) for face in faces], batch_size)
+
+    def embed_bgr_crops(self, crops, batch_size=32):
+        """Embed raw BGR frame crops in as few forward passes as batch_size allows"""
+        return self._embed_preprocessed([self.preprocess_bgr_crop(crop) for crop in crops], batch_size)
+
+    def _embed_preprocessed(self, inputs, batch_size):
+        if not inputs:
+            return np.zeros((0, 0), dtype=np.float32)
+        outputs = [self.forward(np.stack(inputs[start:start + batch_size]))
+                   for start in range(0, len(inputs), batch_size)]
+        return np.concatenate(outputs)
@@ -0,0 +1,191 @@
+# face_gallery.py - Matrix-backed gallery of known face embeddings
+import numpy as np
+
+from quantization import quantize, dequantize, similarities
+
+UNKNOWN = "Unknown"
+
+
+def l2_normalize(vectors, eps=1e-10):
+    """Return float32 copies of the row vectors scaled to unit length"""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, eps)
+
+
+class FaceGallery:
+    """
+    All known embeddings as one L2-normalized float32 matrix plus an int
+    label per row, so a batch of queries is scored with one matrix product.
+    Distances are cosine distances (1 - cosine similarity), the same values
+    scipy.spatial.distance.cosine returns.
+    """
+
+    def __init__(self, embeddings, labels, names):
+        self.embeddings = l2_normalize(embeddings) if len(embeddings) else np.zeros((0, 0), dtype=np.float32)
+        self.labels = np.asarray(labels, dtype=np.int32)
+        self.names = list(names)
+        self.scales = None
+        self.index = None
+        self.metadata = {}
+        if len(self.labels) != len(self.embeddings):
+            raise ValueError("Every embedding needs exactly one label")
+
+    @classmethod
+    def from_normalized(cls, embeddings, labels, names):
+        """Wrap arrays that are already unit-length float32 (e.g. read-only memory maps) without copying"""
+        gallery = cls.__new__(cls)
+        gallery.embeddings = embeddings
+        gallery.labels = labels
+        gallery.names = names
+        gallery.scales = None
+        gallery.index = None
+        gallery.metadata = {}
+        return gallery
+
+    @classmethod
+    def from_dict(cls, known_faces):
+        """Build a gallery from the {name: [embedding, ...]} dict train_model stores"""
+        names = []
+        rows = []
+        labels = []
+        for person_name, embeddings in known_faces.items():
+            if len(embeddings) == 0:
+                continue
+            label = len(names)
+            names.append(person_name)
+            for embedding in embeddings:
+                rows.append(embedding)
+                labels.append(label)
+        return cls(np.asarray(rows, dtype=np.float32), labels, names)
+
+    def to_dict(self):
+        known_faces = {str(name): [] for name in self.names}
+        for row, label in zip(self.float32_embeddings(), self.labels):
+            known_faces[str(self.names[label])].append(row.tolist())
+        return known_faces
+
+    def with_identity(self, name, embeddings):
+        """
+        New float32 gallery where name's rows are replaced by embeddings,
+        appended after everyone else's. Other identities keep their rows.
+        """
+        new_rows = l2_normalize(embeddings)
+        names = [str(n) for n in self.names]
+        if len(self) and new_rows.shape[1] != self.dim:
+            raise ValueError(f"Embedding size {new_rows.shape[1]} does not match the gallery's {self.dim}")
+        keep = np.ones(len(self), dtype=bool)
+        if name in names:
+            label = names.index(name)
+            keep = self.labels != label
+        else:
+            label = len(names)
+            names.append(name)
+        rows = np.concatenate([self.float32_embeddings()[keep], new_rows]) if len(self) else new_rows
+        labels = np.concatenate([self.labels[keep], np.full(len(new_rows), label, dtype=np.int32)])
+        return FaceGallery.from_normalized(np.ascontiguousarray(rows, dtype=np.float32), labels, names)
+
+    def __len__(self):
+        return len(self.labels)
+
+    @property
+    def dim(self):
+        return self.embeddings.shape[1] if len(self) else 0
+
+    @property
+    def num_identities(self):
+        return len(self.names)
+
+    @property
+    def precision(self):
+        return {np.dtype(np.float16): "float16", np.dtype(np.int8): "int8"}.get(self.embeddings.dtype, "float32")
+
+    @property
+    def nbytes(self):
+        """
+        Bytes held by the embedding matrix (and int8 scales), plus the IVF
+        index's copy of it when one is set; labels are the same at every precision
+        """
+        nbytes = self.embeddings.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+        return nbytes + (self.index.nbytes if self.index is not None else 0)
+
+    def quantize(self, precision):
+        """
+        Copy of this gallery with the matrix stored as float16 or per-dimension
+        int8 codes. Queries stay float32; codes are widened in small chunks at
+        search time, so only the compact matrix stays resident.
+        """
+        if precision == self.precision:
+            return self
+        codes, scales = quantize(self.float32_embeddings(), precision)
+        gallery = FaceGallery.from_normalized(codes, self.labels, self.names)
+        gallery.scales = scales
+        gallery.metadata = dict(self.metadata, precision=precision)
+        return gallery
+
+    def float32_embeddings(self):
+        if self.embeddings.dtype == np.float32:
+            return self.embeddings
+        return dequantize(self.embeddings, self.scales)
+
+    def distances(self, queries):
+        """Cosine distance matrix of shape (num_queries, num_embeddings)"""
+        return 1.0 - similarities(l2_normalize(queries), self.embeddings, self.scales)
+
+    def set_index(self, index):
+        """
+        Route searches through an approximate index (e.g. ann_index.IVFIndex);
+        None restores exact search. The index keeps its own list-ordered copy
+        of the rows at this gallery's precision.
+        """
+        if index is not None:
+            index.attach(self.embeddings, self.scales)
+        self.index = index
+
+    def search(self, queries, k=1, exact=False):
+        """
+        Top-k nearest stored embeddings for each query.
+        Returns (distances, labels), both shaped (num_queries, k) and sorted
+        nearest first. Label -1 pads rows when the gallery has fewer than k entries.
+        """
+        queries = np.atleast_2d(queries)
+        if len(self) == 0 or len(queries) == 0:
+            return (np.full((len(queries), k), np.inf, dtype=np.float32),
+                    np.full((len(queries), k), -1, dtype=np.int32))
+        if self.index is not None and not exact:
+            dist, rows = self.index.search(l2_normalize(queries), k)
+        else:
+            dist, rows = self._exact_search(queries, k)
+        labels = np.where(rows >= 0, self.labels[rows], -1).astype(np.int32)
+        return dist, labels
+
+    def _exact_search(self, queries, k):
+        out_dist = np.full((len(queries), k), np.inf, dtype=np.float32)
+        out_rows = np.full((len(queries), k), -1, dtype=np.int64)
+        dist = self.distances(queries)
+        kk = min(k, dist.shape[1])
+        if kk == 1:
+            rows = np.argmin(dist, axis=1)[:, None]
+        else:
+            rows = np.argpartition(dist, kk - 1, axis=1)[:, :kk]
+            order = np.argsort(np.take_along_axis(dist, rows, axis=1), axis=1, kind='stable')
+            rows = np.take_along_axis(rows, order, axis=1)
+        out_dist[:, :kk] = np.take_along_axis(dist, rows, axis=1)
+        out_rows[:, :kk] = rows
+        return out_dist, out_rows
+
+    def match(self, queries, threshold=0.3):
+        """
+        Best (name, confidence) for every query with recognize_face semantics:
+        a match needs a distance strictly below threshold, and confidence is
+        1 - distance clamped to [0, 1] (quantized distances can dip just
+        below 0), or 1 - threshold for "Unknown".
+        """
+        best_dist, best_labels = self.search(queries, k=1)
+        results = []
+        for distance, label in zip(best_dist[:, 0], best_labels[:, 0]):
+            if label >= 0 and distance < threshold:
+                results.append((str(self.names[label]), min(1.0, max(0.0, 1.0 - float(distance)))))
+            else:
+                results.append((UNKNOWN, max(0.0, 1.0 - threshold)))
+        return results
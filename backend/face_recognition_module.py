@@ -1,17 +1,26 @@
 # face_recognition_module.py - Enhanced Face Recognition Attendance System
 import cv2
 import os
-import datetime
 import numpy as np
 import torch
 import threading
 import queue
 import time
-import base64
-import pickle
 from deepface import DeepFace
-from scipy.spatial.distance import cosine
-import mediapipe as mp  # New import for MediaPipe
+from face_gallery import FaceGallery
+from ann_index import IVFIndex, index_path_for
+from gallery_store import save_gallery, save_retrained_gallery, load_gallery, gallery_exists, gallery_dir_for, migrate_pickle, INDEX_FILE
+from gallery_watcher import GalleryWatcher
+from pipeline_metrics import metrics
+from attendance_sink import AttendanceSink
+from face_embedder import FaceEmbedder
+from face_tracker import FaceTracker
+from process_workers import ProcessWorkerPool
+from frame_streamer import FrameStreamer
+from frame_ring import FrameRing
+from frame_scheduler import FrameScheduler, DETECT, SKIP
+from face_detectors import get_detector, available_detectors
+from enrollment_pipeline import list_training_images, embed_training_images, print_progress
 
 # Global variables for thread communication
 frame_queue = queue.Queue(maxsize=2)  # Store frames to be processed
@@ -19,33 +28,58 @@ result_queue = queue.Queue()  # Store detection results
 exit_event = threading.Event()  # Signal to exit threads
 recognition_callback = None
 _socketio = None  # SocketIO instance
-
-# Initialize MediaPipe Face Detection
-mp_face_detection = mp.solutions.face_detection
-mp_drawing = mp.solutions.drawing_utils
-face_detector = mp_face_detection.FaceDetection(min_detection_confidence=0.5)
+_streamer = None  # FrameStreamer of the running stream thread
+_event_scheduler = None  # EventScheduler delivering frames per client, if the server set one
 
 def set_socketio(socketio_instance):
     """Set the SocketIO instance for video streaming"""
     global _socketio
     _socketio = socketio_instance
 
-def extract_face_embedding(image_path, model_name="Facenet512"):
+def set_event_scheduler(scheduler):
+    """Route video frames through an EventScheduler (per-client deltas and backpressure) instead of broadcasting"""
+    global _event_scheduler
+    _event_scheduler = scheduler
+
+def extract_face_embedding(image_path, model_name="Facenet512", detector_backend="opencv"):
     """Extract face embedding from a single image file"""
     try:
         embedding = DeepFace.represent(
             img_path=image_path,
             model_name=model_name,
             enforce_detection=False,
-            detector_backend="opencv"
+            detector_backend=detector_backend
         )[0]['embedding']
         return embedding
     except Exception as e:
         print(f"Error extracting embedding from {image_path}: {str(e)}")
         return None
 
+def build_search_index(gallery, model_save_path, nlist=None, nprobe=8):
+    """Build the IVF index for a gallery and persist it next to the model"""
+    if len(gallery) == 0:
+        return None
+    index = IVFIndex.build(gallery.embeddings, nlist=nlist, nprobe=nprobe)
+    index.save(index_path_for(model_save_path))
+    print(f"Saved IVF index ({index.nlist} lists) to {index_path_for(model_save_path)}")
+    return index
+
+def save_trained_embeddings(trained_embeddings, model_save_path, model_name="Facenet512", since_version=None):
+    """
+    Store a {name: [embedding, ...]} dict in the memory-mapped gallery format, plus its IVF index.
+    since_version is the stored version the training data was listed at; students enrolled after
+    it are kept (see save_retrained_gallery).
+    """
+    gallery = FaceGallery.from_dict(trained_embeddings)
+    if since_version is None:
+        version = save_gallery(gallery, model_save_path, model_name)
+    else:
+        version, gallery = save_retrained_gallery(gallery, model_save_path, since_version, model_name)
+    build_search_index(gallery, model_save_path)
+    return version
+
 def train_model(face_data=None, labels=None, model_save_path='trained_models/face_recognition_model', 
-               known_faces_dir="known_faces", model_name="Facenet512"):
+               known_faces_dir="known_faces", model_name="Facenet512", since_version=None):
     """
     Enhanced training function that handles both:
     1. Traditional directory-based training (original functionality)
@@ -59,16 +93,15 @@ def train_model(face_data=None, labels=None, model_save_path='trained_models/fac
                     trained_embeddings[name] = []
                 trained_embeddings[name].append(emb)
             
-            os.makedirs(os.path.dirname(model_save_path), exist_ok=True)
-            with open(model_save_path, 'wb') as f:
-                pickle.dump(trained_embeddings, f)
+            version = save_trained_embeddings(trained_embeddings, model_save_path, model_name, since_version)
             
             return {
                 'success': True,
                 'message': 'Model trained from embeddings',
                 'details': {
                     'total_embeddings': len(face_data),
-                    'unique_people': len(trained_embeddings)
+                    'unique_people': len(trained_embeddings),
+                    'gallery_version': version
                 }
             }
         except Exception as e:
@@ -86,40 +119,31 @@ def train_model(face_data=None, labels=None, model_save_path='trained_models/fac
 # Original Functions (Preserved)
 def train_face_recognition_model(known_faces_dir="known_faces", 
                                  embeddings_file='trained_models/face_recognition_model', 
-                                 model_name="Facenet512"):
+                                 model_name="Facenet512", batch_size=32, workers=4,
+                                 progress_callback=print_progress):
     print(f"Training model with {model_name}...")
     
     if not os.path.exists(known_faces_dir):
         raise ValueError(f"Directory {known_faces_dir} not found")
     
-    trained_embeddings = {}
-    for person_name in os.listdir(known_faces_dir):
-        person_path = os.path.join(known_faces_dir, person_name)
-        if os.path.isdir(person_path):
-            trained_embeddings[person_name] = []
-            for img_name in os.listdir(person_path):
-                img_path = os.path.join(person_path, img_name)
-                try:
-                    embedding = DeepFace.represent(
-                        img_path, 
-                        model_name=model_name,
-                        enforce_detection=False,
-                        detector_backend="opencv"
-                    )[0]['embedding']
-                    trained_embeddings[person_name].append(embedding)
-                except Exception as e:
-                    print(f"Skipped {img_path}: {str(e)}")
+    people, images = list_training_images(known_faces_dir)
+    trained_embeddings = {person_name: [] for person_name in people}
+    face_data, labels, stats = embed_training_images(
+        images, model_name=model_name, detector_backend="opencv",
+        batch_size=batch_size, workers=workers, progress_callback=progress_callback
+    )
+    for embedding, person_name in zip(face_data, labels):
+        trained_embeddings[person_name].append(embedding)
+    print(f"Embedded {stats['embedded']} of {stats['images']} images at {stats['images_per_second']} img/s")
     
-    with open(embeddings_file, 'wb') as f:
-        pickle.dump(trained_embeddings, f)
+    save_trained_embeddings(trained_embeddings, embeddings_file, model_name)
     
     print(f"Trained model saved to {embeddings_file}")
     return trained_embeddings
 
 def load_trained_embeddings(embeddings_file='trained_models/face_recognition_model'):
     try:
-        with open(embeddings_file, 'rb') as f:
-            return pickle.load(f)
+        return load_known_faces(embeddings_file).to_dict()
     except FileNotFoundError:
         print(f"No pre-trained embeddings found at {embeddings_file}. Run model training first.")
         return {}
@@ -131,80 +155,38 @@ def set_callback(callback_function):
     global recognition_callback
     recognition_callback = callback_function
 
-def create_attendance_file(filename="attendance.csv"):
-    if not os.path.exists(filename):
-        with open(filename, "w") as f:
-            f.write("Name,Time\n")
-    return filename
-
 def load_known_faces(embeddings_file='trained_models/face_recognition_model'):
+    """Open the trained gallery memory-mapped, migrating a legacy pickle model on first use"""
+    if not gallery_exists(embeddings_file):
+        if not os.path.exists(embeddings_file):
+            raise FileNotFoundError(f"No trained model found at {embeddings_file}")
+        try:
+            migrate_pickle(embeddings_file)
+        except Exception as e:
+            raise RuntimeError(f"Error migrating embeddings: {str(e)}")
     try:
-        with open(embeddings_file, 'rb') as f:
-            embeddings = pickle.load(f)
-            if not embeddings:
-                raise ValueError("Trained embeddings file is empty")
-            return embeddings
-    except FileNotFoundError:
-        raise FileNotFoundError(f"No trained model found at {embeddings_file}")
+        gallery = load_gallery(embeddings_file)
     except Exception as e:
         raise RuntimeError(f"Error loading embeddings: {str(e)}")
+    if len(gallery) == 0:
+        raise RuntimeError("Error loading embeddings: Trained gallery is empty")
+    return gallery
 
-def mark_attendance(name, attendance_file):
-    with open(attendance_file, "a") as f:
-        timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        f.write(f"{name},{timestamp}\n")
-    print(f"Marked attendance for {name} at {timestamp}")
+def announce_recognition(name):
     if recognition_callback:
         recognition_callback(name)
 
 def recognize_face(face_embedding, known_faces, threshold=0.3):
-    best_match = "Unknown"
-    min_distance = threshold
-    
-    for person_name, embeddings in known_faces.items():
-        for stored_embedding in embeddings:
-            distance = cosine(face_embedding, stored_embedding)
-            if distance < min_distance:
-                best_match = person_name
-                min_distance = distance
-    
-    confidence = max(0, 1 - min_distance)  # Confidence as a percentage
-    return best_match, confidence
+    if not isinstance(known_faces, FaceGallery):
+        known_faces = FaceGallery.from_dict(known_faces)
+    return known_faces.match([face_embedding], threshold)[0]
 
 def detect_faces_opencv(frame, scale_factor=1.1, min_neighbors=5, min_size=(30, 30)):
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    
-    faces = face_cascade.detectMultiScale(
-        gray,
-        scaleFactor=scale_factor,
-        minNeighbors=min_neighbors,
-        minSize=min_size
-    )
-    
-    face_boxes = []
-    for (x, y, w, h) in faces:
-        face_boxes.append((x, y, x+w, y+h))
-    
-    return face_boxes
+    detector = get_detector("opencv", scale_factor=scale_factor, min_neighbors=min_neighbors, min_size=min_size)
+    return detector.detect_one(frame)
 
-# New Function: MediaPipe Face Detection
 def detect_faces_mediapipe(frame):
-    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    results = face_detector.process(rgb_frame)
-    face_boxes = []
-    
-    if results.detections:
-        for detection in results.detections:
-            bboxC = detection.location_data.relative_bounding_box
-            h, w, _ = frame.shape
-            x1 = int(bboxC.xmin * w)
-            y1 = int(bboxC.ymin * h)
-            x2 = int((bboxC.xmin + bboxC.width) * w)
-            y2 = int((bboxC.ymin + bboxC.height) * h)
-            face_boxes.append((x1, y1, x2, y2))
-    
-    return face_boxes
+    return get_detector("mediapipe").detect_one(frame)
 
 def extract_face_region(frame, box, margin=10):
     x1, y1, x2, y2 = box
@@ -220,243 +202,547 @@ def extract_face_region(frame, box, margin=10):
     face_region = frame[y1:y2, x1:x2]
     return face_region
 
-def detection_recognition_thread(model_name, known_faces, device, attendance_file, detector_backend="mediapipe"):
-    marked_present = set()
-    last_detection_time = time.time() - 10
-    detection_interval = 0.5
+def embed_face_regions(face_regions, embedder=None, model_name="Facenet512"):
+    """Embed every face crop of a frame in one batched forward pass, or one by one without an embedder"""
+    if embedder is not None:
+        return embedder.embed_bgr_crops(face_regions, batch_size=len(face_regions))
+    return np.array([
+        DeepFace.represent(
+            face_region,
+            model_name=model_name,
+            enforce_detection=False,
+            detector_backend="skip"
+        )[0]['embedding']
+        for face_region in face_regions
+    ], dtype=np.float32)
+
+class CameraState:
+    """Per-camera tracker and last results, shared by whichever worker handles its frames"""
+    def __init__(self, camera_id):
+        self.camera_id = camera_id
+        self.lock = threading.Lock()
+        self.tracker = FaceTracker()
+        self.last_results = []
+
+class RecognitionSession:
+    """State shared by the detection/recognition worker pool of one recognition run"""
+    def __init__(self, model_name, known_faces, device, attendance_sink, detector_backend, camera_ids):
+        self.model_name = model_name
+        self.known_faces = known_faces
+        self.device = device
+        self.attendance_sink = attendance_sink
+        self.frame_scheduler = None  # FrameScheduler fed back with processed frames, in the main process
+        self.detector_backend = detector_backend
+        self.cameras = {camera_id: CameraState(camera_id) for camera_id in camera_ids}
+        self.marked_present = set()
+        self.faces_seen = 0
+        self.faces_embedded = 0
+        self.stats_start = time.time()
+        self._lock = threading.Lock()
+        self._embedder = None
+        self._embedder_loaded = False
+
+    def get_embedder(self):
+        """Load the recognition model once for all workers; None means fall back to DeepFace.represent"""
+        with self._lock:
+            if not self._embedder_loaded:
+                self._embedder_loaded = True
+                try:
+                    if self.device.type == "cuda":
+                        print("Using GPU for face recognition")
+                        with torch.cuda.device(self.device.index):
+                            self._embedder = FaceEmbedder(self.model_name)
+                    else:
+                        print("Using CPU for face recognition")
+                        self._embedder = FaceEmbedder(self.model_name)
+                except Exception as e:
+                    print(f"Error loading DeepFace model: {str(e)}")
+            return self._embedder
+
+    def swap_gallery(self, known_faces):
+        """
+        Replace the gallery between frames: workers read known_faces once per frame,
+        so a frame is matched against either the old or the new gallery, never a mix.
+        Tracks still unrecognized are retried right away, so a newly enrolled student
+        does not wait for the retry interval. marked_present is kept.
+        """
+        self.known_faces = known_faces
+        for camera in self.cameras.values():
+            with camera.lock:
+                for track in camera.tracker.tracks:
+                    if not track.resolved:
+                        track.last_recognized = None
+
+    def watch_gallery(self, embeddings_file, precision="float32", search_index="exact", nprobe=None, interval=2.0):
+        """A GalleryWatcher that reloads embeddings_file with this session's settings into swap_gallery"""
+        return GalleryWatcher(
+            embeddings_file,
+            lambda: prepare_gallery(embeddings_file, self.model_name, precision, search_index, nprobe),
+            self.swap_gallery,
+            self.known_faces.metadata.get('version', 0),
+            interval
+        )
+
+    def claim_attendance(self, name):
+        """True the first time name is recognized on any camera in this session"""
+        with self._lock:
+            if name in self.marked_present:
+                return False
+            self.marked_present.add(name)
+            return True
+
+    def count_faces(self, seen, embedded):
+        with self._lock:
+            self.faces_seen += seen
+            self.faces_embedded += embedded
+            now = time.time()
+            if now - self.stats_start >= 60:
+                minutes = (now - self.stats_start) / 60
+                live_tracks = sum(len(camera.tracker.tracks) for camera in self.cameras.values())
+                print(f"Tracker: {self.faces_embedded / minutes:.0f} embeddings/min for "
+                      f"{self.faces_seen / minutes:.0f} detected faces/min, {live_tracks} live tracks")
+                self.faces_seen = self.faces_embedded = 0
+                self.stats_start = now
+
+def detect_and_scale(frame, detector, detection_size=(320, 240), timings=None):
+    """Detect on a downscaled copy of the frame and map the boxes back to full resolution"""
+    start = time.perf_counter()
+    detection_frame = cv2.resize(frame, detection_size)
+    resized = time.perf_counter()
+    face_boxes = detector.detect([detection_frame])[0]
+    if timings is not None:
+        timings['resize'] = resized - start
+        timings['detect'] = time.perf_counter() - resized
     
-    print(f"Detection thread started, recognition on: {device}, detector: {detector_backend}")
+    scale_x = frame.shape[1] / detection_size[0]
+    scale_y = frame.shape[0] / detection_size[1]
     
-    processing_times = []
+    scaled_boxes = []
+    for box in face_boxes:
+        x1, y1, x2, y2 = box
+        scaled_box = (
+            int(x1 * scale_x), 
+            int(y1 * scale_y), 
+            int(x2 * scale_x), 
+            int(y2 * scale_y))
+        scaled_boxes.append(scaled_box)
+    return scaled_boxes
+
+def recognize_frame(camera, frame, current_time, detector, embedder, known_faces, model_name, timings=None, detect=True):
+    """
+    Detect, track and recognize one frame of a camera; with detect False (the frame
+    scheduler passed it through for the stream only) the camera's last results are returned.
+    Returns (results, matches, faces_seen): results are (box, name, confidence, track_id)
+    for every live track, matches are the (name, confidence) pairs recognized on this frame.
+    If timings is a dict, the seconds spent in each stage that ran are stored in it.
+    """
+    if not detect:
+        with camera.lock:
+            return camera.last_results, [], 0
     
-    try:
-        if device.type == "cuda":
-            print("Using GPU for face recognition")
-            with torch.cuda.device(device.index):
-                face_model = DeepFace.build_model(model_name)
-        else:
-            print("Using CPU for face recognition")
-            face_model = DeepFace.build_model(model_name)
-    except Exception as e:
-        print(f"Error loading DeepFace model: {str(e)}")
+    scaled_boxes = detect_and_scale(frame, detector, timings=timings)
+    
+    crops = []
+    crop_tracks = []
+    with camera.lock:
+        tracks = camera.tracker.update(scaled_boxes, current_time)
+        for track in tracks:
+            if not camera.tracker.needs_recognition(track, current_time):
+                continue
+            face_region = extract_face_region(frame, track.box)
+            if face_region is not None and face_region.size > 0:
+                # Claim the track so another worker does not embed it concurrently
+                track.last_recognized = current_time
+                crops.append(face_region)
+                crop_tracks.append(track)
+    
+    matches = []
+    if crops:
+        try:
+            embed_start = time.perf_counter()
+            embeddings = embed_face_regions(crops, embedder, model_name)
+            match_start = time.perf_counter()
+            matches = known_faces.match(embeddings)
+            if timings is not None:
+                timings['embed'] = match_start - embed_start
+                timings['match'] = time.perf_counter() - match_start
+        except Exception as e:
+            print(f"Error processing faces: {str(e)}")
+    
+    with camera.lock:
+        for track, (name, confidence) in zip(crop_tracks, matches):
+            camera.tracker.assign(track, name, confidence, current_time)
+        current_results = [(t.box, t.name, t.confidence, t.track_id) for t in tracks]
+        camera.last_results = current_results
+    
+    return current_results, matches, len(tracks)
+
+def record_frame_metrics(timings, matches):
+    metrics.observe_all(timings)
+    metrics.inc('frames_processed_total')
+    if matches:
+        metrics.inc('embeddings_total', len(matches))
+
+def report_matches(session, camera_id, matches):
+    """Mark attendance for recognitions not yet seen on any camera in this session"""
+    for name, confidence in matches:
+        if name != "Unknown" and session.claim_attendance(name):
+            session.attendance_sink.submit(name)
+            print(f"Recognized: {name} on camera {camera_id} with confidence: {confidence:.2f}")
+
+def detection_recognition_thread(session, worker_id=0):
+    """One worker of the shared pool: takes frames from frame_queue, whichever camera they came from"""
+    print(f"Detection worker {worker_id} started, recognition on: {session.device}, detector: {session.detector_backend}")
     
-    detect_faces = detect_faces_mediapipe if detector_backend == "mediapipe" else detect_faces_opencv
+    embedder = session.get_embedder()
+    detector = get_detector(session.detector_backend)
     
     while not exit_event.is_set():
         try:
             try:
-                frame = frame_queue.get(timeout=1.0)
+                camera_id, frame_ref, captured_at, detect = frame_queue.get(timeout=1.0)
             except queue.Empty:
                 continue
             
-            current_time = time.time()
-            current_results = []
-            
-            should_detect = (current_time - last_detection_time) >= detection_interval
-            
-            if should_detect:
-                process_start = time.time()
-                
-                detection_size = (320, 240)
-                detection_frame = cv2.resize(frame, detection_size)
-                
-                face_boxes = detect_faces(detection_frame)
-                
-                scale_x = frame.shape[1] / detection_size[0]
-                scale_y = frame.shape[0] / detection_size[1]
-                
-                scaled_boxes = []
-                for box in face_boxes:
-                    x1, y1, x2, y2 = box
-                    scaled_box = (
-                        int(x1 * scale_x), 
-                        int(y1 * scale_y), 
-                        int(x2 * scale_x), 
-                        int(y2 * scale_y))
-                    scaled_boxes.append(scaled_box)
-                
-                for box in scaled_boxes:
-                    face_region = extract_face_region(frame, box)
-                    
-                    if face_region is not None and face_region.size > 0:
-                        try:
-                            face_embedding = DeepFace.represent(
-                                face_region, 
-                                model_name=model_name, 
-                                enforce_detection=False,
-                                detector_backend="skip"
-                            )[0]['embedding']
-                            
-                            name, confidence = recognize_face(face_embedding, known_faces)
-                            current_results.append((box, name, confidence))
-                            
-                            if name != "Unknown" and name not in marked_present:
-                                mark_attendance(name, attendance_file)
-                                marked_present.add(name)
-                                print(f"Recognized: {name} with confidence: {confidence:.2f}")
-                        
-                        except Exception as e:
-                            print(f"Error processing face: {str(e)}")
-                
-                last_detection_time = current_time
-                
-                process_time = time.time() - process_start
-                processing_times.append(process_time)
-                
-                if len(processing_times) > 10:
-                    avg_process_time = sum(processing_times[-10:]) / 10
-                    detection_interval = max(0.1, min(1.0, avg_process_time * 1.2))
-                    processing_times = processing_times[-20:]
+            timings = {}
+            try:
+                current_results, matches, faces_seen = recognize_frame(
+                    session.cameras[camera_id], frame_ref.frame, time.time(), detector,
+                    embedder, session.known_faces, session.model_name, timings, detect
+                )
+            except Exception:
+                frame_ref.release()
+                raise
+            report_matches(session, camera_id, matches)
+            session.count_faces(faces_seen, len(matches))
+            record_frame_metrics(timings, matches)
+            if session.frame_scheduler:
+                session.frame_scheduler.observe(captured_at, timings)
             
-            if current_results or not should_detect:
-                result_queue.put((frame, current_results))
+            # The frame reference travels on to the stream stage, which releases it
+            result_queue.put((camera_id, frame_ref, current_results, captured_at))
             
         except Exception as e:
-            print(f"Error in detection thread: {str(e)}")
+            print(f"Error in detection worker {worker_id}: {str(e)}")
     
-    print("Detection thread stopped")
+    print(f"Detection worker {worker_id} stopped")
 
-def video_capture_thread(camera_id=0):
-    cap = cv2.VideoCapture(camera_id)
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+def enqueue_frame(camera_id, frame_ref, captured_at, detect=True):
+    """
+    Default capture sink: drop-oldest hand-off of a FrameRef into frame_queue.
+    A pass-through frame (detect False) never evicts a waiting frame; it is dropped itself.
+    """
+    if frame_queue.full() and not detect:
+        frame_ref.release()
+        metrics.inc('frames_dropped_total', stage='frame_queue')
+        return
+    if frame_queue.full():
+        try:
+            frame_queue.get_nowait()[1].release()
+            metrics.inc('frames_dropped_total', stage='frame_queue')
+        except queue.Empty:
+            pass
     
-    print("Video capture thread started")
+    try:
+        frame_queue.put((camera_id, frame_ref, captured_at, detect), block=False)
+    except queue.Full:
+        frame_ref.release()
+        metrics.inc('frames_dropped_total', stage='frame_queue')
+
+def open_video_source(source):
+    """cv2.VideoCapture for a device index (int or digit string) or a video file path"""
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    cap = cv2.VideoCapture(source)
+    if isinstance(source, int):
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+    return cap
+
+def video_capture_thread(camera_id=0, source=None, submit=None, ring_slots=8, replay_fps=None, scheduler=None):
+    """
+    Read frames from source (defaults to device camera_id) into a FrameRing and
+    hand them to submit(camera_id, frame_ref, captured_at, detect), by default
+    the drop-oldest frame_queue. submit takes over the reference.
+    scheduler (a FrameScheduler) decides per frame whether it is detected,
+    passed through for the stream only, or grabbed without decoding; without
+    one every frame is detected.
+    replay_fps paces video files: None plays them at their recorded rate,
+    0 as fast as they decode, any other value at that many frames a second.
+    """
+    submit = submit or enqueue_frame
+    ring = FrameRing(ring_slots)
+    source = camera_id if source is None else source
+    cap = open_video_source(source)
+    is_file = isinstance(source, str) and not source.isdigit()
+    
+    print(f"Video capture thread started for camera {camera_id} ({source})")
     
-    frame_count = 0
-    last_time = time.time()
-    frames_to_skip = 1
+    # Play video files back at their recorded rate instead of as fast as they decode
+    if not is_file or replay_fps == 0:
+        frame_period = 0.0
+    else:
+        frame_period = 1.0 / (replay_fps or cap.get(cv2.CAP_PROP_FPS) or 30.0)
+    next_frame_time = time.time()
     
     while not exit_event.is_set():
-        ret, frame = cap.read()
+        # Frames that will be skipped are only grabbed, not decoded
+        decision = scheduler.admit(camera_id) if scheduler else DETECT
+        read_start = time.perf_counter()
+        if decision != SKIP:
+            ret, frame_ref = ring.read(cap)
+        else:
+            ret, frame_ref = cap.grab(), None
         if not ret:
+            if is_file:
+                print(f"End of video {source}")
+                break
             print("Failed to grab frame")
             time.sleep(0.1)
             continue
         
-        frame_count += 1
+        metrics.inc('frames_captured_total')
         
-        if frame_count % frames_to_skip == 0:
-            if frame_queue.full():
-                try:
-                    frame_queue.get_nowait()
-                except queue.Empty:
-                    pass
-            
-            try:
-                frame_queue.put(frame.copy(), block=False)
-            except queue.Full:
-                pass
+        if frame_ref is not None:
+            metrics.observe('capture', time.perf_counter() - read_start)
+            submit(camera_id, frame_ref, time.time(), decision == DETECT)
+        elif decision != SKIP:
+            # Every ring buffer was busy; scheduler skips are counted as frames_scheduled_total{decision="skip"}
+            metrics.inc('frames_dropped_total', stage='capture')
         
-        if frame_count % 30 == 0:
-            current_time = time.time()
-            elapsed = current_time - last_time
-            fps = 30 / elapsed
-            
-            if fps < 10:
-                frames_to_skip = 4
-            elif fps < 20:
-                frames_to_skip = 3
-            elif fps < 25:
-                frames_to_skip = 2
-            else:
-                frames_to_skip = 1
-                
-            last_time = current_time
+        if frame_period:
+            next_frame_time += frame_period
+            time.sleep(max(0.0, next_frame_time - time.time()))
     
     cap.release()
-    print("Video capture thread stopped")
+    print(f"Video capture thread stopped for camera {camera_id} "
+          f"({ring.allocations} frame buffers allocated, ring full {ring.exhausted} times)")
+
+def draw_overlay(display_frame, results, fps):
+    cv2.rectangle(display_frame, (10, 50), (150, 80), (0, 0, 0), -1)
+    cv2.putText(display_frame, f"FPS: {fps:.1f}", (15, 70), 
+                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+    
+    cv2.rectangle(display_frame, (10, 10), (250, 40), (0, 0, 0), -1)
+    cv2.putText(display_frame, f"People detected: {len(results)}", 
+                (15, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+    
+    for box, name, confidence, track_id in results:
+        x1, y1, x2, y2 = box
+        confidence_text = f"Confidence: {confidence:.2f}"
+        color = (0, 255, 0) if name != "Unknown" else (0, 0, 255)
+        
+        cv2.rectangle(display_frame, (x1, y1), (x2, y2), color, 3)
+        
+        text_size = cv2.getTextSize(name, cv2.FONT_HERSHEY_SIMPLEX, 0.9, 2)[0]
+        cv2.rectangle(display_frame, (x1, y1 - text_size[1] - 10), (x1 + text_size[0], y1), color, -1)
+        cv2.putText(display_frame, name, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (255, 255, 255), 2)
+        
+        cv2.putText(display_frame, confidence_text, (x1, y2 + 25), 
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
 
-def stream_thread(socketio=None):
+def frame_ack(camera_id, seq):
+    """Forward a client's 'video_frame_ack' to the running streamer"""
+    streamer = _streamer
+    if streamer is not None:
+        streamer.ack(camera_id, seq)
+
+def stream_thread(socketio=None, max_fps=15):
+    global _streamer
     print("Stream thread started")
     
-    last_results = []
-    last_frame = None
-    start_time = time.time()
-    frame_count = 0
-    fps = 0
+    def emit(payload):
+        if _event_scheduler:
+            _event_scheduler.send_frame(payload)
+        elif _socketio:
+            _socketio.emit('video_frame', payload)
+    
+    streamer = FrameStreamer(emit, draw_overlay, max_fps=max_fps, metrics=metrics)
+    _streamer = streamer
     
     while not exit_event.is_set():
+        # Sleep until a result arrives or a held frame's send slot comes up, instead of polling
+        due = streamer.time_until_due()
+        timeout = 0.05 if due is None else min(due, 0.05)
         try:
-            frame, results = result_queue.get(block=False)
-            last_frame = frame.copy()
-            last_results = results
+            camera_id, frame_ref, results, captured_at = result_queue.get(timeout=timeout) if timeout > 0 else result_queue.get_nowait()
+            streamer.update(camera_id, frame_ref, results, captured_at)
+            while True:
+                camera_id, frame_ref, results, captured_at = result_queue.get_nowait()
+                streamer.update(camera_id, frame_ref, results, captured_at)
         except queue.Empty:
             pass
         
-        if last_frame is not None:
-            display_frame = last_frame.copy()
-            frame_count += 1
-            
-            elapsed_time = time.time() - start_time
-            if elapsed_time >= 1.0:
-                fps = frame_count / elapsed_time
-                frame_count = 0
-                start_time = time.time()
-            
-            cv2.rectangle(display_frame, (10, 50), (150, 80), (0, 0, 0), -1)
-            cv2.putText(display_frame, f"FPS: {fps:.1f}", (15, 70), 
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-            
-            cv2.rectangle(display_frame, (10, 10), (250, 40), (0, 0, 0), -1)
-            cv2.putText(display_frame, f"People detected: {len(last_results)}", 
-                        (15, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-            
-            for box, name, confidence in last_results:
-                x1, y1, x2, y2 = box
-                confidence_text = f"Confidence: {confidence:.2f}"
-                color = (0, 255, 0) if name != "Unknown" else (0, 0, 255)
-                
-                cv2.rectangle(display_frame, (x1, y1), (x2, y2), color, 3)
-                
-                text_size = cv2.getTextSize(name, cv2.FONT_HERSHEY_SIMPLEX, 0.9, 2)[0]
-                cv2.rectangle(display_frame, (x1, y1 - text_size[1] - 10), (x1 + text_size[0], y1), color, -1)
-                cv2.putText(display_frame, name, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (255, 255, 255), 2)
-                
-                cv2.putText(display_frame, confidence_text, (x1, y2 + 25), 
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
-            
-            ret, buffer = cv2.imencode('.jpg', display_frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
-            if ret:
-                frame_data = base64.b64encode(buffer).decode('utf-8')
-                results_data = [{'box': box, 'name': name, 'confidence': confidence} 
-                                for box, name, confidence in last_results]
-                if _socketio:
-                    _socketio.emit('video_frame', {'frame': frame_data, 'results': results_data})
-        
-        time.sleep(0.01)
+        streamer.flush()
     
-    print("Stream thread stopped")
+    _streamer = None
+    streamer.close()
+    stats = streamer.stats()
+    print(f"Stream thread stopped: {stats['frames_encoded']} frames encoded of {stats['frames_received']} received, "
+          f"{stats['bytes_sent'] / 1e6:.1f} MB sent, {stats['bytes_saved'] / 1e6:.1f} MB saved, "
+          f"encoding used {stats['encode_cpu_percent']}% CPU")
+
+def stats_thread(socketio=None, interval=5.0):
+    """Emit a pipeline_stats snapshot of the metrics every interval seconds"""
+    while not exit_event.wait(interval):
+        if socketio:
+            socketio.emit('pipeline_stats', metrics.snapshot())
+
+def load_search_index(gallery, embeddings_file, nprobe=None):
+    """Attach the persisted IVF index to the gallery, rebuilding it if it is missing or stale"""
+    index_path = index_path_for(embeddings_file)
+    index = None
+    if os.path.exists(index_path):
+        index = IVFIndex.load(index_path)
+        gallery_index = os.path.join(gallery_dir_for(embeddings_file), INDEX_FILE)
+        stale = os.path.exists(gallery_index) and os.path.getmtime(index_path) < os.path.getmtime(gallery_index)
+        if index.num_rows != len(gallery) or stale:
+            print(f"IVF index at {index_path} does not match the trained model, rebuilding")
+            index = None
+    if index is None:
+        index = IVFIndex.build(gallery.float32_embeddings())
+        index.save(index_path)
+    if nprobe:
+        index.nprobe = nprobe
+    gallery.set_index(index)
+    print(f"Using IVF search: {index.nlist} lists, nprobe={index.nprobe}")
+
+def prepare_gallery(embeddings_file, model_name="Facenet512", precision="float32", search_index="exact", nprobe=None):
+    """Load the trained gallery and apply the session's precision and search index settings"""
+    known_faces = load_known_faces(embeddings_file)
+    trained_with = known_faces.metadata.get('model_name')
+    if trained_with and trained_with != model_name:
+        print(f"Warning: gallery was trained with {trained_with}, recognizing with {model_name}")
+    if precision != "float32":
+        known_faces = known_faces.quantize(precision)
+    if search_index == "ivf":
+        load_search_index(known_faces, embeddings_file, nprobe)
+    if precision != "float32" or search_index == "ivf":
+        print(f"Gallery at {precision}{' with IVF index' if search_index == 'ivf' else ''}: "
+              f"{known_faces.nbytes / 1e6:.1f} MB")
+    return known_faces
 
-def start_face_recognition(model_name="Facenet512", embeddings_file='trained_models/face_recognition_model', detector_backend="mediapipe"):
-    attendance_file = create_attendance_file()
+def start_face_recognition(model_name="Facenet512", embeddings_file='trained_models/face_recognition_model', detector_backend="mediapipe",
+                           search_index="exact", nprobe=None, precision="float32", sources=None, num_workers=None,
+                           execution_mode="thread", stream=True, stream_fps=15, reload_interval=2.0,
+                           stats_interval=None, replay_fps=None, latency_budget=0.5, cpu_target=0.8):
+    """
+    search_index: "exact" scans the whole gallery, "ivf" uses the approximate IVF index.
+    precision: "float32", "float16" or "int8" storage for the gallery matrix during matching.
+    sources: camera device indices and/or video file paths (default [0]); camera IDs are their positions.
+    num_workers: size of the detection/recognition pool shared by all sources (default one per source).
+    execution_mode: "thread" runs the pool as threads of this process; "process" runs each worker
+    in its own process (see process_workers.py) so detection and preprocessing are not held back by the GIL.
+    stream: start the Socket.IO stream thread; without it results stay in result_queue for the caller,
+    whose frames are FrameRefs that must be released.
+    stream_fps: upper bound on video_frame events per camera per second.
+    reload_interval: seconds between checks for a newer stored gallery, which is swapped into the
+    running session (see gallery_watcher.py); None or 0 keeps the gallery loaded at start.
+    stats_interval: if set, emit a pipeline_stats Socket.IO event (see pipeline_metrics.py) this often.
+    replay_fps: playback rate of video file sources (see video_capture_thread).
+    latency_budget, cpu_target: capture-to-result seconds and share of the workers' time that the
+    frame scheduler (see frame_scheduler.py) keeps detection within when choosing which frames to detect.
+    """
+    global frame_queue
+    if execution_mode not in ("thread", "process"):
+        print(f"Failed to start: unknown execution mode {execution_mode!r}")
+        return
+    if detector_backend not in available_detectors():
+        print(f"Failed to start: unknown detector backend {detector_backend!r}, expected one of {available_detectors()}")
+        return
+    sources = list(sources) if sources else [0]
+    num_workers = num_workers or len(sources)
+    # Recognitions are written and announced by the sink's own threads, never by a detection worker
+    attendance_sink = AttendanceSink("attendance.csv", on_recorded=announce_recognition)
     device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
     
     try:
-        known_faces = load_known_faces(embeddings_file)
+        known_faces = prepare_gallery(embeddings_file, model_name, precision, search_index, nprobe)
     except Exception as e:
         print(f"Failed to start: {str(e)}")
         return
 
-    print(f"Using pre-trained model from {embeddings_file}")
+    print(f"Using pre-trained model from {embeddings_file} "
+          f"({known_faces.num_identities} people, {len(known_faces)} embeddings)")
+    
+    camera_ids = list(range(len(sources)))
+    session = RecognitionSession(model_name, known_faces, device, attendance_sink, detector_backend, camera_ids)
     
     exit_event.clear()
-    capture_thread = threading.Thread(target=video_capture_thread)
-    detection_thread = threading.Thread(
-        target=detection_recognition_thread,
-        args=(model_name, known_faces, device, attendance_file, detector_backend)
-    )
-    stream_thread_instance = threading.Thread(target=stream_thread, args=(_socketio,))
+    # Keep the drop-oldest buffer at two frames per camera so no source can starve the others for long
+    frame_queue = queue.Queue(maxsize=2 * len(sources))
+    while not result_queue.empty():
+        result_queue.get_nowait()
+    # Per-camera frame buffers: its share of frame_queue, one per worker, the streamer's and a spare in transit
+    ring_slots = 2 * len(sources) + num_workers + 2
+    
+    threads = {}
+    if execution_mode == "process":
+        # Workers route cameras by camera_id % num_workers, so more workers than cameras would sit idle
+        num_workers = min(num_workers, len(sources))
+        pool = ProcessWorkerPool(num_workers, camera_ids, {
+            'embeddings_file': embeddings_file, 'model_name': model_name, 'detector_backend': detector_backend,
+            'precision': precision, 'search_index': search_index, 'nprobe': nprobe,
+            'reload_interval': reload_interval,
+        })
+        
+        # Frames leave shared memory once per result, into a ring per camera
+        result_rings = {camera_id: FrameRing(ring_slots) for camera_id in camera_ids}
+        
+        def on_result(camera_id, frame, results, matches, faces_seen, captured_at, timings):
+            report_matches(session, camera_id, matches)
+            session.count_faces(faces_seen, len(matches))
+            record_frame_metrics(timings, matches)
+            session.frame_scheduler.observe(captured_at, timings)
+            frame_ref = result_rings[camera_id].copy_in(frame)
+            if frame_ref is not None:
+                result_queue.put((camera_id, frame_ref, results, captured_at))
+        
+        try:
+            pool.start()
+        except RuntimeError as e:
+            print(f"Failed to start: {str(e)}")
+            return
+        submit = pool.submit
+        queue_fill = pool.queue_fill
+        pool.export_gallery_stats(metrics)
+        metrics.set_gauge('queue_depth', pool.queue_depth, queue='frame_queue')
+        threads['result_thread'] = threading.Thread(target=pool.collect, args=(exit_event, on_result))
+        for worker_id, process in enumerate(pool.processes):
+            threads[f'detection_process_{worker_id}'] = process
+    else:
+        submit = enqueue_frame
+        queue_fill = lambda camera_id=None: frame_queue.qsize() / frame_queue.maxsize
+        metrics.set_gauge('queue_depth', lambda: frame_queue.qsize(), queue='frame_queue')
+        for worker_id in range(num_workers):
+            threads[f'detection_thread_{worker_id}'] = threading.Thread(
+                target=detection_recognition_thread, args=(session, worker_id))
+        if reload_interval:
+            watcher = session.watch_gallery(embeddings_file, precision, search_index, nprobe, reload_interval)
+            watcher.export(metrics)
+            threads['gallery_watcher'] = threading.Thread(target=watcher.run, args=(exit_event,))
+    # One scheduler for all cameras decides which frames are detected, from queue fill and measured latencies
+    session.frame_scheduler = FrameScheduler(camera_ids, num_workers, latency_budget, cpu_target, queue_fill,
+                                             metrics=metrics)
+    for camera_id, source in zip(camera_ids, sources):
+        threads[f'capture_thread_{camera_id}'] = threading.Thread(
+            target=video_capture_thread,
+            args=(camera_id, source, submit, ring_slots, replay_fps, session.frame_scheduler))
+    metrics.set_gauge('queue_depth', result_queue.qsize, queue='result_queue')
+    metrics.set_gauge('queue_depth', attendance_sink.pending, queue='attendance')
+    threads['attendance_thread'] = threading.Thread(target=attendance_sink.run, args=(exit_event,))
+    if stream:
+        threads['stream_thread'] = threading.Thread(target=stream_thread, args=(_socketio, stream_fps))
+    if stats_interval:
+        threads['stats_thread'] = threading.Thread(target=stats_thread, args=(_socketio, stats_interval))
     
-    for t in [capture_thread, detection_thread, stream_thread_instance]:
-        t.daemon = True
-        t.start()
+    print(f"Starting {len(sources)} capture source(s) with {num_workers} detection {execution_mode}(es)")
+    for t in threads.values():
+        if isinstance(t, threading.Thread):
+            t.daemon = True
+            t.start()
     
-    return {
-        'capture_thread': capture_thread,
-        'detection_thread': detection_thread,
-        'stream_thread': stream_thread_instance
-    }
+    return threads
 
 def stop_face_recognition():
     global exit_event
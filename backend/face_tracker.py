@@ -0,0 +1,99 @@
+# face_tracker.py - IoU multi-object tracker so seated students are not re-embedded every tick
+import itertools
+import numpy as np
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """Pairwise intersection-over-union of (x1, y1, x2, y2) boxes, shape (len(a), len(b))"""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+class Track:
+    def __init__(self, track_id, box, now):
+        self.track_id = track_id
+        self.box = box
+        self.name = "Unknown"
+        self.confidence = 0.0
+        self.created = now
+        self.last_seen = now
+        self.last_recognized = None
+        self.misses = 0
+
+    @property
+    def resolved(self):
+        return self.name != "Unknown"
+
+
+class FaceTracker:
+    """
+    Greedy IoU association of each tick's face boxes with live tracks.
+    Recognition is only requested for new tracks, for unresolved tracks every
+    unresolved_retry_interval seconds, and for resolved tracks every
+    reverify_interval seconds, so a seated class is embedded once, not every tick.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_misses=5, reverify_interval=10.0, unresolved_retry_interval=1.0):
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.reverify_interval = reverify_interval
+        self.unresolved_retry_interval = unresolved_retry_interval
+        self.tracks = []
+        self._ids = itertools.count(1)
+
+    def update(self, boxes, now):
+        """Associate boxes with tracks; returns the track for each box, in box order"""
+        assigned = [None] * len(boxes)
+        if self.tracks and boxes:
+            ious = iou_matrix([t.box for t in self.tracks], boxes)
+            track_idx, box_idx = np.unravel_index(np.argsort(-ious, axis=None), ious.shape)
+            used_tracks = set()
+            for ti, bi in zip(track_idx, box_idx):
+                if ious[ti, bi] < self.iou_threshold:
+                    break
+                if ti in used_tracks or assigned[bi] is not None:
+                    continue
+                used_tracks.add(ti)
+                assigned[bi] = self.tracks[ti]
+
+        matched = set()
+        for box, track in zip(boxes, assigned):
+            if track is not None:
+                track.box = box
+                track.last_seen = now
+                track.misses = 0
+                matched.add(track.track_id)
+
+        for track in self.tracks:
+            if track.track_id not in matched:
+                track.misses += 1
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_misses]
+
+        for i, box in enumerate(boxes):
+            if assigned[i] is None:
+                assigned[i] = Track(next(self._ids), box, now)
+                self.tracks.append(assigned[i])
+        return assigned
+
+    def needs_recognition(self, track, now):
+        if track.last_recognized is None:
+            return True
+        interval = self.reverify_interval if track.resolved else self.unresolved_retry_interval
+        return now - track.last_recognized >= interval
+
+    def assign(self, track, name, confidence, now):
+        """Record a recognition result; a failed re-verification keeps the known identity"""
+        track.last_recognized = now
+        if name == "Unknown" and track.resolved:
+            return
+        track.name = name
+        track.confidence = confidence
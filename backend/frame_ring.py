@@ -0,0 +1,105 @@
+# frame_ring.py - Preallocated, reference-counted frame buffers shared by the pipeline stages
+import threading
+import numpy as np
+
+
+class FrameRef:
+    """
+    A counted reference to one slot of a FrameRing. Whoever holds a FrameRef
+    owns one count and must release() it (or hand it on) exactly once; the
+    slot is reused only after every count is released.
+    """
+    __slots__ = ('ring', 'slot', 'generation')
+
+    def __init__(self, ring, slot, generation):
+        self.ring = ring
+        self.slot = slot
+        self.generation = generation
+
+    @property
+    def frame(self):
+        """The frame as a view into the ring, not a copy"""
+        if self.ring.generations[self.slot] != self.generation:
+            raise RuntimeError(f"Frame slot {self.slot} was reused while still referenced")
+        return self.ring.buffers[self.slot]
+
+    def retain(self):
+        self.ring.retain(self.slot)
+        return self
+
+    def release(self):
+        self.ring.release(self.slot)
+
+
+class FrameRing:
+    """
+    num_slots frame buffers allocated once and reused. Capture decodes
+    straight into a free slot with cap.read(image=...); the detection and
+    streaming stages receive views of it, and the slot returns to the free
+    list when its reference count drops to zero.
+    """
+
+    def __init__(self, num_slots):
+        self.num_slots = num_slots
+        self.buffers = [None] * num_slots
+        self.generations = [0] * num_slots
+        self.refcounts = [0] * num_slots
+        self.free = list(range(num_slots))
+        self.allocations = 0
+        self.exhausted = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """A FrameRef to a free slot with one count, or None when every slot is referenced"""
+        with self._lock:
+            if not self.free:
+                self.exhausted += 1
+                return None
+            slot = self.free.pop()
+            self.refcounts[slot] = 1
+            self.generations[slot] += 1
+            return FrameRef(self, slot, self.generations[slot])
+
+    def retain(self, slot):
+        with self._lock:
+            self.refcounts[slot] += 1
+
+    def release(self, slot):
+        with self._lock:
+            self.refcounts[slot] -= 1
+            if self.refcounts[slot] == 0:
+                self.free.append(slot)
+
+    def _adopt(self, slot, frame):
+        if frame is not self.buffers[slot]:
+            self.buffers[slot] = frame
+            self.allocations += 1
+
+    def read(self, cap):
+        """
+        Decode the next frame of cap into a free slot. Returns (ret, ref);
+        ref is None when reading failed or no slot was free, in which case the
+        frame is grabbed and discarded so the source does not fall behind.
+        """
+        ref = self.acquire()
+        if ref is None:
+            return cap.grab(), None
+        ret, frame = cap.read(image=self.buffers[ref.slot])
+        if not ret:
+            ref.release()
+            return False, None
+        # OpenCV allocates a new array on the first read or when the resolution changes
+        self._adopt(ref.slot, frame)
+        return True, ref
+
+    def copy_in(self, frame):
+        """Copy an external frame into a free slot; returns its ref or None"""
+        ref = self.acquire()
+        if ref is None:
+            return None
+        buffer = self.buffers[ref.slot]
+        if buffer is None or buffer.shape != frame.shape or buffer.dtype != frame.dtype:
+            self._adopt(ref.slot, np.empty_like(frame))
+            buffer = self.buffers[ref.slot]
+        np.copyto(buffer, frame)
+        return ref
@@ -0,0 +1,124 @@
+# frame_scheduler.py - Feedback control of which captured frames are detected, passed through or skipped
+import time
+import threading
+
+DETECT, STREAM, SKIP = 'detect', 'stream', 'skip'
+# Queue fill (0..1) above which the interval backs off, and below which it may shrink again
+HIGH_FILL = 0.75
+LOW_FILL = 0.25
+# Undetected frames are only decoded and passed through to the stream while the queue is below this
+STREAM_FILL = 0.5
+BACKOFF = 1.5
+PROBE = 0.9
+SMOOTHING = 0.2  # weight of a new sample in the moving averages
+
+
+class FrameScheduler:
+    """
+    Decides for every captured frame whether it is detected, only passed
+    through to the stream with the camera's last results, or grabbed and
+    dropped without decoding. All cameras share one detection interval,
+    floor * backoff, recomputed every update_period seconds:
+
+    - floor: the moving average of detection time per frame (resize, detect,
+      embed and match, as measured by the worker) sets how often the pool
+      can detect while spending at most cpu_target of its workers' time on
+      it: len(cameras) * cost / (cpu_target * num_workers).
+    - backoff (1 or more): when the capture-to-result latency of detected
+      frames is above latency_budget because they queued (waited longer than
+      detection itself took), or the detection queue is over HIGH_FILL, it
+      grows by BACKOFF; below half the budget with the queue under LOW_FILL
+      it shrinks by PROBE back toward 1. In between it holds, so the
+      interval settles instead of oscillating. A budget below the cost of
+      one detection cannot be met by detecting less often and is ignored.
+
+    queue_fill(camera_id) returns how full the detection queue that camera's
+    frames go to is, from 0 to 1, and queue_fill() the fullest one; the
+    interval backs off on the latter. Frames that are not due for detection
+    are decoded for the stream only while their own queue is under
+    STREAM_FILL, so a backlog is never made worse by frames nobody will
+    detect.
+    """
+
+    def __init__(self, camera_ids, num_workers, latency_budget=0.5, cpu_target=0.8, queue_fill=None,
+                 min_interval=1 / 30, max_interval=2.0, update_period=0.5, metrics=None):
+        self.num_cameras = len(camera_ids)
+        self.num_workers = num_workers
+        self.latency_budget = latency_budget
+        self.cpu_target = cpu_target
+        self.queue_fill = queue_fill or (lambda camera_id=None: 0.0)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.update_period = update_period
+        self.metrics = metrics
+        self.interval = 0.5  # until the first detection reports its cost
+        self.floor = min_interval
+        self.backoff = 1.0
+        self.cost = None
+        self.latency = None
+        self.fresh = False  # a detected frame came back since the last update
+        self.next_detection = {camera_id: 0.0 for camera_id in camera_ids}
+        self.next_update = time.time() + update_period
+        self.counters = {DETECT: 0, STREAM: 0, SKIP: 0, 'backoffs': 0, 'probes': 0}
+        self._lock = threading.Lock()
+        if metrics:
+            metrics.set_gauge('detection_interval_seconds', lambda: round(self.interval, 4))
+            metrics.set_gauge('detection_interval_floor_seconds', lambda: round(self.floor, 4))
+            metrics.set_gauge('detection_backoff', lambda: round(self.backoff, 3))
+            metrics.set_gauge('detection_latency_seconds', lambda: round(self.latency or 0.0, 4))
+            metrics.set_gauge('detection_cost_seconds', lambda: round(self.cost or 0.0, 4))
+
+    def admit(self, camera_id, now=None):
+        """DETECT, STREAM or SKIP for the frame camera_id just grabbed"""
+        now = now or time.time()
+        fill = self.queue_fill(camera_id)
+        update = now >= self.next_update
+        busiest = self.queue_fill() if update else None
+        with self._lock:
+            if update and now >= self.next_update:
+                self._update(now, busiest)
+            if now >= self.next_detection[camera_id]:
+                self.next_detection[camera_id] = now + self.interval
+                decision = DETECT
+            elif fill < STREAM_FILL:
+                decision = STREAM
+            else:
+                decision = SKIP
+            self.counters[decision] += 1
+        if self.metrics:
+            self.metrics.inc('frames_scheduled_total', decision=decision)
+        return decision
+
+    def observe(self, captured_at, timings):
+        """Feed back a processed frame: its capture time and the stage timings filled in by recognize_frame"""
+        if 'detect' not in timings:
+            return
+        cost = sum(timings.get(stage, 0.0) for stage in ('resize', 'detect', 'embed', 'match'))
+        latency = time.time() - captured_at
+        with self._lock:
+            self.cost = cost if self.cost is None else (1 - SMOOTHING) * self.cost + SMOOTHING * cost
+            self.latency = latency if self.latency is None else (1 - SMOOTHING) * self.latency + SMOOTHING * latency
+            self.fresh = True
+
+    def _update(self, now, fill):
+        self.next_update = now + self.update_period
+        if self.cost is None:
+            return
+        self.floor = self.num_cameras * self.cost / (self.cpu_target * self.num_workers)
+        self.floor = min(max(self.floor, self.min_interval), self.max_interval)
+
+        # The latency average only moves when detections come back; do not back off twice on the same one
+        fresh, self.fresh = self.fresh, False
+        queued = self.latency - self.cost > self.cost
+        if (fresh and queued and self.latency > self.latency_budget) or fill > HIGH_FILL:
+            self.backoff = min(self.backoff * BACKOFF, self.max_interval / self.floor)
+            self.counters['backoffs'] += 1
+        elif self.latency < self.latency_budget / 2 and fill < LOW_FILL and self.backoff > 1.0:
+            self.backoff = max(self.backoff * PROBE, 1.0)
+            self.counters['probes'] += 1
+        self.interval = min(self.floor * self.backoff, self.max_interval)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, interval=round(self.interval, 4), floor=round(self.floor, 4),
+                        backoff=round(self.backoff, 3), latency=self.latency, cost=self.cost)
@@ -0,0 +1,243 @@
+# frame_streamer.py - Change-driven, rate-capped JPEG streaming with client-paced quality
+import time
+import threading
+import cv2
+
+QUALITY_RANGE = (40, 85)
+SCALE_RANGE = (0.5, 1.0)
+ADAPT_INTERVAL = 1.0  # seconds between quality/resolution steps
+
+
+class CameraStream:
+    def __init__(self, quality, scale):
+        self.frame = None
+        self.captured_at = None
+        self.results = []
+        self.dirty = False
+        self.seq = 0
+        self.last_sent = 0.0
+        self.quality = quality
+        self.scale = scale
+        self.in_flight = {}  # seq -> send time, until the client acks it
+        self.acked = False
+        self.held = False
+        self.coalesced = 0
+        self.rtt = None
+        self.fast_acks = 0
+        self.last_adapted = 0.0
+        self.arrivals = 0
+        self.fps = 0.0
+        self.fps_start = time.time()
+
+
+class FrameStreamer:
+    """
+    Encodes a camera's frame only when a new frame/result arrives, at most
+    max_fps times a second, and sends the raw JPEG bytes (no base64).
+    Frames are FrameRefs owned by the streamer, so overlays are drawn in
+    place; update() and flush() must be called from the same thread.
+
+    Clients that ack frames ('video_frame_ack' with camera and seq) pace the
+    stream: while max_in_flight frames are unacknowledged the camera is held
+    back, and a slow round trip lowers JPEG quality, then resolution; fast
+    acks raise them again. Clients that never ack just get the FPS cap.
+
+    With metrics (a PipelineMetrics), annotate/encode/emit times, the
+    capture-to-emit latency and coalesced frames are recorded there too.
+    """
+
+    def __init__(self, emit, render, max_fps=15, max_in_flight=2, quality=80, scale=1.0, metrics=None):
+        self.emit = emit
+        self.render = render
+        self.metrics = metrics
+        self.frame_period = 1.0 / max_fps
+        self.max_in_flight = max_in_flight
+        self.initial_quality = quality
+        self.initial_scale = scale
+        self.cameras = {}
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.counters = {
+            'frames_received': 0,
+            'frames_encoded': 0,
+            'frames_coalesced': 0,   # superseded by a newer frame before their turn
+            'frames_held_back': 0,   # times a camera waited for the client to catch up
+            'bytes_sent': 0,
+            'bytes_saved': 0,        # base64 overhead plus the JPEGs of coalesced frames
+            'encode_cpu_seconds': 0.0,
+        }
+
+    def _camera(self, camera_id):
+        if camera_id not in self.cameras:
+            self.cameras[camera_id] = CameraStream(self.initial_quality, self.initial_scale)
+        return self.cameras[camera_id]
+
+    def update(self, camera_id, frame_ref, results, captured_at=None):
+        """Take over the newest frame reference and results of a camera; nothing is encoded here"""
+        with self._lock:
+            camera = self._camera(camera_id)
+            if camera.dirty:
+                self.counters['frames_coalesced'] += 1
+                camera.coalesced += 1
+                if self.metrics:
+                    self.metrics.inc('frames_dropped_total', stage='stream_coalesced')
+            if camera.frame is not None:
+                camera.frame.release()
+            camera.frame = frame_ref
+            camera.captured_at = captured_at
+            camera.results = results
+            camera.dirty = True
+            camera.arrivals += 1
+            self.counters['frames_received'] += 1
+            now = time.time()
+            if now - camera.fps_start >= 1.0:
+                camera.fps = camera.arrivals / (now - camera.fps_start)
+                camera.arrivals = 0
+                camera.fps_start = now
+
+    def time_until_due(self):
+        """Seconds until the next pending frame may be sent, or None if nothing is pending"""
+        with self._lock:
+            waits = [camera.last_sent + self.frame_period - time.time()
+                     for camera in self.cameras.values() if camera.dirty and not camera.held]
+        return max(0.0, min(waits)) if waits else None
+
+    def flush(self):
+        """Encode and emit every camera whose frame changed and whose send slot is due"""
+        now = time.time()
+        with self._lock:
+            due = []
+            for camera_id, camera in self.cameras.items():
+                if not camera.dirty or now - camera.last_sent < self.frame_period:
+                    continue
+                if camera.acked and len(camera.in_flight) >= self.max_in_flight:
+                    if now - min(camera.in_flight.values()) < 2.0:
+                        if not camera.held:
+                            camera.held = True
+                            self.counters['frames_held_back'] += 1
+                            self._degrade(camera)
+                        continue
+                    camera.in_flight.clear()  # acks were lost, e.g. the client reconnected
+                    camera.held = False
+                camera.dirty = False
+                camera.last_sent = now
+                camera.seq += 1
+                camera.in_flight[camera.seq] = now
+                # Without acks nothing is ever removed; only the newest frames can still be acked usefully
+                while len(camera.in_flight) > self.max_in_flight:
+                    del camera.in_flight[min(camera.in_flight)]
+                due.append((camera_id, camera.seq, camera.frame, camera.results,
+                            camera.fps, camera.quality, camera.scale, camera.captured_at))
+
+        for camera_id, seq, frame, results, fps, quality, scale, captured_at in due:
+            self._send(camera_id, seq, frame, results, fps, quality, scale, captured_at)
+
+    def _send(self, camera_id, seq, frame, results, fps, quality, scale, captured_at=None):
+        cpu_start = time.thread_time()
+        start = time.perf_counter()
+        # Last stage to see this frame, so the overlay goes straight onto the buffer
+        display_frame = frame.frame
+        self.render(display_frame, results, fps)
+        annotated = time.perf_counter()
+        if scale < 1.0:
+            display_frame = cv2.resize(display_frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        ret, buffer = cv2.imencode('.jpg', display_frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        encoded = time.perf_counter()
+        cpu_time = time.thread_time() - cpu_start
+        if not ret:
+            return
+
+        payload = buffer.tobytes()
+        self.emit({
+            'camera': camera_id,
+            'seq': seq,
+            'frame': payload,
+            'width': display_frame.shape[1],
+            'height': display_frame.shape[0],
+            'quality': quality,
+            'results': [{'box': box, 'name': name, 'confidence': confidence, 'trackId': track_id}
+                        for box, name, confidence, track_id in results],
+        })
+        if self.metrics:
+            self.metrics.observe_all({
+                'annotate': annotated - start,
+                'encode': encoded - annotated,
+                'emit': time.perf_counter() - encoded,
+            })
+            if captured_at is not None:
+                self.metrics.observe('end_to_end', time.time() - captured_at)
+        with self._lock:
+            camera = self.cameras[camera_id]
+            self.counters['frames_encoded'] += 1
+            self.counters['bytes_sent'] += len(payload)
+            self.counters['encode_cpu_seconds'] += cpu_time
+            base64_size = 4 * ((len(payload) + 2) // 3)
+            # Each coalesced frame would have cost about as much as this one, base64-encoded
+            self.counters['bytes_saved'] += base64_size - len(payload) + camera.coalesced * base64_size
+            camera.coalesced = 0
+
+    def ack(self, camera_id, seq):
+        """Client acknowledgement of frame seq; adapts the camera's quality to the round trip"""
+        with self._lock:
+            camera = self.cameras.get(camera_id)
+            if camera is None or seq not in camera.in_flight:
+                return
+            camera.acked = True
+            camera.held = False
+            rtt = time.time() - camera.in_flight.pop(seq)
+            for old in [s for s in camera.in_flight if s < seq]:
+                del camera.in_flight[old]
+            camera.rtt = rtt if camera.rtt is None else 0.8 * camera.rtt + 0.2 * rtt
+
+            if camera.rtt > 2 * self.frame_period:
+                self._degrade(camera)
+            elif camera.rtt < self.frame_period / 2:
+                camera.fast_acks += 1
+                if camera.fast_acks >= 10:
+                    self._improve(camera)
+            else:
+                camera.fast_acks = 0
+
+    def _degrade(self, camera):
+        # One step per ADAPT_INTERVAL so a single slow burst does not floor the quality
+        camera.fast_acks = 0
+        now = time.time()
+        if now - camera.last_adapted < ADAPT_INTERVAL:
+            return
+        camera.last_adapted = now
+        if camera.quality > QUALITY_RANGE[0]:
+            camera.quality = max(QUALITY_RANGE[0], camera.quality - 10)
+        else:
+            camera.scale = max(SCALE_RANGE[0], round(camera.scale * 0.8, 2))
+
+    def _improve(self, camera):
+        camera.fast_acks = 0
+        now = time.time()
+        if now - camera.last_adapted < ADAPT_INTERVAL:
+            return
+        camera.last_adapted = now
+        if camera.scale < SCALE_RANGE[1]:
+            camera.scale = min(SCALE_RANGE[1], round(camera.scale * 1.25, 2))
+        else:
+            camera.quality = min(QUALITY_RANGE[1], camera.quality + 5)
+
+    def close(self):
+        """Release the frames still held for each camera"""
+        with self._lock:
+            for camera in self.cameras.values():
+                if camera.frame is not None:
+                    camera.frame.release()
+                    camera.frame = None
+
+    def stats(self):
+        with self._lock:
+            elapsed = max(time.time() - self.started, 1e-9)
+            stats = dict(self.counters)
+            stats['encode_cpu_seconds'] = round(stats['encode_cpu_seconds'], 3)
+            stats['encode_cpu_percent'] = round(100 * self.counters['encode_cpu_seconds'] / elapsed, 1)
+            stats['cameras'] = {
+                camera_id: {'quality': camera.quality, 'scale': camera.scale,
+                            'rtt_ms': round(camera.rtt * 1000, 1) if camera.rtt is not None else None}
+                for camera_id, camera in self.cameras.items()
+            }
+            return stats
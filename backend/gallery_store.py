@@ -0,0 +1,171 @@
+# gallery_store.py - Versioned on-disk gallery: memory-mapped float32 matrix plus label index
+import os
+import json
+import glob
+import pickle
+import datetime
+import threading
+import numpy as np
+
+from face_gallery import FaceGallery
+
+GALLERY_FORMAT_VERSION = 1
+INDEX_FILE = 'index.json'
+# Serializes writers in this process (training, enrollment) so versions are not handed out twice
+_write_lock = threading.RLock()
+
+
+def gallery_dir_for(model_path):
+    """Directory holding the gallery for a model path such as trained_models/face_recognition_model"""
+    return f"{model_path}.gallery"
+
+
+def gallery_exists(model_path):
+    return os.path.exists(os.path.join(gallery_dir_for(model_path), INDEX_FILE))
+
+
+def read_index(model_path):
+    with open(os.path.join(gallery_dir_for(model_path), INDEX_FILE)) as f:
+        return json.load(f)
+
+
+def gallery_version(model_path):
+    """Version counter of the stored gallery, or 0 if none has been saved"""
+    try:
+        return read_index(model_path)['version']
+    except (FileNotFoundError, KeyError, ValueError):
+        return 0
+
+
+def save_gallery(gallery, model_path, model_name="Facenet512"):
+    """
+    Write the gallery as <name>-<version>.npy files and then swap index.json
+    to point at them, so readers always see either the old or the new
+    gallery. Returns the new version number.
+    """
+    with _write_lock:
+        return _save_gallery(gallery, model_path, model_name)
+
+
+def _save_gallery(gallery, model_path, model_name, enrollments=None):
+    directory = gallery_dir_for(model_path)
+    os.makedirs(directory, exist_ok=True)
+    version = gallery_version(model_path) + 1
+
+    files = {
+        'embeddings_file': f"embeddings-{version:06d}.npy",
+        'labels_file': f"labels-{version:06d}.npy",
+        'names_file': f"names-{version:06d}.npy",
+    }
+    np.save(os.path.join(directory, files['embeddings_file']),
+            np.ascontiguousarray(gallery.embeddings, dtype=np.float32))
+    np.save(os.path.join(directory, files['labels_file']), np.asarray(gallery.labels, dtype=np.int32))
+    np.save(os.path.join(directory, files['names_file']), np.asarray(gallery.names, dtype=str))
+
+    index = dict(
+        files,
+        format_version=GALLERY_FORMAT_VERSION,
+        version=version,
+        model_name=model_name,
+        dim=gallery.dim,
+        count=len(gallery),
+        identities=gallery.num_identities,
+        # name -> version, for identities stored by add_identity since the last full training
+        enrollments=enrollments or {},
+        updated_at=datetime.datetime.utcnow().isoformat(),
+    )
+    tmp_path = os.path.join(directory, f"{INDEX_FILE}.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(directory, INDEX_FILE))
+
+    _remove_stale_files(directory, files.values())
+    return version
+
+
+def _remove_stale_files(directory, keep):
+    for path in glob.glob(os.path.join(directory, '*-*.npy')):
+        if os.path.basename(path) not in keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass  # still memory-mapped by a reader (Windows); removed on a later save
+
+
+def load_gallery(model_path, mmap=True):
+    """Open the stored gallery; with mmap the matrix is paged in lazily, so load time does not grow with size"""
+    index = read_index(model_path)
+    if index.get('format_version') != GALLERY_FORMAT_VERSION:
+        raise ValueError(f"Unsupported gallery format {index.get('format_version')}")
+    directory = gallery_dir_for(model_path)
+    mmap_mode = 'r' if mmap else None
+    embeddings = np.load(os.path.join(directory, index['embeddings_file']), mmap_mode=mmap_mode)
+    labels = np.load(os.path.join(directory, index['labels_file']), mmap_mode=mmap_mode)
+    names = np.load(os.path.join(directory, index['names_file']), mmap_mode=mmap_mode)
+    if embeddings.shape != (index['count'], index['dim']) and index['count']:
+        raise ValueError(f"Gallery matrix {embeddings.shape} does not match its index")
+    gallery = FaceGallery.from_normalized(embeddings, labels, names)
+    gallery.metadata = index
+    return gallery
+
+
+def add_identity(model_path, name, embeddings, model_name="Facenet512"):
+    """
+    Store embeddings as name's rows, replacing any earlier ones, as a new
+    gallery version. Creates the gallery if none has been trained yet.
+    Returns the new version.
+    """
+    with _write_lock:
+        if not gallery_exists(model_path) and os.path.exists(model_path):
+            migrate_pickle(model_path, model_name)
+        enrollments = {}
+        if gallery_exists(model_path):
+            gallery = load_gallery(model_path)
+            trained_with = gallery.metadata.get('model_name')
+            if trained_with and trained_with != model_name:
+                raise ValueError(f"Gallery was trained with {trained_with}, not {model_name}")
+            enrollments = dict(gallery.metadata.get('enrollments', {}))
+            gallery = gallery.with_identity(name, embeddings)
+        else:
+            gallery = FaceGallery.from_dict({name: embeddings})
+        enrollments[name] = gallery_version(model_path) + 1
+        return _save_gallery(gallery, model_path, model_name, enrollments)
+
+
+def save_retrained_gallery(gallery, model_path, since_version, model_name="Facenet512"):
+    """
+    Save a fully retrained gallery whose photos were listed at stored version
+    since_version. Identities enrolled by add_identity after that version are
+    copied over from the stored gallery, so a retrain that overlapped an
+    enrollment does not drop the new student. Returns (version, gallery) with
+    the gallery as saved.
+    """
+    with _write_lock:
+        enrollments = {}
+        if gallery_exists(model_path):
+            stored = load_gallery(model_path)
+            names = [str(n) for n in stored.names]
+            for name, version in stored.metadata.get('enrollments', {}).items():
+                if version > since_version and name in names:
+                    rows = stored.float32_embeddings()[stored.labels == names.index(name)]
+                    gallery = gallery.with_identity(name, rows)
+                    enrollments[name] = version
+            if enrollments:
+                print(f"Kept {len(enrollments)} identities enrolled during training: {', '.join(enrollments)}")
+        return _save_gallery(gallery, model_path, model_name, enrollments), gallery
+
+
+def migrate_pickle(model_path, model_name="Facenet512"):
+    """Convert a legacy pickled {name: [embedding, ...]} model into the gallery format"""
+    with open(model_path, 'rb') as f:
+        known_faces = pickle.load(f)
+    gallery = FaceGallery.from_dict(known_faces)
+    version = save_gallery(gallery, model_path, model_name)
+    print(f"Migrated {model_path} ({len(gallery)} embeddings) to {gallery_dir_for(model_path)}")
+    return version
+
+
+def trained_model_exists(model_path):
+    return gallery_exists(model_path) or os.path.exists(model_path)
@@ -0,0 +1,78 @@
+# gallery_watcher.py - Hot reload of a retrained or newly enrolled gallery into a running session
+import os
+import time
+import threading
+from gallery_store import gallery_version, gallery_dir_for, INDEX_FILE
+
+
+class GalleryWatcher:
+    """
+    Polls the stored gallery's version from a daemon thread. When it changes,
+    load() builds the new gallery on that thread while recognition keeps
+    matching against the current one, and on_swap(gallery) then replaces the
+    reference in a single assignment, so every frame sees one whole gallery.
+    on_reload(watcher), if given, is called after every swap.
+    """
+
+    def __init__(self, model_path, load, on_swap, version, interval=2.0, on_reload=None):
+        self.model_path = model_path
+        self.load = load
+        self.on_swap = on_swap
+        self.version = version
+        self.interval = interval
+        self.on_reload = on_reload
+        self.reloads = 0
+        self.last_reload_seconds = None
+        self.last_staleness_seconds = None
+
+    def start(self, exit_event):
+        thread = threading.Thread(target=self.run, args=(exit_event,), daemon=True)
+        thread.start()
+        return thread
+
+    def run(self, exit_event):
+        """Check every interval seconds until exit_event is set"""
+        while not exit_event.wait(self.interval):
+            self.check()
+
+    def check(self):
+        """Swap in a newer stored gallery, if there is one; returns True if it did"""
+        version = gallery_version(self.model_path)
+        if version == 0 or version == self.version:
+            return False
+        start = time.time()
+        try:
+            gallery = self.load()
+        except Exception as e:
+            print(f"Gallery reload failed, keeping version {self.version}: {str(e)}")
+            return False
+        self.on_swap(gallery)
+        now = time.time()
+
+        self.version = gallery.metadata.get('version', version)
+        self.reloads += 1
+        self.last_reload_seconds = now - start
+        try:
+            saved_at = os.path.getmtime(os.path.join(gallery_dir_for(self.model_path), INDEX_FILE))
+            self.last_staleness_seconds = max(now - saved_at, 0.0)
+        except OSError:
+            self.last_staleness_seconds = None
+        staleness = f", {self.last_staleness_seconds:.2f}s after it was saved" if self.last_staleness_seconds is not None else ""
+        print(f"Gallery version {self.version} swapped in ({gallery.num_identities} people, {len(gallery)} embeddings): "
+              f"loaded in {self.last_reload_seconds * 1000:.0f} ms{staleness}")
+        if self.on_reload:
+            self.on_reload(self)
+        return True
+
+    def values(self):
+        """Current version, reloads so far, and the last reload's load time and staleness (0 before the first)"""
+        return (self.version, self.reloads, self.last_reload_seconds or 0.0, self.last_staleness_seconds or 0.0)
+
+    def export(self, metrics, **labels):
+        """Report values() as gallery_* gauges"""
+        for index, name in enumerate(GAUGES):
+            metrics.set_gauge(name, lambda index=index: self.values()[index], **labels)
+
+
+# Gauges in the order of GalleryWatcher.values()
+GAUGES = ('gallery_version', 'gallery_reloads', 'gallery_reload_seconds', 'gallery_staleness_seconds')
@@ -0,0 +1,202 @@
+# pipeline_metrics.py - Per-stage latency histograms, queue and drop counters, Prometheus text export
+import time
+import bisect
+import threading
+from collections import deque
+
+STAGES = ('capture', 'resize', 'detect', 'embed', 'match', 'annotate', 'encode', 'emit', 'end_to_end', 'client_emit', 'recognition_emit')
+# Seconds; Prometheus-style cumulative upper bounds, +Inf is implied
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+RATE_WINDOW = 10  # seconds averaged by per-second rates
+PREFIX = 'attendance_'
+
+
+class Histogram:
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Estimate by linear interpolation inside the bucket holding the q-th observation, capped at the maximum"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                if i == len(self.bounds):
+                    return self.max
+                return min(lower + (self.bounds[i] - lower) * (rank - seen) / n, self.max)
+            seen += n
+        return self.max
+
+
+class Rate:
+    """Events per second over the last RATE_WINDOW whole seconds"""
+
+    def __init__(self, window=RATE_WINDOW):
+        self.window = window
+        self.bins = deque()  # (second, count)
+
+    def add(self, n, now=None):
+        second = int(now or time.time())
+        if self.bins and self.bins[-1][0] == second:
+            self.bins[-1] = (second, self.bins[-1][1] + n)
+        else:
+            self.bins.append((second, n))
+        self._trim(second)
+
+    def per_second(self, now=None):
+        second = int(now or time.time())
+        self._trim(second)
+        # The current second is still filling up, so average over the complete ones
+        return sum(n for s, n in self.bins if s < second) / self.window
+
+    def _trim(self, second):
+        while self.bins and self.bins[0][0] <= second - self.window - 1:
+            self.bins.popleft()
+
+
+class PipelineMetrics:
+    """
+    Process-wide telemetry of the recognition pipeline. Stages record their
+    durations with observe(), drops and totals go through inc(), and queue
+    depths are gauges read when the metrics are exported. All methods are
+    thread-safe.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {stage: Histogram() for stage in STAGES}
+        self.counters = {}   # (name, labels) -> value
+        self.gauges = {}     # (name, labels) -> callable returning the current value
+        self.embedding_rate = Rate()
+        self.samples = None  # stage -> [seconds, ...] while keep_samples is on
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            self.histograms[stage].observe(seconds)
+            if self.samples is not None:
+                self.samples[stage].append(seconds)
+
+    def observe_all(self, timings):
+        """Record a {stage: seconds} dict, e.g. the timings filled in by recognize_frame"""
+        with self._lock:
+            for stage, seconds in timings.items():
+                self.histograms[stage].observe(seconds)
+                if self.samples is not None:
+                    self.samples[stage].append(seconds)
+
+    def reset(self, keep_samples=False):
+        """
+        Zero the histograms and counters (gauges stay registered). With
+        keep_samples every observation is also kept, for exact percentiles in
+        benchmarks; a live session should not, as the lists grow without bound.
+        """
+        with self._lock:
+            self.histograms = {stage: Histogram() for stage in STAGES}
+            self.counters = {}
+            self.embedding_rate = Rate()
+            self.samples = {stage: [] for stage in STAGES} if keep_samples else None
+
+    def counter(self, name, **labels):
+        with self._lock:
+            return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def inc(self, name, n=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+            if name == 'embeddings_total':
+                self.embedding_rate.add(n)
+
+    def set_gauge(self, name, fn, **labels):
+        """Report fn() as the gauge; a session registers its queues here and replaces them on restart"""
+        with self._lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = fn
+
+    def remove_gauge(self, name, **labels):
+        with self._lock:
+            self.gauges.pop((name, tuple(sorted(labels.items()))), None)
+
+    def _gauge_values(self):
+        values = {}
+        for key, fn in self.gauges.items():
+            try:
+                values[key] = fn()
+            except Exception:
+                pass  # e.g. qsize() is not implemented for multiprocessing queues on macOS
+        return values
+
+    def snapshot(self):
+        """Plain dict for the periodic stats event: latency percentiles in ms, counters and gauges"""
+        with self._lock:
+            stages = {}
+            for stage, hist in self.histograms.items():
+                if hist.count:
+                    stages[stage] = {
+                        'count': hist.count,
+                        'mean_ms': round(1000 * hist.sum / hist.count, 2),
+                        'p50_ms': round(1000 * hist.quantile(0.5), 2),
+                        'p95_ms': round(1000 * hist.quantile(0.95), 2),
+                        'p99_ms': round(1000 * hist.quantile(0.99), 2),
+                    }
+            counters = {_flat_name(name, labels): value for (name, labels), value in self.counters.items()}
+            gauges = {_flat_name(name, labels): value for (name, labels), value in self._gauge_values().items()}
+            return {
+                'stages': stages,
+                'counters': counters,
+                'gauges': gauges,
+                'embeddings_per_second': round(self.embedding_rate.per_second(), 2),
+            }
+
+    def prometheus(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            lines = [
+                f"# HELP {PREFIX}stage_latency_seconds Time spent per frame in each pipeline stage",
+                f"# TYPE {PREFIX}stage_latency_seconds histogram",
+            ]
+            for stage, hist in self.histograms.items():
+                cumulative = 0
+                for bound, n in zip(hist.bounds, hist.counts):
+                    cumulative += n
+                    lines.append(f'{PREFIX}stage_latency_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{PREFIX}stage_latency_seconds_bucket{{stage="{stage}",le="+Inf"}} {hist.count}')
+                lines.append(f'{PREFIX}stage_latency_seconds_sum{{stage="{stage}"}} {hist.sum:.6f}')
+                lines.append(f'{PREFIX}stage_latency_seconds_count{{stage="{stage}"}} {hist.count}')
+
+            lines += _render_family(self.counters, 'counter')
+            lines += _render_family(self._gauge_values(), 'gauge')
+            lines.append(f"# TYPE {PREFIX}embeddings_per_second gauge")
+            lines.append(f"{PREFIX}embeddings_per_second {self.embedding_rate.per_second():.3f}")
+            return "\n".join(lines) + "\n"
+
+
+def _flat_name(name, labels):
+    return name + ''.join(f"_{value}" for _, value in labels)
+
+
+def _render_family(values, metric_type):
+    lines = []
+    for name in sorted({name for name, _ in values}):
+        lines.append(f"# TYPE {PREFIX}{name} {metric_type}")
+        for (metric, labels), value in sorted(values.items(), key=lambda item: item[0]):
+            if metric == name:
+                label_text = ','.join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f"{PREFIX}{name}{{{label_text}}} {value}" if label_text else f"{PREFIX}{name} {value}")
+    return lines
+
+
+# Shared by every stage of this process
+metrics = PipelineMetrics()
@@ -0,0 +1,291 @@
+# process_workers.py - Detection/recognition in worker processes, frames handed over through shared memory
+import sys
+import time
+import queue
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+from pipeline_metrics import metrics
+from gallery_watcher import GAUGES as GALLERY_GAUGES
+
+# Largest frame a slot holds; bigger frames are downscaled before the hand-off
+MAX_FRAME_SHAPE = (720, 1280, 3)
+# Seconds a worker may take to load its detector, model and gallery
+STARTUP_TIMEOUT = 300
+
+
+class SharedFrameRing:
+    """
+    Fixed-size frame slots in one shared memory block. The creating process
+    owns the free-slot list; a slot is written by a capture thread, read in
+    place by a worker process, and released once its result is collected.
+    """
+
+    def __init__(self, num_slots, max_shape=MAX_FRAME_SHAPE, name=None):
+        self.num_slots = num_slots
+        self.max_shape = tuple(max_shape)
+        self.slot_bytes = int(np.prod(self.max_shape))
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=num_slots * self.slot_bytes)
+        self.free = queue.Queue()
+        if self.owner:
+            for slot in range(num_slots):
+                self.free.put(slot)
+
+    @classmethod
+    def attach(cls, name, num_slots, max_shape=MAX_FRAME_SHAPE):
+        return cls(num_slots, max_shape, name=name)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def acquire(self):
+        """A free slot, or None when every slot is in flight"""
+        try:
+            return self.free.get_nowait()
+        except queue.Empty:
+            return None
+
+    def release(self, slot):
+        self.free.put(slot)
+
+    def view(self, slot, shape):
+        """The frame stored in slot, without copying it out of shared memory"""
+        return np.ndarray(shape, dtype=np.uint8, buffer=self.shm.buf, offset=slot * self.slot_bytes)
+
+    def write(self, slot, frame):
+        """Copy frame into slot; returns the shape it was stored with"""
+        if frame.nbytes > self.slot_bytes or frame.ndim != len(self.max_shape):
+            factor = min(self.max_shape[0] / frame.shape[0], self.max_shape[1] / frame.shape[1])
+            frame = cv2.resize(frame, (int(frame.shape[1] * factor), int(frame.shape[0] * factor)))
+        self.view(slot, frame.shape)[...] = frame
+        return frame.shape
+
+    def close(self):
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # a view is still referenced; the mapping goes away with the process
+        if self.owner:
+            self.shm.unlink()
+
+
+def recognition_worker(worker_id, ring_name, num_slots, max_shape, tasks, done, ready, stop_event, gallery_stats,
+                       config):
+    """
+    Worker process body: loads its own detector, model and gallery, then
+    recognizes (slot, camera_id, shape, captured_at, detect) tasks for the cameras
+    routed to it, so their trackers live entirely in this process. Each
+    worker watches the stored gallery and swaps in new versions itself,
+    writing its version and reload stats to its row of gallery_stats.
+    (worker_id, error) goes to ready once setup finished, error None on success.
+    """
+    import face_recognition_module as frm
+    import torch
+
+    ring = SharedFrameRing.attach(ring_name, num_slots, max_shape)
+    try:
+        known_faces = frm.prepare_gallery(config['embeddings_file'], config['model_name'], config['precision'],
+                                          config['search_index'], config['nprobe'])
+        device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+        session = frm.RecognitionSession(config['model_name'], known_faces, device, None,
+                                         config['detector_backend'], config['camera_ids'])
+        embedder = session.get_embedder()
+        detector = frm.get_detector(config['detector_backend'])
+        # Gallery reload stats go to this worker's row of gallery_stats, which the main process exports
+        offset = worker_id * len(GALLERY_GAUGES)
+
+        def report(watcher):
+            gallery_stats[offset:offset + len(GALLERY_GAUGES)] = watcher.values()
+
+        watcher = session.watch_gallery(config['embeddings_file'], config['precision'], config['search_index'],
+                                        config['nprobe'], config['reload_interval'] or 2.0)
+        watcher.on_reload = report
+        report(watcher)
+        if config.get('reload_interval'):
+            watcher.start(stop_event)
+    except Exception as e:
+        ready.put((worker_id, str(e)))
+        ring.close()
+        return
+
+    ready.put((worker_id, None))
+    print(f"Recognition process {worker_id} started for cameras {config['camera_ids']}")
+    while not stop_event.is_set():
+        try:
+            slot, camera_id, shape, captured_at, detect = tasks.get(timeout=0.5)
+        except queue.Empty:
+            continue
+        timings = {}
+        try:
+            results, matches, faces_seen = frm.recognize_frame(
+                session.cameras[camera_id], ring.view(slot, shape), time.time(),
+                detector, embedder, session.known_faces, config['model_name'], timings, detect)
+        except Exception as e:
+            print(f"Error in recognition process {worker_id}: {str(e)}")
+            results, matches, faces_seen = [], [], 0
+        # Stage timings go back with the result, since metrics are kept in the main process
+        done.put((slot, camera_id, shape, captured_at, results, matches, faces_seen, timings))
+
+    ring.close()
+    print(f"Recognition process {worker_id} stopped")
+
+
+class ProcessWorkerPool:
+    """
+    Runs recognition in num_workers spawned processes. Each camera is routed
+    to worker camera_id % num_workers; frames travel through a SharedFrameRing
+    and only slot numbers and results cross the process boundary.
+    """
+
+    def __init__(self, num_workers, camera_ids, config, queue_size=2, max_shape=MAX_FRAME_SHAPE):
+        self.num_workers = num_workers
+        self.queue_size = queue_size
+        ctx = mp.get_context("spawn")
+        # Every worker can hold queue_size waiting frames, one in progress and one result in transit
+        num_slots = num_workers * (queue_size + 2) + len(camera_ids)
+        self.ring = SharedFrameRing(num_slots, max_shape)
+        self.stop_event = ctx.Event()
+        self.done = ctx.Queue()
+        self.ready = ctx.Queue()
+        self.gallery_stats = ctx.Array('d', num_workers * len(GALLERY_GAUGES), lock=False)
+        self.tasks = [ctx.Queue(maxsize=queue_size) for _ in range(num_workers)]
+        self.dropped = 0
+        self.processes = []
+        for worker_id in range(num_workers):
+            worker_config = dict(config, camera_ids=[c for c in camera_ids if c % num_workers == worker_id])
+            self.processes.append(ctx.Process(
+                target=recognition_worker,
+                args=(worker_id, self.ring.name, num_slots, self.ring.max_shape,
+                      self.tasks[worker_id], self.done, self.ready, self.stop_event, self.gallery_stats,
+                      worker_config),
+                daemon=True))
+
+    def start(self, timeout=STARTUP_TIMEOUT):
+        """
+        Start the workers and wait until each has loaded its model and gallery.
+        Raises RuntimeError, with the pool shut down, if any of them fails.
+        """
+        # A spawned child first re-runs the parent's __main__ (app.py: databases, background
+        # threads, the Flask app). Point __main__ at this import-clean module while starting them.
+        main = sys.modules['__main__']
+        sys.modules['__main__'] = sys.modules[__name__]
+        try:
+            for process in self.processes:
+                process.start()
+        finally:
+            sys.modules['__main__'] = main
+
+        pending = set(range(self.num_workers))
+        deadline = time.time() + timeout
+        error = None
+        while pending and error is None:
+            try:
+                worker_id, error = self.ready.get(timeout=0.5)
+                pending.discard(worker_id)
+                if error:
+                    error = f"recognition process {worker_id} failed to start: {error}"
+            except queue.Empty:
+                dead = [w for w in pending if not self.processes[w].is_alive()]
+                if dead:
+                    error = f"recognition process {dead[0]} exited with code {self.processes[dead[0]].exitcode}"
+                elif time.time() > deadline:
+                    error = f"recognition processes {sorted(pending)} did not start within {timeout}s"
+        if error:
+            self.shutdown()
+            raise RuntimeError(error)
+
+    def submit(self, camera_id, frame_ref, captured_at, detect=True):
+        """
+        Capture sink: copy the frame into shared memory and release frame_ref,
+        dropping the oldest waiting frame of the target worker when it is behind.
+        A pass-through frame (detect False) is dropped itself instead, so it
+        never evicts a frame waiting for detection.
+        """
+        frame = frame_ref.frame
+        tasks = self.tasks[camera_id % self.num_workers]
+        if tasks.full() and not detect:
+            frame_ref.release()
+            self._drop()
+            return
+        if tasks.full():
+            try:
+                self.ring.release(tasks.get_nowait()[0])
+                self._drop()
+            except queue.Empty:
+                pass
+
+        slot = self.ring.acquire()
+        if slot is None:
+            frame_ref.release()
+            self._drop()
+            return
+        shape = self.ring.write(slot, frame)
+        frame_ref.release()
+        try:
+            tasks.put_nowait((slot, camera_id, shape, captured_at, detect))
+        except queue.Full:
+            self.ring.release(slot)
+            self._drop()
+
+    def _drop(self):
+        self.dropped += 1
+        metrics.inc('frames_dropped_total', stage='worker_queue')
+
+    def queue_depth(self):
+        """Frames waiting for any worker"""
+        return sum(tasks.qsize() for tasks in self.tasks)
+
+    def export_gallery_stats(self, metrics):
+        """Report each worker's gallery version and reload stats as gallery_* gauges labelled by worker"""
+        for worker_id in range(self.num_workers):
+            for index, name in enumerate(GALLERY_GAUGES):
+                position = worker_id * len(GALLERY_GAUGES) + index
+                metrics.set_gauge(name, lambda position=position: self.gallery_stats[position],
+                                  worker=str(worker_id))
+
+    def queue_fill(self, camera_id=None):
+        """
+        Waiting frames as a share of the queue of camera_id's worker, 0 to 1;
+        without a camera, of the fullest worker queue.
+        """
+        try:
+            if camera_id is not None:
+                return self.tasks[camera_id % self.num_workers].qsize() / self.queue_size
+            return max(tasks.qsize() for tasks in self.tasks) / self.queue_size
+        except NotImplementedError:
+            return 0.0  # qsize() is not available for multiprocessing queues on macOS
+
+    def collect(self, exit_event, on_result):
+        """
+        Main-process thread: pass each finished frame to
+        on_result(camera_id, frame, results, matches, faces_seen, captured_at, timings)
+        and free its slot. frame is a view into shared memory that is only valid
+        during the call. Shuts the pool down once exit_event is set.
+        """
+        while not exit_event.is_set():
+            try:
+                slot, camera_id, shape, captured_at, results, matches, faces_seen, timings = self.done.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                on_result(camera_id, self.ring.view(slot, shape), results, matches, faces_seen, captured_at, timings)
+            except Exception as e:
+                print(f"Error handling recognition result: {str(e)}")
+            self.ring.release(slot)
+        self.shutdown()
+
+    def shutdown(self, timeout=5.0):
+        self.stop_event.set()
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        for q in self.tasks + [self.done, self.ready]:
+            q.cancel_join_thread()
+            q.close()
+        self.ring.close()
+        if self.dropped:
+            print(f"Process pool dropped {self.dropped} frames")
@@ -0,0 +1,48 @@
+# quantization.py - Scalar quantization of unit-length gallery embeddings
+import numpy as np
+
+PRECISIONS = ("float32", "float16", "int8")
+
+
+def quantize(embeddings, precision):
+    """
+    Encode an L2-normalized float32 matrix. Returns (codes, scales):
+    float16 keeps half-precision copies and no scales; int8 maps every
+    dimension onto [-127, 127] with its own scale (max |value| / 127).
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if precision == "float32":
+        return embeddings, None
+    if precision == "float16":
+        return embeddings.astype(np.float16), None
+    if precision == "int8":
+        scales = np.abs(embeddings).max(axis=0) / 127.0 if len(embeddings) else np.ones(embeddings.shape[1:])
+        scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+        codes = np.clip(np.rint(embeddings / scales), -127, 127).astype(np.int8)
+        return codes, scales
+    raise ValueError(f"Unknown precision {precision!r}, expected one of {PRECISIONS}")
+
+
+def dequantize(codes, scales=None):
+    rows = codes.astype(np.float32)
+    if scales is not None:
+        rows *= scales
+    return rows
+
+
+def similarities(queries, codes, scales=None, chunk_rows=8192):
+    """
+    queries @ dequantize(codes).T without materializing the full float32
+    gallery: codes are widened chunk by chunk so the temporary stays small.
+    For int8 the per-dimension scales are folded into the queries instead.
+    """
+    queries = np.asarray(queries, dtype=np.float32)
+    if codes.dtype == np.float32:
+        return queries @ codes.T
+    if scales is not None:
+        queries = queries * scales
+    out = np.empty((len(queries), len(codes)), dtype=np.float32)
+    for start in range(0, len(codes), chunk_rows):
+        chunk = codes[start:start + chunk_rows].astype(np.float32)
+        out[:, start:start + chunk_rows] = queries @ chunk.T
+    return out
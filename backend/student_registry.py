@@ -0,0 +1,133 @@
+# student_registry.py - Students loaded once, hash-indexed, persisted by appending CSV rows
+import os
+import csv
+import threading
+from pathlib import Path
+
+STUDENT_FIELDS = ['id', 'faculty', 'degree_program', 'intake', 'index_number', 'first_name',
+                  'last_name', 'email', 'phone', 'university_id', 'nic_number', 'address',
+                  'created_at', 'image_path', 'subjects']
+UNIQUE_FIELDS = ('email', 'index_number', 'university_id', 'nic_number')
+# Rewrite a program's CSV once superseded rows outnumber live ones
+COMPACT_RATIO = 1.0
+
+
+def program_key(degree_program):
+    return degree_program.lower().replace(' ', '_')
+
+
+def full_name(student):
+    return f"{student['first_name']} {student['last_name']}"
+
+
+class StudentRegistry:
+    """
+    All students of students_data/<program>_students.csv kept in memory, with
+    hash indexes on the unique fields (per program, as before) and on full
+    name. A new or updated student is appended to its program's CSV; on load
+    the last row for an id wins, and a file is compacted with an atomic
+    rewrite once it holds more superseded rows than live ones.
+    """
+
+    def __init__(self, students_dir='students_data'):
+        self.students_dir = Path(students_dir)
+        self.students_dir.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.programs = {}      # program -> {id: student}
+        self.unique = {field: {} for field in UNIQUE_FIELDS}  # field -> {(program, value): student}
+        self.by_name = {}       # full name -> [student, ...] in registration order
+        self.next_id = {}
+        self.dead_rows = {}
+        for csv_file in sorted(self.students_dir.glob('*_students.csv')):
+            self._load(csv_file.name[:-len('_students.csv')], csv_file)
+
+    def _csv_path(self, program):
+        return self.students_dir / f"{program}_students.csv"
+
+    def _load(self, program, csv_file):
+        students = {}
+        rows = 0
+        with open(csv_file, 'r', newline='') as f:
+            for row in csv.DictReader(f):
+                rows += 1
+                students[row['id']] = row
+        self.programs[program] = students
+        self.dead_rows[program] = rows - len(students)
+        self.next_id[program] = max((int(i) for i in students), default=0) + 1
+        for student in students.values():
+            self._index(program, student)
+
+    def _index(self, program, student):
+        for field in UNIQUE_FIELDS:
+            if student.get(field):
+                self.unique[field][(program, student[field])] = student
+        self.by_name.setdefault(full_name(student), []).append(student)
+
+    def _append(self, program, student):
+        path = self._csv_path(program)
+        file_exists = path.exists()
+        with open(path, 'a', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=STUDENT_FIELDS, extrasaction='ignore')
+            if not file_exists:
+                writer.writeheader()
+            writer.writerow(student)
+
+    def _compact(self, program):
+        path = self._csv_path(program)
+        tmp_path = path.with_suffix('.csv.tmp')
+        with open(tmp_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=STUDENT_FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(self.programs[program].values())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        self.dead_rows[program] = 0
+
+    def students(self, degree_program):
+        """Copies of a program's students, in id order"""
+        with self.lock:
+            students = self.programs.get(program_key(degree_program), {})
+            return [dict(s) for s in sorted(students.values(), key=lambda s: int(s['id']))]
+
+    def register(self, degree_program, student):
+        """
+        Add student (a dict of STUDENT_FIELDS without id) to its program.
+        Returns the stored copy with its new id, or None if a unique field is taken.
+        """
+        program = program_key(degree_program)
+        with self.lock:
+            for field in UNIQUE_FIELDS:
+                if student.get(field) and (program, student[field]) in self.unique[field]:
+                    return None
+            student = dict(student, id=str(self.next_id.get(program, 1)))
+            self._append(program, student)
+            self.programs.setdefault(program, {})[student['id']] = student
+            self.next_id[program] = int(student['id']) + 1
+            self.dead_rows.setdefault(program, 0)
+            self._index(program, student)
+            return dict(student)
+
+    def find_by_name(self, name):
+        """The first registered student named "<first> <last>", or None"""
+        with self.lock:
+            matches = self.by_name.get(name)
+            return dict(matches[0]) if matches else None
+
+    def update(self, degree_program, student_id, **changes):
+        """Change non-unique fields of a student, e.g. image_path; returns the updated copy"""
+        program = program_key(degree_program)
+        if any(field in UNIQUE_FIELDS or field in ('id', 'first_name', 'last_name') for field in changes):
+            raise ValueError("Only non-identifying student fields can be updated")
+        with self.lock:
+            student = self.programs[program][student_id]
+            student.update(changes)
+            self._append(program, student)
+            self.dead_rows[program] += 1
+            if self.dead_rows[program] > COMPACT_RATIO * len(self.programs[program]):
+                self._compact(program)
+            return dict(student)
+
+    def __len__(self):
+        with self.lock:
+            return sum(len(students) for students in self.programs.values())
@@ -0,0 +1,92 @@
+# training_jobs.py - Background model training runs with single-flight locking and progress reporting
+import time
+import uuid
+import threading
+
+
+class TrainingJobs:
+    """
+    Runs one training job at a time on a background thread. start() returns
+    the new job's ID immediately, or None while another job is still running.
+    The job function receives a progress(done, total, images_per_second)
+    callback and returns a result dict with 'success' and optional 'details'.
+    """
+
+    def __init__(self, on_progress=None, on_finished=None):
+        self.on_progress = on_progress
+        self.on_finished = on_finished
+        self.jobs = {}
+        self.latest_id = None
+        self._running = threading.Lock()
+        self._lock = threading.Lock()
+
+    def start(self, job_fn):
+        if not self._running.acquire(blocking=False):
+            return None
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self.jobs[job_id] = {
+                'id': job_id,
+                'state': 'running',
+                'started_at': time.time(),
+                'finished_at': None,
+                'duration': None,
+                'progress': {'done': 0, 'total': 0, 'images_per_second': 0.0, 'eta_seconds': None},
+                'gallery_version': None,
+                'details': None,
+                'error': None,
+            }
+            self.latest_id = job_id
+        threading.Thread(target=self._run, args=(job_id, job_fn), daemon=True).start()
+        return job_id
+
+    def running_job(self):
+        """ID of the job in progress, or None"""
+        with self._lock:
+            job = self.jobs.get(self.latest_id)
+            return job['id'] if job and job['state'] == 'running' else None
+
+    def get(self, job_id=None):
+        """A copy of job_id's record (default: the most recent job), or None"""
+        with self._lock:
+            job = self.jobs.get(job_id or self.latest_id)
+            if job is None:
+                return None
+            job = dict(job, progress=dict(job['progress']))
+            if job['state'] == 'running':
+                job['duration'] = round(time.time() - job['started_at'], 3)
+            return job
+
+    def _progress(self, job_id, done, total, images_per_second):
+        eta = (total - done) / images_per_second if images_per_second > 0 else None
+        progress = {
+            'done': done,
+            'total': total,
+            'images_per_second': round(images_per_second, 2),
+            'eta_seconds': round(eta, 1) if eta is not None else None,
+        }
+        with self._lock:
+            self.jobs[job_id]['progress'] = progress
+        if self.on_progress:
+            self.on_progress(dict(progress, jobId=job_id))
+
+    def _run(self, job_id, job_fn):
+        try:
+            result = job_fn(lambda done, total, ips: self._progress(job_id, done, total, ips))
+        except Exception as e:
+            result = {'success': False, 'error': f'Unexpected error during model training: {str(e)}'}
+        finally:
+            self._running.release()
+
+        with self._lock:
+            job = self.jobs[job_id]
+            job['finished_at'] = time.time()
+            job['duration'] = round(job['finished_at'] - job['started_at'], 3)
+            job['state'] = 'succeeded' if result.get('success') else 'failed'
+            job['details'] = result.get('details')
+            job['error'] = result.get('error')
+            job['gallery_version'] = (result.get('details') or {}).get('gallery_version')
+            job_copy = dict(job)
+        print(f"Training job {job_id} {job_copy['state']} in {job_copy['duration']:.1f}s")
+        if self.on_finished:
+            self.on_finished(job_copy)
@@ -0,0 +1,71 @@
+"""
+Recall-vs-latency sweep of the IVF index against exact FaceGallery search.
+
+    python benchmarks/benchmark_ann.py --people 20000 --per-person 5 --nprobe 1 2 4 8 16 32
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from face_gallery import FaceGallery
+from ann_index import IVFIndex
+
+
+def make_gallery(num_people, per_person, dim, noise, rng):
+    centers = rng.standard_normal((num_people, dim)).astype(np.float32)
+    rows = np.repeat(centers, per_person, axis=0)
+    rows += noise * rng.standard_normal(rows.shape).astype(np.float32)
+    labels = np.repeat(np.arange(num_people), per_person)
+    return FaceGallery(rows, labels, [f"person_{i}" for i in range(num_people)]), centers
+
+
+def time_search(gallery, queries, batch_size, repeats=3):
+    """Best-of-N wall time per query when queries arrive batch_size at a time (one frame's faces)"""
+    best = float('inf')
+    for _ in range(repeats):
+        labels = []
+        start = time.perf_counter()
+        for i in range(0, len(queries), batch_size):
+            labels.append(gallery.search(queries[i:i + batch_size], k=1)[1][:, 0])
+        best = min(best, time.perf_counter() - start)
+    return np.concatenate(labels), best * 1000 / len(queries)
+
+
+def run(args):
+    rng = np.random.default_rng(args.seed)
+    gallery, centers = make_gallery(args.people, args.per_person, args.dim, args.noise, rng)
+    picks = rng.integers(0, args.people, args.queries)
+    queries = centers[picks] + args.noise * rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+
+    exact_labels, exact_ms = time_search(gallery, queries, args.batch)
+    print(f"Gallery: {args.people} people, {len(gallery)} embeddings, dim {args.dim}")
+    print(f"Exact search: {exact_ms:.3f} ms/query, top-1 accuracy {np.mean(exact_labels == picks):.3f}")
+
+    start = time.perf_counter()
+    index = IVFIndex.build(gallery.embeddings, nlist=args.nlist)
+    print(f"Built IVF index with {index.nlist} lists in {time.perf_counter() - start:.1f}s\n")
+    gallery.set_index(index)
+
+    print(f"{'nprobe':>6} {'recall@1':>9} {'ms/query':>9} {'speedup':>8}")
+    for nprobe in args.nprobe:
+        index.nprobe = nprobe
+        ivf_labels, ivf_ms = time_search(gallery, queries, args.batch)
+        recall = np.mean(ivf_labels == exact_labels)
+        print(f"{nprobe:>6} {recall:>9.3f} {ivf_ms:>9.3f} {exact_ms / ivf_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--people', type=int, default=20000)
+    parser.add_argument('--per-person', type=int, default=5)
+    parser.add_argument('--dim', type=int, default=512)
+    parser.add_argument('--nlist', type=int, default=None, help='inverted lists (default sqrt of gallery size)')
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--batch', type=int, default=1, help='queries per search call (faces per frame)')
+    parser.add_argument('--noise', type=float, default=1.0, help='per-dimension noise around each identity')
+    parser.add_argument('--seed', type=int, default=0)
+    run(parser.parse_args())
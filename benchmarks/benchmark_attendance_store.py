@@ -0,0 +1,126 @@
+"""
+/api/attendance query latency at scale: the old per-day CSV files (glob,
+parse and filter in Python) vs. the indexed SQLite AttendanceStore, plus the
+one-time CSV import.
+
+    python benchmarks/benchmark_attendance_store.py --records 1000000 --days 500
+"""
+import os
+import sys
+import csv
+import time
+import argparse
+import tempfile
+import datetime
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from attendance_store import AttendanceStore
+
+HEADERS = ['indexNumber', 'name', 'status', 'timestamp', 'class', 'section']
+CLASSES = ['CS', 'CE', 'SE']
+SECTIONS = ['SE3012', 'SE3022', 'SE3032', 'CS3023', 'CS3042', 'CS3082', 'COE3072']
+
+
+def write_csvs(csv_dir, args):
+    rng = np.random.default_rng(args.seed)
+    start = datetime.date(2023, 1, 1)
+    per_day = args.records // args.days
+    # The store keeps one record per student per lecture per day, so every generated row is a distinct lecture key
+    lectures = args.students * len(CLASSES) * len(SECTIONS)
+    if per_day > lectures:
+        raise SystemExit(f"{per_day} records a day need more than {lectures} student/class/subject combinations; "
+                         f"raise --students or --days")
+    dates = []
+    for d in range(args.days):
+        date = (start + datetime.timedelta(days=d)).isoformat()
+        dates.append(date)
+        keys = rng.choice(lectures, per_day, replace=False)
+        students, rest = np.divmod(keys, len(CLASSES) * len(SECTIONS))
+        classes, sections = np.divmod(rest, len(SECTIONS))
+        with open(os.path.join(csv_dir, f"attendance_{date}.csv"), 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(HEADERS)
+            for s, c, sec in zip(students, classes, sections):
+                writer.writerow([f"IT{s:06d}", f"Student {s}", 'present', f"{date}T09:00:00",
+                                 CLASSES[c], SECTIONS[sec]])
+    return dates
+
+
+def csv_query(csv_dir, date=None, degree_program=None, subject=None, student_id=None):
+    """The previous get_attendance implementation"""
+    all_records = []
+    if date:
+        path = os.path.join(csv_dir, f"attendance_{date}.csv")
+        if os.path.exists(path):
+            with open(path, 'r', newline='') as f:
+                all_records = list(csv.DictReader(f))
+    else:
+        for name in os.listdir(csv_dir):
+            if name.startswith('attendance_') and name.endswith('.csv'):
+                with open(os.path.join(csv_dir, name), 'r', newline='') as f:
+                    all_records.extend(list(csv.DictReader(f)))
+    records = all_records
+    if degree_program:
+        records = [r for r in records if r['class'] == degree_program]
+    if subject:
+        records = [r for r in records if r['section'] == subject]
+    if student_id:
+        records = [r for r in records if r['indexNumber'] == student_id]
+    return records
+
+
+def timed(fn, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best * 1000
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix='attendance_bench_')
+    print(f"Writing {args.records} records over {args.days} daily CSVs to {workdir}")
+    dates = write_csvs(workdir, args)
+
+    store = AttendanceStore(os.path.join(workdir, 'attendance.db'))
+    start = time.perf_counter()
+    imported = store.import_csv_dir(workdir) if args.verbose_import else _quiet_import(store, workdir)
+    print(f"Imported {imported} records in {time.perf_counter() - start:.1f}s")
+
+    queries = {
+        'one day': dict(date=dates[len(dates) // 2]),
+        'day+class+subject': dict(date=dates[len(dates) // 2], degree_program='CS', subject='SE3012'),
+        'one student, all days': dict(student_id='IT000042'),
+        'class+subject, all days': dict(degree_program='SE', subject='SE3032'),
+    }
+    print(f"{'query':>24} {'rows':>8} {'csv ms':>10} {'sqlite ms':>10} {'speedup':>8}")
+    for label, q in queries.items():
+        csv_rows, csv_ms = timed(lambda: csv_query(workdir, **q), 1)
+        db_rows, db_ms = timed(lambda: store.query(date=q.get('date'), class_name=q.get('degree_program'),
+                                                   section=q.get('subject'), index_number=q.get('student_id')),
+                               args.repeats)
+        assert len(csv_rows) == len(db_rows)
+        print(f"{label:>24} {len(db_rows):8d} {csv_ms:10.1f} {db_ms:10.2f} {csv_ms / max(db_ms, 1e-9):7.0f}x")
+
+
+def _quiet_import(store, csv_dir):
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        return store.import_csv_dir(csv_dir)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=1_000_000)
+    parser.add_argument('--days', type=int, default=500)
+    parser.add_argument('--students', type=int, default=5000)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--verbose-import', action='store_true', help='print every imported file')
+    parser.add_argument('--seed', type=int, default=0)
+    run(parser.parse_args())
@@ -0,0 +1,46 @@
+"""
+Per-call face detection latency: a detector constructed on every call (how
+detect_faces_opencv used to load the Haar cascade) vs. the registry's cached
+per-thread instance, and one batched detect() over several frames.
+
+    python benchmarks/benchmark_detectors.py --backends opencv mediapipe --calls 200 --batch 4
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from face_detectors import DETECTORS, get_detector
+
+
+def per_call_ms(fn, frames, calls):
+    fn(frames[0])
+    start = time.perf_counter()
+    for i in range(calls):
+        fn(frames[i % len(frames)])
+    return (time.perf_counter() - start) * 1000 / calls
+
+
+def run(args):
+    rng = np.random.default_rng(args.seed)
+    # Detection runs on frames downscaled to 320x240
+    frames = [rng.integers(0, 255, (240, 320, 3), dtype=np.uint8) for _ in range(8)]
+    batch = frames[:args.batch]
+
+    print(f"{'backend':>10} {'per-call construct':>20} {'cached':>10} {'batch/frame':>12}")
+    for name in args.backends:
+        fresh = per_call_ms(lambda f: DETECTORS[name]().detect_one(f), frames, max(args.calls // 10, 1))
+        cached = per_call_ms(lambda f: get_detector(name).detect_one(f), frames, args.calls)
+        batched = per_call_ms(lambda f: get_detector(name).detect(batch), frames, max(args.calls // args.batch, 1))
+        print(f"{name:>10} {fresh:18.2f}ms {cached:8.2f}ms {batched / args.batch:10.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', nargs='+', default=['opencv', 'mediapipe'], choices=sorted(DETECTORS))
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--batch', type=int, default=4, help='frames per detect() call')
+    parser.add_argument('--seed', type=int, default=0)
+    run(parser.parse_args())
@@ -0,0 +1,117 @@
+"""
+End-to-end throughput and latency of the recognition pipeline with the
+worker pool run as threads vs. as separate processes.
+
+Every camera replays the same video file (a synthetic one is generated if
+--video is not given) at its native frame rate; latency is measured from
+capture to the result leaving the pool. Every frame is detected, so both
+modes do the same work, and throughput is timed from the first result, so
+model loading (much slower for processes) is not counted. Needs a trained model.
+
+    python benchmarks/benchmark_execution_modes.py --cameras 4 --workers 4 --video lecture.mp4
+"""
+import os
+import sys
+import time
+import queue
+import argparse
+import tempfile
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+import face_recognition_module as frm
+from frame_scheduler import FrameScheduler, DETECT
+
+
+class DetectEveryFrame(FrameScheduler):
+    """Sends every captured frame to detection instead of scheduling on latency and queue fill"""
+
+    def admit(self, camera_id, now=None):
+        with self._lock:
+            self.counters[DETECT] += 1
+        return DETECT
+
+
+def synthetic_video(path, seconds, fps=30, size=(640, 480), seed=0):
+    """Noise background with a few moving bright blobs, so detectors have something to chew on"""
+    rng = np.random.default_rng(seed)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, size)
+    background = rng.integers(0, 80, (size[1], size[0], 3), dtype=np.uint8)
+    for i in range(int(seconds * fps)):
+        frame = background.copy()
+        for k in range(3):
+            x = int((i * (k + 2) * 3) % (size[0] - 80))
+            cv2.ellipse(frame, (x + 40, 120 + 100 * k), (30, 40), 0, 0, 360, (180, 190, 210), -1)
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def run_mode(mode, args, video):
+    threads = frm.start_face_recognition(
+        model_name=args.model, embeddings_file=args.model_path, detector_backend=args.detector,
+        sources=[video] * args.cameras, num_workers=args.workers, execution_mode=mode, stream=False)
+    if not threads:
+        raise SystemExit(f"Could not start the {mode} pipeline")
+
+    capture_threads = [t for name, t in threads.items() if name.startswith('capture_thread')]
+    latencies = []
+    # Timed from the first result, so model loading is not counted
+    start = last_result = None
+    # Drain until every source hit EOF and the pool went quiet
+    while True:
+        try:
+            _, frame_ref, _, captured_at = frm.result_queue.get(timeout=0.1)
+            last_result = time.time()
+            start = start or last_result
+            latencies.append(last_result - captured_at)
+            frame_ref.release()
+        except queue.Empty:
+            if any(t.is_alive() for t in capture_threads):
+                continue
+            if time.time() - (last_result or 0.0) > 1.0:
+                break
+    elapsed = (last_result or 0.0) - (start or 0.0)
+
+    frm.stop_face_recognition()
+    for t in threads.values():
+        t.join()
+
+    latencies = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        'frames': len(latencies),
+        'fps': len(latencies) / max(elapsed, 1e-9),
+        'p50': np.percentile(latencies, 50),
+        'p95': np.percentile(latencies, 95),
+    }
+
+
+def run(args):
+    args.model_path = os.path.abspath(args.model_path)
+    workdir = tempfile.mkdtemp(prefix='exec_modes_')
+    video = os.path.abspath(args.video) if args.video else synthetic_video(
+        os.path.join(workdir, 'synthetic.avi'), args.seconds)
+    # Keep the benchmark's attendance.csv out of the project directory
+    os.chdir(workdir)
+    # start_face_recognition builds its scheduler from this name
+    frm.FrameScheduler = DetectEveryFrame
+
+    print(f"{args.cameras} camera(s) replaying {video}, {args.workers} worker(s), detector {args.detector}")
+    print(f"{'mode':>8} {'frames':>8} {'fps':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for mode in args.modes:
+        r = run_mode(mode, args, video)
+        print(f"{mode:>8} {r['frames']:8d} {r['fps']:8.1f} {r['p50']:8.1f} {r['p95']:8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--video', help='video file every camera replays (default: generated)')
+    parser.add_argument('--seconds', type=float, default=10, help='length of the generated video')
+    parser.add_argument('--cameras', type=int, default=2)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--modes', nargs='+', default=['thread', 'process'], choices=['thread', 'process'])
+    parser.add_argument('--model', default='Facenet512')
+    parser.add_argument('--model-path', default='trained_models/face_recognition_model')
+    parser.add_argument('--detector', default='mediapipe', choices=['mediapipe', 'opencv'])
+    run(parser.parse_args())
@@ -0,0 +1,56 @@
+"""
+Per-frame embedding latency as the number of faces in a frame grows:
+one DeepFace.represent call per face vs. one batched FaceEmbedder pass.
+
+    python benchmarks/benchmark_frame_embedding.py --faces 1 5 10 20 30
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from deepface import DeepFace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from face_embedder import FaceEmbedder
+
+
+def per_face(crops, model_name):
+    return [DeepFace.represent(crop, model_name=model_name, enforce_detection=False,
+                               detector_backend="skip")[0]['embedding'] for crop in crops]
+
+
+def best_time(fn, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best * 1000
+
+
+def run(args):
+    rng = np.random.default_rng(args.seed)
+    embedder = FaceEmbedder(args.model)
+    # Random BGR crops roughly the size MediaPipe boxes have in a 640x480 lecture-hall frame
+    all_crops = [rng.integers(0, 255, (int(rng.integers(60, 140)), int(rng.integers(50, 120)), 3), dtype=np.uint8)
+                 for _ in range(max(args.faces))]
+    per_face(all_crops[:1], args.model)
+    embedder.embed_bgr_crops(all_crops[:1])
+
+    print(f"{'faces':>5} {'per-face ms':>12} {'batched ms':>11} {'speedup':>8} {'max |diff|':>11}")
+    for n in args.faces:
+        crops = all_crops[:n]
+        reference, single_ms = best_time(lambda: per_face(crops, args.model), args.repeats)
+        batched, batched_ms = best_time(lambda: embedder.embed_bgr_crops(crops, batch_size=n), args.repeats)
+        diff = float(np.max(np.abs(np.asarray(reference) - batched)))
+        print(f"{n:>5} {single_ms:>12.1f} {batched_ms:>11.1f} {single_ms / batched_ms:>7.1f}x {diff:>11.2e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--faces', type=int, nargs='+', default=[1, 5, 10, 20, 30])
+    parser.add_argument('--model', default="Facenet512")
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    run(parser.parse_args())
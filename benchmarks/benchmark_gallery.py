@@ -0,0 +1,77 @@
+"""
+Compare the legacy per-embedding recognize_face loop with FaceGallery.
+
+    python benchmarks/benchmark_gallery.py --sizes 100 1000 10000 --per-person 3
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from scipy.spatial.distance import cosine
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from face_gallery import FaceGallery
+
+
+def legacy_recognize_face(face_embedding, known_faces, threshold=0.3):
+    """The original nested loop, kept here as the baseline"""
+    best_match = "Unknown"
+    min_distance = threshold
+    for person_name, embeddings in known_faces.items():
+        for stored_embedding in embeddings:
+            distance = cosine(face_embedding, stored_embedding)
+            if distance < min_distance:
+                best_match = person_name
+                min_distance = distance
+    confidence = max(0, 1 - min_distance)
+    return best_match, confidence
+
+
+def make_known_faces(num_people, per_person, dim, rng):
+    centers = rng.standard_normal((num_people, dim)).astype(np.float32)
+    known_faces = {}
+    for i, center in enumerate(centers):
+        samples = center + 0.3 * rng.standard_normal((per_person, dim)).astype(np.float32)
+        known_faces[f"person_{i}"] = [s.tolist() for s in samples]
+    return known_faces, centers
+
+
+def make_queries(centers, num_queries, rng):
+    picks = rng.integers(0, len(centers), num_queries)
+    return centers[picks] + 0.3 * rng.standard_normal((num_queries, centers.shape[1])).astype(np.float32)
+
+
+def run(sizes, per_person, dim, num_queries, legacy_queries, seed):
+    rng = np.random.default_rng(seed)
+    print(f"{'identities':>10} {'embeddings':>10} {'legacy ms/q':>12} {'gallery ms/q':>13} {'speedup':>8} {'agree':>6}")
+    for num_people in sizes:
+        known_faces, centers = make_known_faces(num_people, per_person, dim, rng)
+        queries = make_queries(centers, num_queries, rng)
+        gallery = FaceGallery.from_dict(known_faces)
+
+        n_legacy = min(legacy_queries, num_queries)
+        start = time.perf_counter()
+        legacy = [legacy_recognize_face(q, known_faces) for q in queries[:n_legacy]]
+        legacy_ms = (time.perf_counter() - start) * 1000 / n_legacy
+
+        gallery.match(queries[:1])  # warm up BLAS
+        start = time.perf_counter()
+        matched = gallery.match(queries)
+        gallery_ms = (time.perf_counter() - start) * 1000 / num_queries
+
+        agree = sum(a[0] == b[0] for a, b in zip(legacy, matched[:n_legacy])) / n_legacy
+        print(f"{num_people:>10} {len(gallery):>10} {legacy_ms:>12.3f} {gallery_ms:>13.4f} "
+              f"{legacy_ms / gallery_ms:>7.0f}x {agree:>6.0%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--per-person', type=int, default=3)
+    parser.add_argument('--dim', type=int, default=512)
+    parser.add_argument('--queries', type=int, default=64, help='query batch size for FaceGallery')
+    parser.add_argument('--legacy-queries', type=int, default=8, help='queries timed on the slow loop')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    run(args.sizes, args.per_person, args.dim, args.queries, args.legacy_queries, args.seed)
@@ -0,0 +1,63 @@
+"""
+Load time and file size of the legacy pickled dict-of-lists model vs. the
+memory-mapped gallery store, as the gallery grows.
+
+    python benchmarks/benchmark_gallery_store.py --sizes 1000 10000 50000
+"""
+import os
+import sys
+import time
+import pickle
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from face_gallery import FaceGallery
+from gallery_store import save_gallery, load_gallery, gallery_dir_for
+
+
+def dir_size(path):
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+
+def run(args):
+    rng = np.random.default_rng(args.seed)
+    print(f"{'embeddings':>10} {'pickle MB':>10} {'pickle load s':>14} {'store MB':>9} {'mmap load ms':>13} {'first match ms':>15}")
+    for size in args.sizes:
+        people = max(1, size // args.per_person)
+        known_faces = {f"person_{i}": rng.standard_normal((args.per_person, args.dim)).tolist()
+                       for i in range(people)}
+        with tempfile.TemporaryDirectory() as tmp:
+            model_path = os.path.join(tmp, 'face_recognition_model')
+            with open(model_path, 'wb') as f:
+                pickle.dump(known_faces, f)
+            save_gallery(FaceGallery.from_dict(known_faces), model_path)
+            del known_faces
+
+            start = time.perf_counter()
+            with open(model_path, 'rb') as f:
+                pickle.load(f)
+            pickle_s = time.perf_counter() - start
+
+            start = time.perf_counter()
+            gallery = load_gallery(model_path)
+            mmap_ms = (time.perf_counter() - start) * 1000
+
+            query = rng.standard_normal((1, args.dim))
+            start = time.perf_counter()
+            gallery.match(query)
+            match_ms = (time.perf_counter() - start) * 1000
+
+            print(f"{len(gallery):>10} {os.path.getsize(model_path) / 1e6:>10.1f} {pickle_s:>14.3f} "
+                  f"{dir_size(gallery_dir_for(model_path)) / 1e6:>9.1f} {mmap_ms:>13.2f} {match_ms:>15.2f}")
+            del gallery
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--per-person', type=int, default=5)
+    parser.add_argument('--dim', type=int, default=512)
+    parser.add_argument('--seed', type=int, default=0)
+    run(parser.parse_args())
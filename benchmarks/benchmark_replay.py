@@ -0,0 +1,170 @@
+"""
+Offline replay of the full recognition pipeline (capture -> detection ->
+recognition -> stream encoding) without a webcam, for comparing releases
+on the same machine.
+
+Each camera replays a video file (a synthetic one is generated if --video
+is not given) at its recorded rate, at --fps, or as fast as it decodes
+with --fps 0. Reports processed and streamed FPS, capture-to-emit latency
+percentiles, frames dropped per stage (the table's "dropped" column is
+frame_queue, or the worker queues in process mode), embeddings per second
+and the frame scheduler's decisions (frames detected, passed through and
+skipped, and the detection interval it settled on), and writes them as
+JSON with --output. --latency-budget and --cpu-target tune the scheduler.
+Needs a trained model.
+
+    python benchmarks/benchmark_replay.py --video lecture.mp4 --cameras 2 --fps 0 --output replay.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import datetime
+import tempfile
+import subprocess
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+import face_recognition_module as frm
+from pipeline_metrics import metrics, STAGES
+from benchmark_execution_modes import synthetic_video
+
+DROP_STAGES = ('capture', 'frame_queue', 'worker_queue', 'stream_coalesced')
+DECISIONS = ('detect', 'stream', 'skip')
+
+
+def percentiles(samples):
+    if not samples:
+        return None
+    ms = np.array(samples) * 1000
+    return {
+        'count': len(ms),
+        'mean_ms': round(float(ms.mean()), 2),
+        'p50_ms': round(float(np.percentile(ms, 50)), 2),
+        'p95_ms': round(float(np.percentile(ms, 95)), 2),
+        'p99_ms': round(float(np.percentile(ms, 99)), 2),
+    }
+
+
+def replay(mode, args, video):
+    metrics.reset(keep_samples=True)
+    threads = frm.start_face_recognition(
+        model_name=args.model, embeddings_file=args.model_path, detector_backend=args.detector,
+        sources=[video] * args.cameras, num_workers=args.workers, execution_mode=mode,
+        stream=True, stream_fps=args.stream_fps, reload_interval=0, replay_fps=args.fps,
+        latency_budget=args.latency_budget, cpu_target=args.cpu_target)
+    if not threads:
+        raise SystemExit(f"Could not start the {mode} pipeline")
+
+    capture_threads = [t for name, t in threads.items() if name.startswith('capture_thread')]
+    # Throughput is timed from the first recognized frame, so model loading is not counted
+    start = None
+    # Run until every source hit EOF and no frame has come out of recognition for a second
+    last_count, last_change = 0, time.time()
+    while True:
+        time.sleep(0.01)
+        processed = metrics.counter('frames_processed_total')
+        if processed != last_count:
+            start = start or time.time()
+            last_count, last_change = processed, time.time()
+        elif not any(t.is_alive() for t in capture_threads) and time.time() - last_change > 1.0:
+            break
+    elapsed = last_change - (start or last_change)
+    interval = metrics.snapshot()['gauges'].get('detection_interval_seconds')
+
+    frm.stop_face_recognition()
+    for t in threads.values():
+        t.join()
+
+    samples = metrics.samples
+    return {
+        'mode': mode,
+        'seconds': round(elapsed, 2),
+        'frames_captured': metrics.counter('frames_captured_total'),
+        'frames_processed': processed,
+        'frames_streamed': len(samples['emit']),
+        'processed_fps': round(processed / max(elapsed, 1e-9), 2),
+        'streamed_fps': round(len(samples['emit']) / max(elapsed, 1e-9), 2),
+        'latency': percentiles(samples['end_to_end']),
+        'stages': {stage: percentiles(samples[stage]) for stage in STAGES if samples[stage]},
+        'dropped': {stage: metrics.counter('frames_dropped_total', stage=stage) for stage in DROP_STAGES},
+        'embeddings': metrics.counter('embeddings_total'),
+        'embeddings_per_second': round(metrics.counter('embeddings_total') / max(elapsed, 1e-9), 2),
+        'scheduled': {decision: metrics.counter('frames_scheduled_total', decision=decision) for decision in DECISIONS},
+        'detection_interval': interval,
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'opencv': cv2.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+    }
+
+
+def run(args):
+    args.model_path = os.path.abspath(args.model_path)
+    output = os.path.abspath(args.output) if args.output else None
+    workdir = tempfile.mkdtemp(prefix='replay_')
+    video = os.path.abspath(args.video) if args.video else synthetic_video(
+        os.path.join(workdir, 'synthetic.avi'), args.seconds)
+    # Keep the benchmark's attendance.csv out of the project directory
+    os.chdir(workdir)
+
+    rate = 'recorded rate' if args.fps is None else ('as fast as possible' if args.fps == 0 else f"{args.fps} fps")
+    print(f"{args.cameras} camera(s) replaying {video} at {rate}, {args.workers} worker(s), detector {args.detector}")
+    results = [replay(mode, args, video) for mode in args.modes]
+
+    print(f"{'mode':>8} {'frames':>7} {'proc fps':>9} {'stream fps':>10} {'p50 ms':>7} {'p95 ms':>7} "
+          f"{'p99 ms':>7} {'dropped':>8} {'emb/s':>7} {'detected':>9} {'skipped':>8} {'interval':>9}")
+    for r in results:
+        latency = r['latency'] or {'p50_ms': 0, 'p95_ms': 0, 'p99_ms': 0}
+        dropped = r['dropped']['frame_queue'] + r['dropped']['worker_queue']
+        print(f"{r['mode']:>8} {r['frames_processed']:7d} {r['processed_fps']:9.1f} {r['streamed_fps']:10.1f} "
+              f"{latency['p50_ms']:7.1f} {latency['p95_ms']:7.1f} {latency['p99_ms']:7.1f} "
+              f"{dropped:8d} {r['embeddings_per_second']:7.1f} {r['scheduled']['detect']:9d} "
+              f"{r['scheduled']['skip']:8d} {r['detection_interval'] or 0:9.3f}")
+
+    if output:
+        report = {
+            'environment': environment(),
+            'config': dict(vars(args), video=video, output=output),
+            'results': results,
+        }
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--video', help='video file every camera replays (default: generated)')
+    parser.add_argument('--seconds', type=float, default=10, help='length of the generated video')
+    parser.add_argument('--fps', type=float, default=None,
+                        help='replay rate per camera; 0 = as fast as possible (default: recorded rate)')
+    parser.add_argument('--cameras', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=None, help='default: one per camera')
+    parser.add_argument('--modes', nargs='+', default=['thread'], choices=['thread', 'process'])
+    parser.add_argument('--stream-fps', type=int, default=15, help='cap on encoded frames per camera per second')
+    parser.add_argument('--model', default='Facenet512')
+    parser.add_argument('--model-path', default='trained_models/face_recognition_model')
+    parser.add_argument('--detector', default='mediapipe', choices=['mediapipe', 'opencv'])
+    parser.add_argument('--latency-budget', type=float, default=0.5,
+                        help='capture-to-result seconds the frame scheduler keeps detection within')
+    parser.add_argument('--cpu-target', type=float, default=0.8,
+                        help="share of the workers' time the frame scheduler lets detection use")
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    run(parser.parse_args())
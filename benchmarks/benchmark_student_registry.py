@@ -0,0 +1,93 @@
+"""
+Student registration latency as a program grows: the previous read-scan-
+rewrite of <program>_students.csv vs. StudentRegistry's hash lookup and
+single-row append, plus the name lookup register_webcam does.
+
+    python benchmarks/benchmark_student_registry.py --students 50000 --registrations 200
+"""
+import os
+import sys
+import csv
+import time
+import argparse
+import tempfile
+import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from student_registry import StudentRegistry, STUDENT_FIELDS
+
+
+def make_student(i, program='CS'):
+    return {
+        'faculty': 'FOC', 'degree_program': program, 'intake': '2023', 'index_number': f"IT{i:07d}",
+        'first_name': f"First{i}", 'last_name': f"Last{i}", 'email': f"student{i}@uni.lk",
+        'phone': '0770000000', 'university_id': f"U{i:07d}", 'nic_number': f"N{i:09d}",
+        'address': 'Colombo', 'created_at': datetime.datetime.utcnow().isoformat(),
+        'image_path': '', 'subjects': 'SE3012|SE3022',
+    }
+
+
+def csv_register(csv_file, student):
+    """The previous POST /api/students: read everything, scan, rewrite everything"""
+    students = []
+    if os.path.exists(csv_file):
+        with open(csv_file, 'r', newline='') as f:
+            students = list(csv.DictReader(f))
+    for s in students:
+        if (s.get('email') == student['email'] or s.get('index_number') == student['index_number'] or
+                s.get('university_id') == student['university_id'] or s.get('nic_number') == student['nic_number']):
+            return None
+    student = dict(student, id=str(max([int(s['id']) for s in students]) + 1 if students else 1))
+    students.append(student)
+    with open(csv_file, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=STUDENT_FIELDS)
+        writer.writeheader()
+        writer.writerows(students)
+    return student
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix='student_bench_')
+    csv_dir = os.path.join(workdir, 'csv')
+    os.makedirs(csv_dir)
+    csv_file = os.path.join(csv_dir, 'cs_students.csv')
+    with open(csv_file, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=STUDENT_FIELDS)
+        writer.writeheader()
+        writer.writerows(dict(make_student(i), id=str(i + 1)) for i in range(args.students))
+
+    registry_dir = os.path.join(workdir, 'registry')
+    os.makedirs(registry_dir)
+    with open(csv_file) as src, open(os.path.join(registry_dir, 'cs_students.csv'), 'w') as dst:
+        dst.write(src.read())
+
+    start = time.perf_counter()
+    registry = StudentRegistry(registry_dir)
+    print(f"{args.students} students, registry loaded in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    new = [make_student(args.students + i) for i in range(args.registrations)]
+    start = time.perf_counter()
+    for student in new[:max(args.registrations // 20, 1)]:
+        csv_register(csv_file, student)
+    csv_ms = (time.perf_counter() - start) * 1000 / max(args.registrations // 20, 1)
+
+    start = time.perf_counter()
+    for student in new:
+        registry.register('CS', student)
+    registry_ms = (time.perf_counter() - start) * 1000 / args.registrations
+
+    start = time.perf_counter()
+    for i in range(args.registrations):
+        registry.find_by_name(f"First{i * 97 % args.students} Last{i * 97 % args.students}")
+    lookup_us = (time.perf_counter() - start) * 1e6 / args.registrations
+
+    print(f"Register, CSV rewrite: {csv_ms:9.2f} ms")
+    print(f"Register, registry:    {registry_ms:9.3f} ms ({csv_ms / registry_ms:.0f}x faster)")
+    print(f"Find by name:          {lookup_us:9.2f} us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--students', type=int, default=50000)
+    parser.add_argument('--registrations', type=int, default=200)
+    run(parser.parse_args())
@@ -1,24 +1,37 @@
 import os
-import pickle
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 from deepface import DeepFace
-from scipy.spatial.distance import cosine
 from sklearn.metrics import confusion_matrix, accuracy_score
 import random
 import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+from face_gallery import FaceGallery
+from gallery_store import gallery_exists, load_gallery, migrate_pickle
+from quantization import PRECISIONS
+from embedding_cache import EmbeddingCache
+from enrollment_pipeline import embed_training_images
 
 # Paths
 MODEL_PATH = 'trained_models/face_recognition_model'
 KNOWN_FACES_DIR = 'known_faces'
 TEST_FACES_DIR = 'test_faces'  # Optional: Create this directory with test images
+EVAL_CACHE_FILE = 'trained_models/evaluation_embedding_cache.pkl'
+# Cosine distance thresholds swept by the full evaluation; a match needs distance < threshold
+THRESHOLDS = np.round(np.arange(0.005, 1.0001, 0.005), 3)
 
 def load_trained_embeddings(embeddings_file=MODEL_PATH):
-    """Load pre-trained embeddings from file"""
+    """Load the pre-trained gallery, migrating a legacy pickle model if needed"""
     try:
-        with open(embeddings_file, 'rb') as f:
-            return pickle.load(f)
+        if not gallery_exists(embeddings_file):
+            if not os.path.exists(embeddings_file):
+                raise FileNotFoundError(embeddings_file)
+            migrate_pickle(embeddings_file)
+        return load_gallery(embeddings_file)
     except FileNotFoundError:
         print(f"No pre-trained embeddings found at {embeddings_file}. Run model training first.")
         return {}
@@ -44,18 +57,9 @@ def extract_face_embedding(image_path, model_name="Facenet512"):
 
 def recognize_face(face_embedding, known_faces, threshold=0.3):
     """Recognize a face embedding against known faces"""
-    best_match = "Unknown"
-    min_distance = threshold
-    
-    for person_name, embeddings in known_faces.items():
-        for stored_embedding in embeddings:
-            distance = cosine(face_embedding, stored_embedding)
-            if distance < min_distance:
-                best_match = person_name
-                min_distance = distance
-    
-    confidence = max(0, 1 - min_distance)
-    return best_match, confidence
+    if not isinstance(known_faces, FaceGallery):
+        known_faces = FaceGallery.from_dict(known_faces)
+    return known_faces.match([face_embedding], threshold)[0]
 
 def simulate_loss(true_labels, predicted_labels, confidences):
     """Simulate loss based on prediction errors"""
@@ -63,6 +67,25 @@ def simulate_loss(true_labels, predicted_labels, confidences):
     loss = [1 - conf if true != pred else 0 for true, pred, conf in zip(true_labels, predicted_labels, confidences)]
     return np.array(loss)
 
+def collect_test_images(test_dir=TEST_FACES_DIR, known_faces_dir=KNOWN_FACES_DIR, limit=20):
+    """(image_path, true_name) pairs from test_dir, or a random sample of known faces if it does not exist"""
+    test_images = []
+    if not os.path.exists(test_dir):
+        print("No test directory found. Simulating with known faces...")
+        source_dir = known_faces_dir
+    else:
+        source_dir = test_dir
+    for person_name in os.listdir(source_dir):
+        person_dir = os.path.join(source_dir, person_name)
+        if os.path.isdir(person_dir):
+            for img_name in os.listdir(person_dir):
+                test_images.append((os.path.join(person_dir, img_name), person_name))
+
+    if source_dir == known_faces_dir and limit:
+        random.shuffle(test_images)
+        test_images = test_images[:min(limit, len(test_images))]
+    return test_images
+
 def evaluate_model(test_dir=TEST_FACES_DIR, known_faces_dir=KNOWN_FACES_DIR):
     """Evaluate model accuracy and collect metrics"""
     known_faces = load_trained_embeddings()
@@ -74,47 +97,234 @@ def evaluate_model(test_dir=TEST_FACES_DIR, known_faces_dir=KNOWN_FACES_DIR):
     confidences = []
     processing_times = []
 
-    # If no test directory, simulate using known faces
-    if not os.path.exists(test_dir):
-        print("No test directory found. Simulating with known faces...")
-        test_images = []
-        for person_name in os.listdir(known_faces_dir):
-            person_dir = os.path.join(known_faces_dir, person_name)
-            if os.path.isdir(person_dir):
-                for img_name in os.listdir(person_dir):
-                    img_path = os.path.join(person_dir, img_name)
-                    test_images.append((img_path, person_name))
-        
-        random.shuffle(test_images)
-        test_images = test_images[:min(20, len(test_images))]  # Limit to 20
-        
-        for img_path, true_name in test_images:
-            embedding, proc_time = extract_face_embedding(img_path)
-            if embedding is not None:
-                pred_name, confidence = recognize_face(embedding, known_faces)
-                true_labels.append(true_name)
-                predicted_labels.append(pred_name)
-                confidences.append(confidence)
-                processing_times.append(proc_time)
-    else:
-        # Use actual test directory
-        for person_name in os.listdir(test_dir):
-            person_dir = os.path.join(test_dir, person_name)
-            if os.path.isdir(person_dir):
-                for img_name in os.listdir(person_dir):
-                    img_path = os.path.join(person_dir, img_name)
-                    embedding, proc_time = extract_face_embedding(img_path)
-                    if embedding is not None:
-                        pred_name, confidence = recognize_face(embedding, known_faces)
-                        true_labels.append(person_name)
-                        predicted_labels.append(pred_name)
-                        confidences.append(confidence)
-                        processing_times.append(proc_time)
+    for img_path, true_name in collect_test_images(test_dir, known_faces_dir):
+        embedding, proc_time = extract_face_embedding(img_path)
+        if embedding is not None:
+            pred_name, confidence = recognize_face(embedding, known_faces)
+            true_labels.append(true_name)
+            predicted_labels.append(pred_name)
+            confidences.append(confidence)
+            processing_times.append(proc_time)
 
     # Simulate loss
     loss = simulate_loss(true_labels, predicted_labels, confidences)
     return true_labels, predicted_labels, confidences, processing_times, loss
 
+def embed_test_set(test_images, model_name="Facenet512", detector_backend="opencv", batch_size=32, workers=4,
+                   cache_file=EVAL_CACHE_FILE):
+    """
+    Embed every (image_path, true_name) pair with the training pipeline: parallel decode/detect,
+    batched forward passes, and an on-disk cache so re-runs only embed new or changed images.
+    Returns (probes, names, stats); images without a usable face are left out.
+    """
+    cache = EmbeddingCache(cache_file) if cache_file else None
+    face_data, names, stats = embed_training_images(
+        [(name, path) for path, name in test_images], model_name=model_name,
+        detector_backend=detector_backend, batch_size=batch_size, workers=workers, cache=cache)
+    if cache is not None:
+        cache.save()
+        stats.update(cache.stats())
+    return np.asarray(face_data, dtype=np.float32), names, stats
+
+def score_probes(gallery, probes, probe_names, thresholds=THRESHOLDS, chunk_size=1024):
+    """
+    One pass over the probe x gallery distance matrix, chunk_size probes at a time.
+    Distances are reduced to one per (probe, identity), the nearest of that identity's
+    embeddings. Returns per-probe nearest identity and distance, plus histograms of
+    genuine (own identity) and impostor (every other identity) distances over thresholds.
+    """
+    order = np.argsort(gallery.labels, kind='stable')
+    labels = np.asarray(gallery.labels)[order]
+    starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+    identity_labels = labels[starts]
+    name_to_column = {str(gallery.names[label]): col for col, label in enumerate(identity_labels)}
+    true_columns = np.array([name_to_column.get(name, -1) for name in probe_names])
+
+    # Bin edges such that cumsum(hist)[k] counts distances < thresholds[k]
+    edges = np.concatenate([[-np.inf], thresholds, [np.inf]])
+    genuine_hist = np.zeros(len(thresholds) + 1, dtype=np.int64)
+    impostor_hist = np.zeros(len(thresholds) + 1, dtype=np.int64)
+    best_columns = np.empty(len(probes), dtype=np.int64)
+    best_distances = np.empty(len(probes), dtype=np.float32)
+
+    for start in range(0, len(probes), chunk_size):
+        chunk = slice(start, start + chunk_size)
+        distances = gallery.distances(probes[chunk])[:, order]
+        identity_distances = np.minimum.reduceat(distances, starts, axis=1)
+        best_columns[chunk] = np.argmin(identity_distances, axis=1)
+        best_distances[chunk] = identity_distances[np.arange(len(identity_distances)), best_columns[chunk]]
+
+        own = true_columns[chunk]
+        enrolled = own >= 0
+        genuine = identity_distances[np.flatnonzero(enrolled), own[enrolled]]
+        genuine_hist += np.histogram(genuine, edges)[0]
+        impostor_mask = np.ones(identity_distances.shape, dtype=bool)
+        impostor_mask[np.flatnonzero(enrolled), own[enrolled]] = False
+        impostor_hist += np.histogram(identity_distances[impostor_mask], edges)[0]
+
+    return {
+        'predicted_names': [str(gallery.names[label]) for label in identity_labels[best_columns]],
+        'best_distances': best_distances,
+        'rank1_correct': best_columns == true_columns,
+        'enrolled': true_columns >= 0,
+        'genuine_hist': genuine_hist,
+        'impostor_hist': impostor_hist,
+    }
+
+def threshold_sweep(scores, thresholds=THRESHOLDS):
+    """
+    Accuracy, FAR, FRR and TAR at every threshold, vectorized with sorted distances
+    instead of re-scoring predictions once per threshold.
+    Identification accuracy counts a probe as correct when its nearest identity is
+    right and closer than the threshold, or when it is not enrolled and nothing is.
+    """
+    best = scores['best_distances']
+    n = len(best)
+    correct_sorted = np.sort(best[scores['rank1_correct']])
+    unenrolled_sorted = np.sort(best[~scores['enrolled']])
+    correct_matches = np.searchsorted(correct_sorted, thresholds, side='left')
+    correct_rejects = len(unenrolled_sorted) - np.searchsorted(unenrolled_sorted, thresholds, side='left')
+    accuracy = (correct_matches + correct_rejects) / max(n, 1)
+
+    genuine = scores['genuine_hist']
+    impostor = scores['impostor_hist']
+    tar = np.cumsum(genuine)[:-1] / max(genuine.sum(), 1)
+    far = np.cumsum(impostor)[:-1] / max(impostor.sum(), 1)
+    frr = 1.0 - tar
+
+    best_index = int(np.argmax(accuracy))
+    eer_index = int(np.argmin(np.abs(far - frr)))
+    return {
+        'thresholds': thresholds,
+        'accuracy': accuracy,
+        'far': far,
+        'frr': frr,
+        'tar': tar,
+        'best_threshold': float(thresholds[best_index]),
+        'best_accuracy': float(accuracy[best_index]),
+        'eer': float((far[eer_index] + frr[eer_index]) / 2),
+        'eer_threshold': float(thresholds[eer_index]),
+        'genuine_pairs': int(genuine.sum()),
+        'impostor_pairs': int(impostor.sum()),
+    }
+
+def evaluate_full(test_dir=TEST_FACES_DIR, known_faces_dir=KNOWN_FACES_DIR, model_name="Facenet512",
+                  detector_backend="opencv", batch_size=32, workers=4, cache_file=EVAL_CACHE_FILE,
+                  threshold=0.3):
+    """Every test image, embedded in parallel and scored against the whole gallery in one pass"""
+    known_faces = load_trained_embeddings()
+    if not known_faces:
+        raise ValueError("No trained embeddings loaded.")
+    test_images = collect_test_images(test_dir, known_faces_dir, limit=None)
+    print(f"Embedding {len(test_images)} test images with {workers} workers, batches of {batch_size}...")
+    probes, probe_names, embed_stats = embed_test_set(test_images, model_name, detector_backend,
+                                                      batch_size, workers, cache_file)
+    if not len(probes):
+        raise ValueError("No test embeddings extracted.")
+    print(f"Embedded {len(probes)} probes in {embed_stats['seconds']:.1f}s "
+          f"({embed_stats['images_per_second']} img/s, {embed_stats.get('cache_hits', 0)} from cache)")
+
+    start_time = time.perf_counter()
+    scores = score_probes(known_faces, probes, probe_names)
+    sweep = threshold_sweep(scores)
+    scoring_seconds = time.perf_counter() - start_time
+
+    at = int(np.argmin(np.abs(THRESHOLDS - threshold)))
+    print(f"Scored {len(probes)} probes x {len(known_faces)} gallery embeddings "
+          f"({known_faces.num_identities} people) in {scoring_seconds:.2f}s")
+    print(f"Rank-1 accuracy (no threshold): {np.mean(scores['rank1_correct'][scores['enrolled']]):.4f}")
+    print(f"At threshold {threshold}: accuracy {sweep['accuracy'][at]:.4f}, "
+          f"FAR {sweep['far'][at]:.5f}, FRR {sweep['frr'][at]:.4f}")
+    print(f"Best threshold: {sweep['best_threshold']} (accuracy {sweep['best_accuracy']:.4f})")
+    print(f"Equal error rate: {sweep['eer']:.4f} at threshold {sweep['eer_threshold']} "
+          f"({sweep['genuine_pairs']} genuine, {sweep['impostor_pairs']} impostor pairs)")
+    return probe_names, scores, sweep
+
+def plot_roc_det(sweep):
+    """ROC (TAR vs. FAR) and DET (FRR vs. FAR) curves from the threshold sweep"""
+    far = np.clip(sweep['far'], 1e-6, 1.0)
+    plt.figure(figsize=(10, 6))
+    plt.plot(far, sweep['tar'], color='blue')
+    plt.xscale('log')
+    plt.title('ROC Curve')
+    plt.xlabel('False Accept Rate')
+    plt.ylabel('True Accept Rate')
+    plt.grid(True)
+    plt.tight_layout()
+    plt.savefig('roc_curve.png')
+    plt.close()
+
+    plt.figure(figsize=(10, 6))
+    plt.plot(far, np.clip(sweep['frr'], 1e-6, 1.0), color='red')
+    plt.xscale('log')
+    plt.yscale('log')
+    plt.title('DET Curve')
+    plt.xlabel('False Accept Rate')
+    plt.ylabel('False Reject Rate')
+    plt.grid(True)
+    plt.tight_layout()
+    plt.savefig('det_curve.png')
+    plt.close()
+
+def plot_threshold_sweep(sweep):
+    """Accuracy, FAR and FRR against the distance threshold"""
+    plt.figure(figsize=(10, 6))
+    plt.plot(sweep['thresholds'], sweep['accuracy'], label='Accuracy', color='green')
+    plt.plot(sweep['thresholds'], sweep['far'], label='FAR', color='red')
+    plt.plot(sweep['thresholds'], sweep['frr'], label='FRR', color='orange')
+    plt.axvline(sweep['best_threshold'], color='gray', linestyle='--', label='Best threshold')
+    plt.title('Accuracy, FAR and FRR vs. Distance Threshold')
+    plt.xlabel('Distance Threshold')
+    plt.ylabel('Rate')
+    plt.grid(True)
+    plt.legend()
+    plt.tight_layout()
+    plt.savefig('threshold_sweep.png')
+    plt.close()
+
+def compare_precisions(test_dir=TEST_FACES_DIR, known_faces_dir=KNOWN_FACES_DIR, precisions=PRECISIONS, repeats=5):
+    """Accuracy, gallery memory footprint and match latency for each gallery precision"""
+    known_faces = load_trained_embeddings()
+    if not known_faces:
+        raise ValueError("No trained embeddings loaded.")
+
+    true_labels = []
+    embeddings = []
+    for img_path, true_name in collect_test_images(test_dir, known_faces_dir):
+        embedding, _ = extract_face_embedding(img_path)
+        if embedding is not None:
+            true_labels.append(true_name)
+            embeddings.append(embedding)
+    if not embeddings:
+        raise ValueError("No test embeddings extracted.")
+    queries = np.asarray(embeddings, dtype=np.float32)
+
+    report = []
+    reference = None
+    for precision in precisions:
+        gallery = known_faces.quantize(precision)
+        gallery.match(queries[:1])  # warm up
+        start_time = time.perf_counter()
+        for _ in range(repeats):
+            predictions = [name for name, _ in gallery.match(queries)]
+        match_ms = (time.perf_counter() - start_time) * 1000 / (repeats * len(queries))
+        if reference is None:
+            reference = predictions
+        report.append({
+            'precision': precision,
+            'accuracy': accuracy_score(true_labels, predictions),
+            'agreement': float(np.mean([a == b for a, b in zip(predictions, reference)])),
+            'memory_mb': gallery.nbytes / 1e6,
+            'match_ms': match_ms,
+        })
+
+    print(f"Gallery: {len(known_faces)} embeddings, {known_faces.num_identities} people; {len(queries)} test images")
+    print(f"{'precision':>9} {'accuracy':>9} {'agree w/ ' + precisions[0]:>16} {'memory MB':>10} {'ms/query':>9}")
+    for row in report:
+        print(f"{row['precision']:>9} {row['accuracy']:>9.3f} {row['agreement']:>16.3f} "
+              f"{row['memory_mb']:>10.2f} {row['match_ms']:>9.4f}")
+    return report
+
 def plot_confusion_matrix(true_labels, predicted_labels):
     """Plot confusion matrix"""
     labels = sorted(set(true_labels + predicted_labels))
@@ -188,7 +398,31 @@ def plot_loss(loss):
     plt.savefig('loss_over_evaluations.png')
     plt.close()
 
-def main():
+def main(precision_report=False, full=False, workers=4, batch_size=32, detector_backend="opencv",
+         cache_file=EVAL_CACHE_FILE):
+    if full:
+        print("Evaluating Face Recognition Model on the full test set...")
+        try:
+            probe_names, scores, sweep = evaluate_full(detector_backend=detector_backend, batch_size=batch_size,
+                                                       workers=workers, cache_file=cache_file)
+            plot_roc_det(sweep)
+            plot_threshold_sweep(sweep)
+            plot_confidence_distribution(1.0 - scores['best_distances'])
+            # A confusion matrix stops being readable past a few dozen people
+            if len(set(probe_names)) <= 50:
+                plot_confusion_matrix(list(probe_names), scores['predicted_names'])
+        except Exception as e:
+            print(f"Error during evaluation: {str(e)}")
+        return
+
+    if precision_report:
+        print("Comparing gallery precisions...")
+        try:
+            compare_precisions()
+        except Exception as e:
+            print(f"Error during precision comparison: {str(e)}")
+        return
+
     print("Evaluating Face Recognition Model...")
     try:
         true_labels, predicted_labels, confidences, processing_times, loss = evaluate_model()
@@ -223,6 +457,19 @@ def main():
         print(f"Error during evaluation: {str(e)}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate the trained face recognition model")
+    parser.add_argument('--precision-report', action='store_true',
+                        help='compare accuracy, memory and match latency of float32/float16/int8 galleries')
+    parser.add_argument('--full', action='store_true',
+                        help='evaluate every test image (no 20-image sample), with ROC/DET curves, FAR/FRR and '
+                             'the best threshold from one vectorized pass')
+    parser.add_argument('--workers', type=int, default=4, help='decode/detect threads for --full')
+    parser.add_argument('--batch-size', type=int, default=32, help='faces per model forward pass for --full')
+    parser.add_argument('--detector', default='opencv', help='detector backend for --full (default: as in training)')
+    parser.add_argument('--cache', default=EVAL_CACHE_FILE,
+                        help='embedding cache for --full, reused across runs; pass "" to disable')
+    args = parser.parse_args()
+
     # Check dependencies
     try:
         import matplotlib
@@ -232,4 +479,5 @@ if __name__ == "__main__":
         print("Please install required libraries: pip install matplotlib seaborn deepface")
         exit(1)
     
-    main()
\ No newline at end of file
+    main(precision_report=args.precision_report, full=args.full, workers=args.workers,
+         batch_size=args.batch_size, detector_backend=args.detector, cache_file=args.cache or None)
\ No newline at end of file
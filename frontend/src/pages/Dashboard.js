@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { Link } from 'react-router-dom';
+import io from 'socket.io-client';
 import '../styles/Dashboard.css';
 
 function Dashboard() {
@@ -32,26 +33,67 @@ function Dashboard() {
     return () => clearInterval(timer);
   }, []);
 
+  const describeProgress = (progress) => {
+    const eta = progress.eta_seconds != null ? `, about ${Math.ceil(progress.eta_seconds)}s left` : '';
+    return `Training model... ${progress.done}/${progress.total} images ` +
+      `(${progress.images_per_second} img/s${eta})`;
+  };
+
+  // Training runs as a background job on the server; follow its progress events
+  useEffect(() => {
+    const socket = io('http://localhost:5000');
+    socket.on('training_progress', (progress) => {
+      if (progress.state === 'running') {
+        setTrainingStatus({ isTraining: true, success: false, message: describeProgress(progress) });
+        return;
+      }
+      if (progress.state === 'succeeded') {
+        setTrainingStatus({
+          isTraining: false,
+          success: true,
+          message: `Model trained successfully in ${Math.round(progress.duration)}s (gallery version ${progress.galleryVersion})`
+        });
+        setTimeout(() => {
+          setTrainingStatus({ isTraining: false, success: false, message: '' });
+        }, 3000);
+      } else {
+        setTrainingStatus({ isTraining: false, success: false, message: progress.error || 'Failed to train model' });
+      }
+    });
+
+    // Pick up a job that was started before this page was opened
+    fetch('http://localhost:5000/api/model-training-status')
+      .then((response) => response.json())
+      .then((data) => {
+        if (data.job && data.job.state === 'running') {
+          setTrainingStatus({ isTraining: true, success: false, message: describeProgress(data.job.progress) });
+        }
+      })
+      .catch((err) => console.error('Error fetching training status:', err));
+
+    return () => socket.disconnect();
+  }, []);
+
   // Function to train the face recognition model
   const trainFaceRecognitionModel = async () => {
+    if (trainingStatus.isTraining) {
+      return;
+    }
     try {
-      setTrainingStatus({ isTraining: true, success: false, message: 'Training model...' });
+      setTrainingStatus({ isTraining: true, success: false, message: 'Starting model training...' });
       const response = await fetch('http://localhost:5000/api/train-model', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' }
       });
       const data = await response.json();
+      if (response.status === 409) {
+        setTrainingStatus({ isTraining: true, success: false, message: 'Model training already in progress...' });
+        return;
+      }
       if (!response.ok) {
         throw new Error(data.error || 'Failed to train model');
       }
-      setTrainingStatus({
-        isTraining: false,
-        success: true,
-        message: data.message || 'Model trained successfully!'
-      });
-      setTimeout(() => {
-        setTrainingStatus({ isTraining: false, success: false, message: '' });
-      }, 3000);
+      setTrainingStatus({ isTraining: true, success: false, message: data.message || 'Model training started' });
     } catch (err) {
       console.error('Error training model:', err);
       setTrainingStatus({
@@ -12,8 +12,10 @@ function MarkAttendance() {
   const [recognizedStudents, setRecognizedStudents] = useState([]);
   const [alreadyMarkedMessage, setAlreadyMarkedMessage] = useState(''); // New state for message
   const [socket, setSocket] = useState(null);
-  const [videoFrame, setVideoFrame] = useState(null);
-  const videoRef = useRef(null);
+  const [videoFrames, setVideoFrames] = useState({}); // Latest frame per camera
+  const [facesInView, setFacesInView] = useState({}); // Tracked faces per camera
+  const tracksRef = useRef({}); // camera -> { trackId: result }, rebuilt from each frame's delta
+  const shownRef = useRef({}); // camera -> { url, seq } of the frame on screen
 
   const degreePrograms = [
     { code: 'CS', name: 'Computer Science' },
@@ -50,18 +52,58 @@ function MarkAttendance() {
 
   useEffect(() => {
     if (socket && cameraActive) {
+      // Only subscribed sockets get video; a reconnect gets a new sid, so subscribe again then
+      const subscribe = () => socket.emit('video_subscribe');
+      subscribe();
+      socket.on('connect', subscribe);
+
       socket.on('video_frame', (data) => {
-        setVideoFrame(`data:image/jpeg;base64,${data.frame}`);
+        const camera = data.camera ?? 0;
+        // Frames arrive as binary JPEG; ack once decoded (or failed) so the server can pace quality to this client.
+        // A frame is shown only after it loaded, and the one it replaces is revoked then.
+        const url = URL.createObjectURL(new Blob([data.frame], { type: 'image/jpeg' }));
+        const img = new Image();
+        img.onload = () => {
+          const shown = shownRef.current[camera];
+          if (shown && shown.seq > data.seq) {
+            URL.revokeObjectURL(url); // a newer frame loaded first
+          } else {
+            shownRef.current[camera] = { url, seq: data.seq };
+            setVideoFrames(prev => ({ ...prev, [camera]: url }));
+            if (shown) {
+              URL.revokeObjectURL(shown.url);
+            }
+          }
+          socket.emit('video_frame_ack', { camera, seq: data.seq });
+        };
+        img.onerror = () => {
+          URL.revokeObjectURL(url);
+          socket.emit('video_frame_ack', { camera, seq: data.seq });
+        };
+        img.src = url;
+
+        // Results come as a delta against the last frame this client received
+        if (data.delta) {
+          const tracks = data.delta.full ? {} : { ...(tracksRef.current[camera] || {}) };
+          data.delta.remove.forEach(trackId => delete tracks[trackId]);
+          data.delta.upsert.forEach(result => { tracks[result.trackId] = result; });
+          tracksRef.current[camera] = tracks;
+          const count = Object.keys(tracks).length;
+          setFacesInView(prev => (prev[camera] === count ? prev : { ...prev, [camera]: count }));
+        }
       });
 
-      socket.on('recognition_event', async (data) => {
-        if (data.type === 'recognition') {
-          const recognizedName = data.name;
+      // Recognitions arrive batched, so today's records are read once per batch
+      socket.on('recognition_batch', async (data) => {
+        if (data.type !== 'recognition' || !data.names.length) return;
+
+        const today = new Date().toISOString().split('T')[0];
+        const existingRecords = await readAttendanceFromCSV(today);
+
+        data.names.forEach(recognizedName => {
           console.log(`Recognized student: ${recognizedName}`);
 
           // Check if student is already marked for today
-          const today = new Date().toISOString().split('T')[0];
-          const existingRecords = await readAttendanceFromCSV(today);
           const isAlreadyMarked = existingRecords.some(
             record =>
               record.name === recognizedName &&
@@ -100,22 +142,18 @@ function MarkAttendance() {
 
             return updatedStudents;
           });
-        }
+        });
       });
 
       return () => {
+        socket.emit('video_unsubscribe');
+        socket.off('connect', subscribe);
         socket.off('video_frame');
-        socket.off('recognition_event');
+        socket.off('recognition_batch');
       };
     }
   }, [socket, cameraActive, selectedDegree, selectedSubject]);
 
-  useEffect(() => {
-    if (videoRef.current && videoFrame) {
-      videoRef.current.src = videoFrame;
-    }
-  }, [videoFrame]);
-
   useEffect(() => {
     const fetchStudents = async () => {
       if (!selectedDegree || !selectedSubject) return;
@@ -209,7 +247,9 @@ function MarkAttendance() {
       }
 
       setCameraActive(false);
-      setVideoFrame(null);
+      Object.values(shownRef.current).forEach(shown => URL.revokeObjectURL(shown.url));
+      shownRef.current = {};
+      setVideoFrames({});
       setRecognizedStudents([]);
       setStudents(prevStudents =>
         prevStudents.map(student => ({ ...student, present: false }))
@@ -358,14 +398,22 @@ function MarkAttendance() {
               </div>
 
               <div className={`video-feed-container ${cameraActive ? 'active' : ''}`}>
-                {cameraActive && (
+                {cameraActive && Object.keys(videoFrames).length === 0 && (
                   <img
-                    ref={videoRef}
                     className="video-feed"
                     alt="Face recognition stream"
-                    src={videoFrame || 'data:image/gif;base64,R0lGODlhAQABAAD/ACwAAAAAAQABAAACADs='}
+                    src="data:image/gif;base64,R0lGODlhAQABAAD/ACwAAAAAAQABAAACADs="
                   />
                 )}
+                {cameraActive && Object.entries(videoFrames).map(([camera, frame]) => (
+                  <img
+                    key={camera}
+                    className="video-feed"
+                    alt={`Face recognition stream, camera ${camera}`}
+                    title={`${facesInView[camera] || 0} face(s) in view`}
+                    src={frame}
+                  />
+                ))}
                 {!cameraActive && (
                   <div className="video-placeholder">
                     <i className="fas fa-camera"></i>